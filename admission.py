@@ -0,0 +1,105 @@
+import os
+import math
+import uuid
+import asyncio
+from contextlib import asynccontextmanager
+from fastapi import HTTPException, status
+import metrics
+from state import StateStore, store
+
+# Admission settings for LLM-backed endpoints
+ADMISSION_MAX_INFLIGHT = int(os.getenv("ADMISSION_MAX_INFLIGHT", 16))
+ADMISSION_PER_USER_LIMIT = int(os.getenv("ADMISSION_PER_USER_LIMIT", 2))
+# Median LLM latency (seconds) above which capacity is scaled down
+ADMISSION_LATENCY_TARGET = float(os.getenv("ADMISSION_LATENCY_TARGET", 30))
+ADMISSION_MAX_RETRY_AFTER = int(os.getenv("ADMISSION_MAX_RETRY_AFTER", 120))
+# A slot left behind by a worker that died mid-request is freed this long after it was taken
+ADMISSION_SLOT_TTL = float(os.getenv("ADMISSION_SLOT_TTL", 1800))
+
+admission_inflight = metrics.REGISTRY.register(metrics.Gauge(
+    "learnai_admission_inflight",
+    "Admitted expensive requests currently running",
+    labels=("endpoint",),
+))
+admission_rejections = metrics.REGISTRY.register(metrics.Counter(
+    "learnai_admission_rejections_total",
+    "Expensive requests rejected by admission control",
+    labels=("endpoint", "reason"),
+))
+
+
+class AdmissionController:
+    """
+    Gate expensive endpoints on live executor load, recent LLM latency and per-user concurrency.
+
+    Each admitted request holds a slot, with its own expiry, in slot sets
+    in the shared state store, so the limits hold across all worker
+    processes and a crashed worker's slots are freed on their own.
+    """
+    INFLIGHT_KEY = "admission:inflight"
+
+    def __init__(self, max_inflight: int, per_user_limit: int, latency_target: float, state: StateStore):
+        self.max_inflight = max_inflight
+        self.per_user_limit = per_user_limit
+        self.latency_target = latency_target
+        self.state = state
+
+    @staticmethod
+    def _user_key(key: str) -> str:
+        return f"admission:user:{key}"
+
+    def capacity(self) -> int:
+        """Admission limit, shrunk while the LLM provider is slow"""
+        median = metrics.llm_recent_latency.percentile(50)
+        if median is None or median <= self.latency_target:
+            return self.max_inflight
+        return max(1, int(self.max_inflight * self.latency_target / median))
+
+    def retry_after(self) -> int:
+        """Seconds until capacity is likely to free up"""
+        median = metrics.llm_recent_latency.percentile(50) or 1
+        return max(1, min(ADMISSION_MAX_RETRY_AFTER, math.ceil(median)))
+
+    def _reject(self, endpoint: str, status_code: int, reason: str, detail: str):
+        admission_rejections.inc(endpoint=endpoint, reason=reason)
+        raise HTTPException(
+            status_code=status_code,
+            detail=detail,
+            headers={"Retry-After": str(self.retry_after())}
+        )
+
+    async def try_acquire(self, key: str, endpoint: str) -> str:
+        """Admit one request or raise 429/503 with Retry-After; returns the slot to release"""
+        # The executor belongs to this process, so its check stays local
+        executor_busy = metrics.executor_inflight.get() >= metrics.executor_max_workers.get()
+        if executor_busy:
+            self._reject(endpoint, status.HTTP_503_SERVICE_UNAVAILABLE, "executor",
+                         "The service is busy. Please try again shortly.")
+        slot = uuid.uuid4().hex
+        user_key = self._user_key(key)
+        if not await self.state.acquire_slot(user_key, slot, self.per_user_limit, ADMISSION_SLOT_TTL):
+            self._reject(endpoint, status.HTTP_429_TOO_MANY_REQUESTS, "per_user",
+                         "Too many requests in progress. Please wait for them to finish.")
+        if not await self.state.acquire_slot(self.INFLIGHT_KEY, slot, self.capacity(), ADMISSION_SLOT_TTL):
+            await self.state.release_slot(user_key, slot)
+            self._reject(endpoint, status.HTTP_503_SERVICE_UNAVAILABLE, "capacity",
+                         "The service is busy. Please try again shortly.")
+        admission_inflight.inc(endpoint=endpoint)
+        return slot
+
+    async def release(self, key: str, endpoint: str, slot: str):
+        admission_inflight.dec(endpoint=endpoint)
+        await self.state.release_slot(self.INFLIGHT_KEY, slot)
+        await self.state.release_slot(self._user_key(key), slot)
+
+    @asynccontextmanager
+    async def admit(self, key: str, endpoint: str):
+        slot = await self.try_acquire(key, endpoint)
+        try:
+            yield
+        finally:
+            # Shielded so a cancelled request still gives its slot back
+            await asyncio.shield(self.release(key, endpoint, slot))
+
+
+controller = AdmissionController(ADMISSION_MAX_INFLIGHT, ADMISSION_PER_USER_LIMIT, ADMISSION_LATENCY_TARGET, store)
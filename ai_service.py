@@ -4,22 +4,93 @@ import asyncio
 import aiohttp
 import tiktoken
 import re
-import google.generativeai as genai
-from typing import Optional, List, Dict
+import time
+import hashlib
+from typing import Awaitable, Callable, Optional, List, Dict
 from dotenv import load_dotenv
 from youtube import fetch_transcript
+import metrics
+import tracing
+from resilience import CircuitBreaker, hedged
 
 
 
 load_dotenv()
 
-# Configure Google Generative AI with API key
-genai.configure(api_key=os.getenv("GOOGLE_API_KEY"))
+# Model and tokenizer settings
+GEMINI_MODEL = os.getenv("GEMINI_MODEL", "models/gemini-2.5-flash-preview-05-20")
+TOKENIZER_ENCODING = "cl100k_base"  # The gpt-3.5-turbo encoding chunk sizes were tuned with
+# tiktoken downloads the encoding on first use unless it's already in this
+# directory; fill it at image build time so startup never needs the network
+TIKTOKEN_CACHE_DIR = os.getenv("TIKTOKEN_CACHE_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), ".tiktoken_cache"))
+CHARS_PER_TOKEN = 4  # Estimate used to chunk when the tokenizer can't be loaded
+# After a failed tokenizer load, wait this long before trying again, doubling per failure
+TOKENIZER_RETRY_SECONDS = float(os.getenv("TOKENIZER_RETRY_SECONDS", 60))
+TOKENIZER_RETRY_MAX_SECONDS = float(os.getenv("TOKENIZER_RETRY_MAX_SECONDS", 3600))
 
-tokenizer = tiktoken.get_encoding("cl100k_base")
+_genai = None
+_tokenizer = None
+_tokenizer_failures = 0
+_tokenizer_retry_at = 0.0
+
+def get_genai():
+    """The Gemini client library, imported and configured on first use"""
+    global _genai
+    if _genai is None:
+        # Importing it pulls in grpc and protobuf, which dominates startup time
+        import google.generativeai as genai
+        genai.configure(api_key=os.getenv("GOOGLE_API_KEY"))
+        _genai = genai
+    return _genai
+
+async def load_genai():
+    """get_genai for async code: the first, slow import runs off the event loop"""
+    if _genai is None:
+        await asyncio.to_thread(get_genai)
+    return _genai
+
+def get_model():
+    return get_genai().GenerativeModel(GEMINI_MODEL)
+
+def get_tokenizer():
+    """
+    The tiktoken encoding, or None if it can't be loaded (offline with an empty cache).
+
+    Blocking, since the first call may download the encoding. After a failure
+    it isn't tried again until a backoff passes, as a download that failed
+    will most likely hang until it times out again; a network that comes
+    back is still picked up.
+    """
+    global _tokenizer, _tokenizer_failures, _tokenizer_retry_at
+    if _tokenizer is None and time.monotonic() >= _tokenizer_retry_at:
+        os.environ.setdefault("TIKTOKEN_CACHE_DIR", TIKTOKEN_CACHE_DIR)
+        try:
+            _tokenizer = tiktoken.get_encoding(TOKENIZER_ENCODING)
+        except Exception as e:
+            _tokenizer_failures += 1
+            delay = min(TOKENIZER_RETRY_MAX_SECONDS, TOKENIZER_RETRY_SECONDS * 2 ** (_tokenizer_failures - 1))
+            _tokenizer_retry_at = time.monotonic() + delay
+            print(f"Tokenizer unavailable, chunking by characters for {delay:.0f}s: {e}")
+    return _tokenizer
+
+def chunking_mode() -> str:
+    """How text is chunked now: "tokens", or "chars" while the tokenizer can't be loaded; blocking"""
+    return "tokens" if get_tokenizer() is not None else "chars"
+
+def split_by_tokens(text: str, max_tokens_per_chunk: int = 2000, mode: Optional[str] = None) -> list[str]:
+    """
+    Split text into chunks of at most max_tokens_per_chunk tokens.
+
+    mode ("tokens" or "chars") repeats the chunking of an earlier run, so its
+    chunks hash the same; by default tokens are used when the tokenizer loads.
+    """
+    encoding = get_tokenizer() if mode != "chars" else None
+    if encoding is None:
+        if mode == "tokens":
+            raise RuntimeError("The tokenizer these notes were chunked with can't be loaded")
+        size = max_tokens_per_chunk * CHARS_PER_TOKEN
+        return [text[i:i + size] for i in range(0, len(text), size)]
 
-def split_by_tokens(text: str, max_tokens_per_chunk: int = 2000, model: str = "gpt-3.5-turbo") -> list[str]:
-    encoding = tiktoken.encoding_for_model(model)
     tokens = encoding.encode(text)
 
     chunks = []
@@ -30,6 +101,67 @@ def split_by_tokens(text: str, max_tokens_per_chunk: int = 2000, model: str = "g
 
     return chunks
 
+def chunk_hash(chunk: str) -> str:
+    """Checkpoint key of a chunk of text"""
+    return hashlib.sha256(chunk.encode("utf-8")).hexdigest()
+
+note_chunks = metrics.REGISTRY.register(metrics.Counter(
+    "learnai_note_chunks_total",
+    "Note chunks by source: generated, or restored from a checkpoint of an earlier attempt",
+    labels=("source",),
+))
+
+def warm_up():
+    """Do the slow first-use work ahead of the first request; blocking"""
+    get_genai()
+    get_tokenizer()
+
+# LLM call settings
+LLM_TIMEOUT = float(os.getenv("LLM_TIMEOUT", 300))
+LLM_HEDGE_STAGES = {s for s in os.getenv("LLM_HEDGE_STAGES", "notes_chunk").split(",") if s}
+LLM_HEDGE_PERCENTILE = float(os.getenv("LLM_HEDGE_PERCENTILE", 95))
+LLM_HEDGE_MIN_SAMPLES = int(os.getenv("LLM_HEDGE_MIN_SAMPLES", 20))
+
+# Shared by every Gemini call so provider incidents fail fast everywhere
+llm_breaker = CircuitBreaker(
+    "gemini",
+    failure_threshold=int(os.getenv("LLM_BREAKER_FAILURES", 5)),
+    reset_timeout=float(os.getenv("LLM_BREAKER_RESET_SECONDS", 30))
+)
+
+def _hedge_delay(stage: str) -> Optional[float]:
+    """Observed tail latency for a stage, once there are enough samples to trust it"""
+    if stage not in LLM_HEDGE_STAGES or metrics.llm_recent_latency.count(stage) < LLM_HEDGE_MIN_SAMPLES:
+        return None
+    return metrics.llm_recent_latency.percentile(LLM_HEDGE_PERCENTILE, stage)
+
+async def generate_content(model, prompt: str, generation_config: dict, stage: str):
+    """Run a blocking Gemini call on the executor with a deadline, hedging and circuit breaking"""
+    llm_breaker.before_call()
+
+    async def attempt():
+        with tracing.span(f"llm.{stage}", prompt_chars=len(prompt)), metrics.track_llm(stage):
+            # The worker thread can't be interrupted, but the caller stops waiting
+            return await asyncio.wait_for(
+                metrics.run_in_thread(
+                    model.generate_content,
+                    prompt,
+                    generation_config=generation_config
+                ),
+                timeout=LLM_TIMEOUT
+            )
+
+    try:
+        response = await hedged(attempt, _hedge_delay(stage))
+    except asyncio.CancelledError:
+        llm_breaker.record_cancelled()
+        raise
+    except Exception:
+        llm_breaker.record_failure()
+        raise
+    llm_breaker.record_success()
+    return response
+
 class NotePolisher:
     def __init__(self):
         self.system_message = (
@@ -41,7 +173,7 @@ class NotePolisher:
             "Use Markdown Formatting"
         )
         # Use Gemini Pro model
-        self.model = genai.GenerativeModel('models/gemini-2.5-flash-preview-05-20')
+        self.model = get_model()
 
     async def polish_notes(self, raw_notes: str) -> str:
         try:
@@ -49,13 +181,14 @@ class NotePolisher:
             prompt = f"{self.system_message}\n\nNotes to polish:\n{raw_notes}"
             
             # Call Gemini API asynchronously
-            response = await asyncio.to_thread(
-                self.model.generate_content,
+            response = await generate_content(
+                self.model,
                 prompt,
                 generation_config={
                     "temperature": 0.7,
                     "max_output_tokens": 4096,
-                }
+                },
+                stage="polish"
             )
             
             print("Received response from Gemini API - polishing notes")
@@ -73,7 +206,7 @@ class NoteTaker:
             "Don't include \"[\" or \"]\" at all in the notes."
         )
         # Use Gemini Pro model
-        self.model = genai.GenerativeModel('models/gemini-2.5-flash-preview-05-20')
+        self.model = get_model()
 
     def _preprocess_text(self, text: str) -> str:
         print("Preprocessing text")
@@ -88,13 +221,14 @@ class NoteTaker:
             prompt = f"{self.default_system_message}\n\nContent to take notes on:\n{chunk}"
             
             # Call Gemini API asynchronously
-            response = await asyncio.to_thread(
-                self.model.generate_content,
+            response = await generate_content(
+                self.model,
                 prompt,
                 generation_config={
                     "temperature": 0.7,
                     "max_output_tokens": 8120,
-                }
+                },
+                stage="notes_chunk"
             )
             
             print("Received response from Gemini API - generating notes")
@@ -103,19 +237,47 @@ class NoteTaker:
             print(f"Error with Gemini API: {e}")
             raise
 
-    async def generate_notes(self, text: str) -> str:
+    async def generate_notes(self, text: str, checkpoints: Optional[Dict[str, str]] = None,
+                             on_chunk: Optional[Callable[[str, str], Awaitable[None]]] = None,
+                             chunking: Optional[str] = None) -> str:
+        """
+        Take notes on each chunk of text, then polish them together.
+
+        Args:
+            text: Text to take notes on
+            checkpoints: Notes of chunks finished by an earlier attempt, by chunk_hash; these aren't regenerated
+            on_chunk: Awaited with the hash and notes of each newly generated chunk, so it can be checkpointed
+            chunking: Chunking mode the checkpoints were made with (see split_by_tokens)
+        """
         print("Generating notes")
-        text = self._preprocess_text(text)
+        with tracing.span("notes.preprocess", input_chars=len(text)):
+            text = self._preprocess_text(text)
         
         # Split text into chunks
-        chunks = split_by_tokens(text, max_tokens_per_chunk=4000, model="gpt-3.5-turbo")
+        with tracing.span("notes.chunking") as chunk_span:
+            # In a thread: loading the tokenizer may download it, and encoding is CPU-bound
+            chunks = await asyncio.to_thread(split_by_tokens, text, 4000, chunking)
+            if chunk_span:
+                chunk_span.set(chunks=len(chunks))
         print(f"Split text into {len(chunks)} chunks")
         
-        # Process each chunk
+        # Process each chunk, skipping those already done
+        finished = dict(checkpoints or {})
         notes_chunks = []
         for i, chunk in enumerate(chunks):
+            key = chunk_hash(chunk)
+            if key in finished:
+                print(f"Restored chunk {i+1}/{len(chunks)} from checkpoint")
+                note_chunks.inc(source="checkpoint")
+                notes_chunks.append(finished[key])
+                continue
             print(f"Processing chunk {i+1}/{len(chunks)}")
-            chunk_notes = await self._call_model(chunk)
+            with tracing.span("notes.chunk", index=i, chars=len(chunk)):
+                chunk_notes = await self._call_model(chunk)
+            note_chunks.inc(source="generated")
+            if on_chunk is not None:
+                await on_chunk(key, chunk_notes)
+            finished[key] = chunk_notes
             notes_chunks.append(chunk_notes)
         
         # Combine notes
@@ -125,7 +287,8 @@ class NoteTaker:
         if len(chunks) > 1:
             print("Polishing combined notes")
             polisher = NotePolisher()
-            combined_notes = await polisher.polish_notes(combined_notes)
+            with tracing.span("notes.polish", input_chars=len(combined_notes)):
+                combined_notes = await polisher.polish_notes(combined_notes)
         
         return combined_notes
 
@@ -180,7 +343,7 @@ class QuizGenerator:
         }
         """
         # Use Gemini Pro model
-        self.model = genai.GenerativeModel('models/gemini-2.5-flash-preview-05-20')
+        self.model = get_model()
 
     def _clean_latex(self, text: str) -> str:
         """Clean LaTeX notation to make it JSON-safe"""
@@ -194,13 +357,14 @@ class QuizGenerator:
             prompt = f"{self.system_message}\n\nNotes to generate quiz from:\n{notes}"
             
             # Call Gemini API asynchronously
-            response = await asyncio.to_thread(
-                self.model.generate_content,
+            response = await generate_content(
+                self.model,
                 prompt,
                 generation_config={
                     "temperature": 0.7,
                     "max_output_tokens": 8120,
-                }
+                },
+                stage="quiz"
             )
             
             print("Received response from Gemini API - generating quiz")
@@ -251,7 +415,7 @@ class ChatBot:
         self.system_message = f"""You are a helpful study assistant.\n\nPlease answer questions using only the information in the notes below:\n---\n{notes}\n---\n\nFormatting instructions:\n- Avoid using LaTeX or math formatting unless absolutely necessary.\n- If you must include math, use plain text and keep it simple.\n- Use Markdown for code, lists, and tables only if it improves clarity.\n\nIf you're not sure about the answer, it's okay to say "I don't know."\nIf the question is unrelated to the notes, just let me know that it's outside the scope."""
         self.history: List[Dict[str, str]] = []  # List of {role: 'user'/'assistant', content: str}
         # Use Gemini Pro model
-        self.model = genai.GenerativeModel('models/gemini-2.5-flash-preview-05-20')
+        self.model = get_model()
 
     def add_user_message(self, message: str):
         self.history.append({"role": "user", "content": message})
@@ -271,13 +435,14 @@ class ChatBot:
                 full_prompt += f"\n{role}: {msg['content']}"
             
             # Call Gemini API asynchronously
-            response = await asyncio.to_thread(
-                self.model.generate_content,
+            response = await generate_content(
+                self.model,
                 full_prompt,
                 generation_config={
                     "temperature": 0.7,
                     "max_output_tokens": 8120,
-                }
+                },
+                stage="chat"
             )
             
             if not response.text:
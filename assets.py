@@ -0,0 +1,193 @@
+import os
+import re
+import gzip
+import hashlib
+import mimetypes
+from typing import Dict, Set, Tuple
+from starlette.datastructures import Headers
+from starlette.middleware.gzip import GZipMiddleware
+from starlette.responses import FileResponse, Response
+from starlette.staticfiles import StaticFiles, NotModifiedResponse
+import metrics
+
+try:
+    import brotli
+except ImportError:  # Optional; without it only gzip variants are written
+    brotli = None
+
+# Static asset settings
+STATIC_DIR = os.getenv("STATIC_DIR", "static")
+ASSET_MAX_AGE = int(os.getenv("ASSET_MAX_AGE", 3600))  # For URLs without a fingerprint, e.g. /static/site.webmanifest
+ASSET_COMPRESS_MIN_SIZE = int(os.getenv("ASSET_COMPRESS_MIN_SIZE", 512))
+COMPRESSIBLE_EXTENSIONS = {".css", ".js", ".svg", ".ico", ".json", ".webmanifest", ".txt", ".html"}
+
+IMMUTABLE_CACHE_CONTROL = "public, max-age=31536000, immutable"
+# Preferred first
+ENCODINGS = (("br", ".br"), ("gzip", ".gz"))
+
+# name.<12 hex digits>.ext
+_FINGERPRINTED = re.compile(r"^(?P<stem>.+)\.(?P<digest>[0-9a-f]{12})(?P<ext>\.[^./]+)$")
+
+assets_served = metrics.REGISTRY.register(metrics.Counter(
+    "learnai_static_assets_served_total",
+    "Static asset responses by content encoding",
+    labels=("encoding",),
+))
+
+mimetypes.add_type("application/manifest+json", ".webmanifest")
+
+
+def _compress(data: bytes, encoding: str) -> bytes:
+    if encoding == "br":
+        return brotli.compress(data, quality=11)
+    # mtime=0 so rebuilding unchanged files gives identical bytes
+    return gzip.compress(data, compresslevel=9, mtime=0)
+
+
+class AssetManifest:
+    """
+    Content fingerprints and precompressed variants of the static files.
+
+    Built once at startup with no separate build step: each file gets a
+    digest of its contents for cache-busting URLs, and compressible files
+    get .gz (and .br when brotli is installed) siblings written next to
+    them, refreshed whenever the source is newer.
+    """
+
+    def __init__(self, directory: str = STATIC_DIR):
+        self.directory = directory
+        self.digests: Dict[str, str] = {}  # Relative path -> content digest
+        self.encodings: Dict[str, Set[str]] = {}  # Relative path -> available precompressed encodings
+        self.built = False
+
+    def _precompress(self, full_path: str, data: bytes) -> Set[str]:
+        available = set()
+        mtime = os.stat(full_path).st_mtime
+        for encoding, suffix in ENCODINGS:
+            if encoding == "br" and brotli is None:
+                continue
+            variant = full_path + suffix
+            if not os.path.exists(variant) or os.stat(variant).st_mtime < mtime:
+                compressed = _compress(data, encoding)
+                if len(compressed) >= len(data) * 0.9:
+                    continue  # Not worth a Content-Encoding
+                try:
+                    # Written aside and renamed, so a reader never sees a partial file
+                    with open(variant + ".tmp", "wb") as f:
+                        f.write(compressed)
+                    os.replace(variant + ".tmp", variant)
+                except OSError as e:
+                    # e.g. a read-only deployment; the file is still served, just uncompressed
+                    print(f"Error writing {variant}: {e}")
+                    continue
+            available.add(encoding)
+        return available
+
+    def build(self):
+        digests, encodings = {}, {}
+        for root, _, files in os.walk(self.directory):
+            for name in files:
+                if name.endswith((".gz", ".br", ".tmp")):
+                    continue
+                full_path = os.path.join(root, name)
+                path = os.path.relpath(full_path, self.directory).replace(os.sep, "/")
+                with open(full_path, "rb") as f:
+                    data = f.read()
+                digests[path] = hashlib.sha256(data).hexdigest()[:12]
+                if os.path.splitext(name)[1] in COMPRESSIBLE_EXTENSIONS and len(data) >= ASSET_COMPRESS_MIN_SIZE:
+                    encodings[path] = self._precompress(full_path, data)
+        self.digests, self.encodings = digests, encodings
+        self.built = True
+
+    def url(self, path: str) -> str:
+        if not self.built:
+            self.build()
+        digest = self.digests.get(path)
+        if digest is None:
+            return f"/static/{path}"
+        stem, ext = os.path.splitext(path)
+        return f"/static/{stem}.{digest}{ext}"
+
+    def resolve(self, path: str) -> Tuple[str, bool]:
+        """Map a requested path to the file on disk, and whether it's a current fingerprinted URL"""
+        match = _FINGERPRINTED.match(path)
+        if match:
+            original = match["stem"] + match["ext"]
+            if original in self.digests:
+                return original, self.digests[original] == match["digest"]
+        return path, False
+
+
+manifest = AssetManifest()
+
+
+def asset_url(path: str) -> str:
+    """Fingerprinted URL of a file under static/, for templates"""
+    return manifest.url(path)
+
+
+def _accepted(scope) -> Set[str]:
+    accept = Headers(scope=scope).get("accept-encoding", "")
+    return {part.split(";")[0].strip() for part in accept.split(",")}
+
+
+class AssetFiles(StaticFiles):
+    """
+    StaticFiles serving precompressed variants and long-lived cache headers.
+
+    A fingerprinted URL changes whenever the file does, so its response can
+    be cached forever. Anything else is cached briefly and revalidated with
+    the ETag StaticFiles already sends.
+    """
+
+    def __init__(self, manifest: AssetManifest = manifest, **kwargs):
+        super().__init__(directory=manifest.directory, **kwargs)
+        self.manifest = manifest
+
+    async def get_response(self, path: str, scope) -> Response:
+        original, immutable = self.manifest.resolve(path.replace(os.sep, "/"))
+        response = await super().get_response(original, scope)
+        if response.status_code in (200, 304):
+            response.headers["Cache-Control"] = IMMUTABLE_CACHE_CONTROL if immutable else f"public, max-age={ASSET_MAX_AGE}"
+        return response
+
+    def file_response(self, full_path, stat_result, scope, status_code: int = 200) -> Response:
+        path = os.path.relpath(full_path, os.path.realpath(self.manifest.directory)).replace(os.sep, "/")
+        available = self.manifest.encodings.get(path, ())
+        accepted = _accepted(scope) if available else ()
+        encoding = next((e for e, _ in ENCODINGS if e in available and e in accepted), None)
+        media_type = mimetypes.guess_type(str(full_path))[0] or "text/plain"
+        if encoding:
+            variant = str(full_path) + dict(ENCODINGS)[encoding]
+            response = FileResponse(variant, status_code=status_code, stat_result=os.stat(variant), media_type=media_type)
+            response.headers["Content-Encoding"] = encoding
+        else:
+            response = FileResponse(full_path, status_code=status_code, stat_result=stat_result, media_type=media_type)
+        if available:
+            response.headers["Vary"] = "Accept-Encoding"
+        assets_served.inc(encoding=encoding or "identity")
+        if self.is_not_modified(response.headers, Headers(scope=scope)):
+            return NotModifiedResponse(response.headers)
+        return response
+
+
+def is_compressible(path: str) -> bool:
+    """Whether a response for this request path is worth gzipping on the fly"""
+    if not path.startswith("/static/"):
+        return True
+    return os.path.splitext(path)[1] in COMPRESSIBLE_EXTENSIONS
+
+
+class AssetAwareGZipMiddleware(GZipMiddleware):
+    """
+    GZipMiddleware that leaves static images alone.
+
+    PNGs and the like are already compressed, so gzipping them again costs
+    CPU on every request for no smaller a body.
+    """
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] == "http" and not is_compressible(scope["path"]):
+            await self.app(scope, receive, send)
+            return
+        await super().__call__(scope, receive, send)
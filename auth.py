@@ -1,13 +1,16 @@
 import os
+import time
 from datetime import datetime, timedelta, timezone
-from typing import Optional, Annotated
+from typing import Optional
 from jose import JWTError, jwt
 from fastapi import Depends, HTTPException, status
 from fastapi.security import OAuth2PasswordBearer, OAuth2PasswordRequestForm
-from passlib.context import CryptContext
 from pydantic import BaseModel
+from cachetools import TLRUCache, TTLCache
 from models import User
 from database import DatabaseService
+import passwords
+import state
 
 # Security settings
 SECRET_KEY = os.environ.get("SECRET_KEY", "your-secret-key")
@@ -15,7 +18,11 @@ ALGORITHM = "HS256"
 ACCESS_TOKEN_EXPIRE_MINUTES = 30
 REFRESH_TOKEN_EXPIRE_DAYS = 30  # For refresh tokens
 
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+# Auth caches: decoded tokens live until their exp, user principals for a short TTL
+TOKEN_CACHE_SIZE = int(os.environ.get("AUTH_TOKEN_CACHE_SIZE", 10000))
+PRINCIPAL_CACHE_SIZE = int(os.environ.get("AUTH_PRINCIPAL_CACHE_SIZE", 10000))
+PRINCIPAL_CACHE_TTL = float(os.environ.get("AUTH_PRINCIPAL_CACHE_TTL", 60))
+
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="token")
 
 class Token(BaseModel):
@@ -46,11 +53,9 @@ class UserResponse(BaseModel):
 
 # Password hashing
 
-def hash_password(password: str) -> str:
-    return pwd_context.hash(password)
-
-def verify_password(plain_password: str, hashed_password: str) -> bool:
-    return pwd_context.verify(plain_password, hashed_password)
+# Hashing runs in a process pool; see passwords.py
+hash_password = passwords.hash_password
+verify_password = passwords.verify_password
 
 # JWT creation
 
@@ -67,55 +72,21 @@ def create_access_token(data: dict, expires_delta: Optional[timedelta] = None, t
     encoded_jwt = jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
     return encoded_jwt
 
-# User lookup (replace with DB)
-async def get_user(username: str) -> Optional[User]:
-    return await DatabaseService.get_user_by_username(username)
-
-# Authentication dependencies
-async def get_current_user(token: Annotated[str, Depends(oauth2_scheme)]):
-    credentials_exception = HTTPException(
-        status_code=status.HTTP_401_UNAUTHORIZED,
-        detail="Could not validate credentials",
-        headers={"WWW-Authenticate": "Bearer"},
-    )
-    try:
-        # Print token for debugging
-        print(f"[DEBUG] Token received: {token[:20]}...")
-        
-        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
-        username: str = payload.get("sub")
-        if username is None:
-            print("[DEBUG] No username in token")
-            raise credentials_exception
-            
-        print(f"[DEBUG] Username from token: {username}")
-    except JWTError as e:
-        print(f"[DEBUG] JWT Error: {str(e)}")
-        raise credentials_exception
-        
-    user = await get_user(username)
-    if user is None:
-        print(f"[DEBUG] User not found: {username}")
-        raise credentials_exception
-        
-    print(f"[DEBUG] User authenticated: {username}")
-    return user
-
-async def get_current_active_user(current_user: Annotated[User, Depends(get_current_user)]):
-    return current_user
-
-# Classes already defined above
-
 # User lookup - use DatabaseService directly
 async def get_user(username: str) -> Optional[User]:
     """Get user by username"""
     return await DatabaseService.get_user_by_username(username)
 
 async def authenticate_user(username: str, password: str) -> Optional[User]:
-    """Authenticate user with username and password"""
+    """Authenticate user with username and password, upgrading an outdated hash"""
     user = await get_user(username)
-    if not user or not User.verify_password(password, user.hashed_password):
+    if not user:
+        return None
+    valid, new_hash = await passwords.verify_password(password, user.hashed_password)
+    if not valid:
         return None
+    if new_hash:
+        await DatabaseService.update_password(user.id, new_hash)
     return user
 
 def create_token(data: dict, token_type: str = "access", expires_delta: Optional[timedelta] = None) -> str:
@@ -171,8 +142,29 @@ class InvalidTokenError(TokenError):
     """Raised when token is invalid"""
     pass
 
-async def decode_token(token: str, required_type: str = None) -> TokenData:
-    """Decode and validate JWT token"""
+# Tokens are immutable, so a decoded token stays valid until its exp claim
+_token_cache = TLRUCache(maxsize=TOKEN_CACHE_SIZE, ttu=lambda token, data, now: data.exp, timer=time.time)
+# Slim user records keyed by username, so authenticated requests skip the database
+_principal_cache = TTLCache(maxsize=PRINCIPAL_CACHE_SIZE, ttl=PRINCIPAL_CACHE_TTL)
+
+AUTH_INVALIDATION_CHANNEL = "auth:invalidate"
+
+async def invalidate_user(username: str):
+    """Drop a cached principal in every worker, e.g. after a password reset or account deletion"""
+    _principal_cache.pop(username, None)
+    await state.store.publish(AUTH_INVALIDATION_CHANNEL, {"username": username})
+
+async def listen_for_invalidations():
+    """Apply invalidations published by other workers; runs for the app's lifetime"""
+    with state.store.subscribe(AUTH_INVALIDATION_CHANNEL) as queue:
+        while True:
+            message = await queue.get()
+            _principal_cache.pop(message["username"], None)
+
+def _decode_token(token: str) -> TokenData:
+    cached = _token_cache.get(token)
+    if cached is not None:
+        return cached
     try:
         # Let PyJWT handle expiration validation
         payload = jwt.decode(
@@ -187,53 +179,74 @@ async def decode_token(token: str, required_type: str = None) -> TokenData:
         token_type: str = payload.get("token_type")
         exp: int = payload.get("exp")
         
-        # Debug info
-        now = datetime.now(timezone.utc)
-        if exp:
-            exp_time = datetime.fromtimestamp(exp, tz=timezone.utc)
-            print(f"[DEBUG] Token expires at: {exp_time}, Current time: {now}, Delta: {exp_time - now}")
-        
         if username is None:
             raise InvalidTokenError("Token missing username")
-            
-        if required_type and token_type != required_type:
-            raise InvalidTokenError(f"Expected {required_type} token but got {token_type}")
-            
-        # We don't need to check expiration here as PyJWT already did it
-        # But we'll keep the exp field in the returned data
-        return TokenData(username=username, token_type=token_type, exp=exp)
-        
+        if exp is None:
+            raise InvalidTokenError("Token missing expiry")
     except jwt.ExpiredSignatureError:
         raise TokenExpiredError("Token has expired")
     except jwt.JWTError:
         raise InvalidTokenError("Could not validate token")
 
-async def get_current_user(token: str = Depends(oauth2_scheme)) -> User:
-    print(f"[AUTH DEBUG] Received token: {token}")
+    # We don't need to check expiration on cache hits, the cache drops
+    # entries at their exp
+    token_data = TokenData(username=username, token_type=token_type, exp=exp)
+    _token_cache[token] = token_data
+    return token_data
+
+async def decode_token(token: str, required_type: str = None) -> TokenData:
+    """Decode and validate JWT token"""
+    token_data = _decode_token(token)
+    if required_type and token_data.token_type != required_type:
+        raise InvalidTokenError(f"Expected {required_type} token but got {token_data.token_type}")
+    return token_data
+
+async def get_principal(username: str) -> Optional[UserResponse]:
+    """Slim cached view of a user (id, username, email, is_active, created_at)"""
+    principal = _principal_cache.get(username)
+    if principal is None:
+        user = await get_user(username)
+        if user is None:
+            return None
+        principal = UserResponse.model_validate(user)
+        _principal_cache[username] = principal
+    return principal
+
+async def get_user_from_token(token: str) -> Optional[UserResponse]:
+    """Resolve an access token posted in a form; None if it is invalid or the user is gone"""
+    try:
+        token_data = await decode_token(token, required_type="access")
+    except TokenError:
+        return None
+    return await get_principal(token_data.username)
+
+async def get_current_user(token: str = Depends(oauth2_scheme)) -> UserResponse:
     """Get current authenticated user from JWT token"""
     try:
         token_data = await decode_token(token, required_type="access")
     except TokenExpiredError as e:
-        print(f"[AUTH DEBUG] TokenExpiredError: {e}")
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Token has expired",
             headers={"WWW-Authenticate": "Bearer"},
         )
     except TokenError as e:
-        print(f"[AUTH DEBUG] TokenError: {e}")
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail=str(e),
             headers={"WWW-Authenticate": "Bearer"},
         )
     
-    user = await get_user(token_data.username)
+    user = await get_principal(token_data.username)
     if user is None:
-        raise credentials_exception
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Could not validate credentials",
+            headers={"WWW-Authenticate": "Bearer"},
+        )
     return user
 
-async def get_current_active_user(current_user: User = Depends(get_current_user)) -> User:
+async def get_current_active_user(current_user: UserResponse = Depends(get_current_user)) -> UserResponse:
     """Get current active user"""
     if not current_user.is_active:
         raise HTTPException(status_code=400, detail="Inactive user")
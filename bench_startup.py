@@ -0,0 +1,92 @@
+"""
+Measure cold-start cost of the app.
+
+Each run starts a fresh interpreter and records how long it takes to
+import main, to get through the lifespan startup (when the server can
+accept requests) and to finish the background warm-up (when /readyz turns
+ready). Runs against the databases in the current directory, like the
+server does.
+
+    python bench_startup.py --runs 5
+    python bench_startup.py --importtime 15   # also list the slowest imports
+"""
+import sys
+import json
+import argparse
+import statistics
+import subprocess
+
+CHILD = """
+import time, json, asyncio
+start = time.perf_counter()
+import main
+imported = time.perf_counter()
+
+async def boot():
+    async with main.app.router.lifespan_context(main.app):
+        booted = time.perf_counter()
+        while not main.readiness["services"] and not main.readiness["error"]:
+            await asyncio.sleep(0.01)
+        ready = time.perf_counter()
+    return booted, ready
+
+booted, ready = asyncio.run(boot())
+print(json.dumps({
+    "import": imported - start,
+    "boot": booted - imported,
+    "warm_up": ready - booted,
+    "total": ready - start,
+    "error": main.readiness["error"],
+}))
+"""
+
+
+def run_once() -> dict:
+    result = subprocess.run(
+        [sys.executable, "-c", CHILD],
+        capture_output=True, text=True, check=True
+    )
+    # The app prints startup messages; the measurement is the last line
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+
+def slowest_imports(limit: int) -> list:
+    """Cumulative import time per top-level module, from -X importtime"""
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", "import main"],
+        capture_output=True, text=True, check=True
+    )
+    totals = []
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "|" not in line:
+            continue
+        _, cumulative, name = line[len("import time:"):].split("|")
+        if cumulative.strip().isdigit() and not name.startswith("  "):
+            totals.append((int(cumulative) / 1e6, name.strip()))
+    return sorted(totals, reverse=True)[:limit]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--importtime", type=int, default=0, metavar="N",
+                        help="also show the N slowest top-level imports")
+    args = parser.parse_args()
+
+    runs = [run_once() for _ in range(args.runs)]
+    errors = {run["error"] for run in runs if run["error"]}
+    print(f"{'stage':<10}{'median':>10}{'max':>10}")
+    for stage in ("import", "boot", "warm_up", "total"):
+        values = [run[stage] for run in runs]
+        print(f"{stage:<10}{statistics.median(values):>9.3f}s{max(values):>9.3f}s")
+    if errors:
+        print(f"Warm-up failed: {', '.join(errors)}")
+
+    if args.importtime:
+        print("\nslowest imports (cumulative):")
+        for seconds, name in slowest_imports(args.importtime):
+            print(f"{seconds:>9.3f}s  {name}")
+
+
+if __name__ == "__main__":
+    main()
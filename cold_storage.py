@@ -0,0 +1,76 @@
+import os
+import json
+import mmap
+import threading
+from typing import Dict, Tuple
+from compression import compress, decompress
+
+# Cold tier settings
+COLD_STORAGE_DIR = os.getenv("COLD_STORAGE_DIR", "cold_storage")
+COLD_SEGMENT_MAX_BYTES = int(os.getenv("COLD_SEGMENT_MAX_BYTES", 64 * 1024 * 1024))
+COLD_AFTER_DAYS = float(os.getenv("COLD_AFTER_DAYS", 30))  # Idle time before a dashboard is archived
+COLD_ARCHIVE_INTERVAL_HOURS = float(os.getenv("COLD_ARCHIVE_INTERVAL_HOURS", 6))
+
+
+class ColdStore:
+    """
+    Append-only segment files holding compressed records.
+
+    Records are addressed by (segment, offset, length) and read through a
+    read-only memory map, so only the pages of records actually opened are
+    paged in. Space of records that are later thawed is not reclaimed.
+    """
+
+    def __init__(self, directory: str = COLD_STORAGE_DIR, segment_max_bytes: int = COLD_SEGMENT_MAX_BYTES):
+        self.directory = directory
+        self.segment_max_bytes = segment_max_bytes
+        self._write_lock = threading.Lock()
+        self._maps: Dict[str, mmap.mmap] = {}
+        self._map_lock = threading.Lock()
+
+    def _segment_path(self, segment: str) -> str:
+        return os.path.join(self.directory, segment)
+
+    def _current_segment(self) -> str:
+        os.makedirs(self.directory, exist_ok=True)
+        segments = sorted(name for name in os.listdir(self.directory) if name.endswith(".seg"))
+        if segments and os.path.getsize(self._segment_path(segments[-1])) < self.segment_max_bytes:
+            return segments[-1]
+        return f"{len(segments):06d}.seg"
+
+    def append(self, record: dict) -> Tuple[str, int, int]:
+        """Compress and durably append a record; returns its (segment, offset, length)"""
+        data = compress(json.dumps(record).encode("utf-8"))
+        with self._write_lock:
+            segment = self._current_segment()
+            with open(self._segment_path(segment), "ab") as f:
+                offset = f.tell()
+                f.write(data)
+                f.flush()
+                os.fsync(f.fileno())
+        return segment, offset, len(data)
+
+    def _map(self, segment: str, end: int) -> mmap.mmap:
+        with self._map_lock:
+            mapped = self._maps.get(segment)
+            # Segments grow, so remap when a record lies past the mapped size
+            if mapped is None or len(mapped) < end:
+                if mapped is not None:
+                    mapped.close()
+                with open(self._segment_path(segment), "rb") as f:
+                    mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+                self._maps[segment] = mapped
+            return mapped
+
+    def read(self, segment: str, offset: int, length: int) -> dict:
+        mapped = self._map(segment, offset + length)
+        return json.loads(decompress(mapped[offset:offset + length]))
+
+    def close(self):
+        with self._map_lock:
+            for mapped in self._maps.values():
+                mapped.close()
+            self._maps.clear()
+
+
+cold_store = ColdStore()
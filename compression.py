@@ -0,0 +1,88 @@
+import os
+import json
+import zlib
+from sqlalchemy import String
+from sqlalchemy.types import TypeDecorator
+
+try:
+    import zstandard
+except ImportError:  # zstd is optional; zlib is always available
+    zstandard = None
+
+# Compression settings
+COMPRESSION_CODEC = os.getenv("COMPRESSION_CODEC", "zstd" if zstandard else "zlib")
+COMPRESSION_MIN_BYTES = int(os.getenv("COMPRESSION_MIN_BYTES", 512))
+
+# Compressed values start with a magic prefix and a codec byte, so plain
+# text written before compression was enabled still reads back unchanged
+_MAGIC = b"\x00LZ"
+_ZLIB = b"z"
+_ZSTD = b"s"
+
+
+def compress(data: bytes) -> bytes:
+    if COMPRESSION_CODEC == "zstd":
+        if zstandard is None:
+            raise RuntimeError("COMPRESSION_CODEC=zstd requires the zstandard package")
+        return _MAGIC + _ZSTD + zstandard.ZstdCompressor(level=6).compress(data)
+    return _MAGIC + _ZLIB + zlib.compress(data, 6)
+
+
+def decompress(data: bytes) -> bytes:
+    if not data.startswith(_MAGIC):
+        return data
+    codec, payload = data[len(_MAGIC):len(_MAGIC) + 1], data[len(_MAGIC) + 1:]
+    if codec == _ZLIB:
+        return zlib.decompress(payload)
+    if codec == _ZSTD:
+        if zstandard is None:
+            raise RuntimeError("Value was compressed with zstd but the zstandard package is not installed")
+        return zstandard.ZstdDecompressor().decompress(payload)
+    raise ValueError(f"Unknown compression codec {codec!r}")
+
+
+def compress_text(text: str):
+    """Compress text above the size threshold; small values are stored as-is"""
+    data = text.encode("utf-8")
+    if len(data) < COMPRESSION_MIN_BYTES:
+        return text
+    return compress(data)
+
+
+def decompress_text(value) -> str:
+    if isinstance(value, (bytes, bytearray, memoryview)):
+        return decompress(bytes(value)).decode("utf-8")
+    return value
+
+
+class CompressedText(TypeDecorator):
+    """Text column stored compressed once it is large enough to be worth it"""
+    # SQLite stores the compressed bytes as a BLOB in the same TEXT column
+    impl = String
+    cache_ok = True
+
+    def process_bind_param(self, value, dialect):
+        if value is None:
+            return None
+        return compress_text(value)
+
+    def process_result_value(self, value, dialect):
+        if value is None:
+            return None
+        return decompress_text(value)
+
+
+class CompressedJSON(TypeDecorator):
+    """JSON column stored compressed once it is large enough to be worth it"""
+    impl = String
+    cache_ok = True
+
+    def process_bind_param(self, value, dialect):
+        if value is None:
+            return None
+        return compress_text(json.dumps(value))
+
+    def process_result_value(self, value, dialect):
+        if value is None:
+            return None
+        return json.loads(decompress_text(value))
@@ -1,31 +1,366 @@
 from sqlalchemy.ext.asyncio import create_async_engine, AsyncSession
 from sqlalchemy.orm import sessionmaker
 from sqlalchemy.ext.asyncio import async_sessionmaker
-from sqlalchemy import select, delete
-from models import Base, Dashboard, QuizAttempt, User
+from sqlalchemy import select, delete, update, insert, func, null, tuple_, case, and_, or_, text
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from models import (
+    Base, Dashboard, NoteCheckpoint, NoteJob, OutboundMail, QuizAttempt, QuizQuestionEntry, User, UserStats, notes_fts,
+    search_owner_token, CONTENTLESS_DELETE
+)
 import asyncio
 import os
+import base64
+import html
+import re
+import uuid
+from datetime import datetime, timedelta
+from typing import Optional
+import metrics
+import tracing
+import prefetch
+import passwords
+from storage import WriteQueue, configure_sqlite
+from cold_storage import cold_store, COLD_AFTER_DAYS
 
-# Create async database engine
-DATABASE_URL = 'sqlite+aiosqlite:///learnai.db'
-engine = create_async_engine(DATABASE_URL)#, echo=True)  # echo=True for debugging
-async_session = async_sessionmaker(engine, class_=AsyncSession, expire_on_commit=False)
+# Create async database engines
+DATABASE_URL = os.getenv("DATABASE_URL", 'sqlite+aiosqlite:///learnai.db')
+READ_POOL_SIZE = int(os.getenv("DB_READ_POOL_SIZE", 8))
+# How long a question refill may go without renewing its lease before another worker takes over
+GENERATION_LEASE_SECONDS = float(os.getenv("GENERATION_LEASE_SECONDS", 180))
+# How long a notes job may go without finishing a chunk before it can be resumed elsewhere
+NOTE_JOB_LEASE_SECONDS = float(os.getenv("NOTE_JOB_LEASE_SECONDS", 600))
 
+# A single connection owns all writes; SQLite only ever has one writer anyway
+engine = create_async_engine(DATABASE_URL, pool_size=1, max_overflow=0)#, echo=True)  # echo=True for debugging
+configure_sqlite(engine, writer=True)
+write_session = async_sessionmaker(engine, class_=AsyncSession, expire_on_commit=False)
+writer = WriteQueue(write_session)
+
+# Reads run concurrently on a separate pool of query-only connections
+read_engine = create_async_engine(DATABASE_URL, pool_size=READ_POOL_SIZE, max_overflow=0)
+configure_sqlite(read_engine, writer=False)
+async_session = async_sessionmaker(read_engine, class_=AsyncSession, expire_on_commit=False)
+
+QUESTIONS_PER_SET = 10
+
+async def _next_question_position(session: AsyncSession, session_id: str) -> int:
+    """Position the next appended question will take"""
+    result = await session.execute(
+        select(func.max(QuizQuestionEntry.position)).where(QuizQuestionEntry.dashboard_id == session_id)
+    )
+    last = result.scalar()
+    return 0 if last is None else last + 1
+
+NOTES_PREVIEW_LENGTH = 100
+
+def make_notes_preview(notes: Optional[str]) -> str:
+    """First 100 characters of notes, with an ellipsis if they were cut"""
+    notes = notes or ""
+    return notes[:NOTES_PREVIEW_LENGTH] + "..." if len(notes) > NOTES_PREVIEW_LENGTH else notes
+
+def encode_dashboard_cursor(created_at: datetime, session_id: str) -> str:
+    raw = f"{created_at.isoformat()}|{session_id}"
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+def decode_dashboard_cursor(cursor: str) -> tuple:
+    """Decode a listing cursor into (created_at, id); raises ValueError if malformed"""
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)).decode()
+        created_at, session_id = raw.split("|", 1)
+        return datetime.fromisoformat(created_at), session_id
+    except Exception as e:
+        raise ValueError("Invalid cursor") from e
+
+async def _bump_user_stats(session: AsyncSession, user_id: int, dashboards: int = 0, quizzes: int = 0,
+                           questions: int = 0, correct: int = 0, best_streak: int = 0):
+    """Add deltas to a user's stats row, creating it on first use"""
+    stmt = sqlite_insert(UserStats).values(
+        user_id=user_id,
+        total_dashboards=dashboards,
+        total_quizzes=quizzes,
+        total_questions=questions,
+        total_correct=correct,
+        best_streak=best_streak
+    )
+    await session.execute(stmt.on_conflict_do_update(
+        index_elements=[UserStats.user_id],
+        set_={
+            "total_dashboards": UserStats.total_dashboards + stmt.excluded.total_dashboards,
+            "total_quizzes": UserStats.total_quizzes + stmt.excluded.total_quizzes,
+            "total_questions": UserStats.total_questions + stmt.excluded.total_questions,
+            "total_correct": UserStats.total_correct + stmt.excluded.total_correct,
+            "best_streak": func.max(UserStats.best_streak, stmt.excluded.best_streak),
+        }
+    ))
+
+async def _remove_from_user_stats(session: AsyncSession, user_id: int, dashboards: list):
+    """Subtract deleted dashboards from a user's stats; best streak is recomputed from what remains"""
+    remaining_best = select(func.coalesce(func.max(Dashboard.best_streak), 0)).where(
+        Dashboard.user_id == user_id
+    ).scalar_subquery()
+    await session.execute(
+        update(UserStats)
+        .where(UserStats.user_id == user_id)
+        .values(
+            total_dashboards=UserStats.total_dashboards - len(dashboards),
+            total_quizzes=UserStats.total_quizzes - sum(1 for d in dashboards if d.total_questions),
+            total_questions=UserStats.total_questions - sum(d.total_questions or 0 for d in dashboards),
+            total_correct=UserStats.total_correct - sum(d.total_correct or 0 for d in dashboards),
+            best_streak=remaining_best
+        )
+    )
+
+# Reads only bump last_accessed_at when it is older than this, to keep reads mostly write-free
+ACCESS_TOUCH_INTERVAL = timedelta(hours=12)
+_COLD_COLUMNS = (Dashboard.cold_segment, Dashboard.cold_offset, Dashboard.cold_length)
+
+async def _touch_dashboard(session_id: str, last_accessed_at: Optional[datetime]):
+    """Record that a dashboard was used, so it isn't archived while active"""
+    now = datetime.utcnow()
+    if last_accessed_at is not None and now - last_accessed_at < ACCESS_TOUCH_INTERVAL:
+        return
+
+    async def _touch(session: AsyncSession):
+        await session.execute(update(Dashboard).where(Dashboard.id == session_id).values(last_accessed_at=now))
+
+    await writer.submit(_touch)
+
+async def _record_served_set(session_id: str, dashboard, set_number: int, buffered_sets: int) -> prefetch.PrefetchState:
+    """
+    Advance the dashboard's served position and answer rate when set_number
+    moves past it, and return the prefetch state that results.
+
+    Only sets that exist, or the one right after them, count as served, so a
+    client can't push the position arbitrarily far ahead.
+    """
+    now = datetime.utcnow()
+    current_set = dashboard.current_set or 0
+    current_set_at = dashboard.current_set_at
+    seconds_per_set = dashboard.seconds_per_set
+    stale = current_set_at is None or (now - current_set_at).total_seconds() > prefetch.PREFETCH_IDLE_SECONDS / 2
+
+    if current_set < set_number <= buffered_sets:
+        if current_set_at is not None:
+            elapsed = (now - current_set_at).total_seconds()
+            seconds_per_set = prefetch.update_rate(seconds_per_set, set_number - current_set, elapsed)
+        values = {"current_set": set_number, "current_set_at": now, "seconds_per_set": seconds_per_set}
+        # Concurrent tabs may race; the position only ever moves forward
+        condition = and_(Dashboard.id == session_id, func.coalesce(Dashboard.current_set, 0) < set_number)
+        current_set, current_set_at = set_number, now
+    elif set_number == current_set and stale:
+        # A user back on the same set is active again, so refills resume
+        values = {"current_set_at": now}
+        condition = Dashboard.id == session_id
+        current_set_at = now
+    else:
+        await _touch_dashboard(session_id, dashboard.last_accessed_at)
+        return prefetch.PrefetchState(current_set, buffered_sets, seconds_per_set, current_set_at)
+
+    async def _advance(session: AsyncSession):
+        await session.execute(update(Dashboard).where(condition).values(last_accessed_at=now, **values))
+
+    await writer.submit(_advance)
+    return prefetch.PrefetchState(current_set, buffered_sets, seconds_per_set, current_set_at)
+
+# strftime formats for analytics time buckets; each sorts chronologically as text
+ANALYTICS_BUCKETS = {
+    "hour": "%Y-%m-%d %H:00",
+    "day": "%Y-%m-%d",
+    "week": "%Y-W%W",
+    "month": "%Y-%m",
+}
+
+async def _attempt_trend(session: AsyncSession, condition, bucket: str, window: int, since: datetime) -> list:
+    """
+    Bucket quiz attempts by time and compute rolling accuracy and streak history.
+
+    Aggregation and the window functions run in SQLite, so only one row per
+    bucket is returned however many attempts there are.
+    """
+    bucket_key = func.strftime(ANALYTICS_BUCKETS[bucket], QuizAttempt.created_at).label("bucket")
+    buckets = (
+        select(
+            bucket_key,
+            func.count().label("attempts"),
+            func.sum(QuizAttempt.questions_answered).label("questions"),
+            func.sum(QuizAttempt.correct_answers).label("correct"),
+            func.avg(QuizAttempt.score).label("avg_score"),
+            func.max(QuizAttempt.streak).label("best_streak")
+        )
+        .where(condition, QuizAttempt.created_at >= since)
+        .group_by(bucket_key)
+        .subquery()
+    )
+    # Rolling accuracy covers the last `window` non-empty buckets
+    rolling = {"order_by": buckets.c.bucket, "rows": (-(window - 1), 0)}
+    to_date = {"order_by": buckets.c.bucket, "rows": (None, 0)}
+    result = await session.execute(
+        select(
+            buckets.c.bucket,
+            buckets.c.attempts,
+            buckets.c.questions,
+            buckets.c.correct,
+            func.round(buckets.c.avg_score, 1).label("avg_score"),
+            buckets.c.best_streak,
+            func.round(
+                func.sum(buckets.c.correct).over(**rolling) * 100.0
+                / func.nullif(func.sum(buckets.c.questions).over(**rolling), 0),
+                1
+            ).label("rolling_accuracy"),
+            func.max(buckets.c.best_streak).over(**to_date).label("best_streak_to_date"),
+            func.sum(buckets.c.attempts).over(**to_date).label("attempts_to_date")
+        ).order_by(buckets.c.bucket)
+    )
+    return [dict(row._mapping) for row in result]
+
+_SEARCH_QUERY = text("""
+    SELECT dashboards.id AS id,
+           dashboards.notes_preview AS notes_preview,
+           dashboards.created_at AS created_at,
+           bm25(notes_fts, 1.0, 0.0) AS rank
+    FROM notes_fts
+    JOIN dashboards ON dashboards.search_rowid = notes_fts.rowid
+    WHERE notes_fts MATCH :query
+    ORDER BY rank
+    LIMIT :limit OFFSET :offset
+""")
+
+def _search_words(terms: str) -> list:
+    return re.findall(r"\w+", terms)
+
+def build_match_query(terms: str, user_id: int) -> Optional[str]:
+    """
+    Turn free text into an FTS5 query that matches all of its words in one user's notes.
+
+    Every word is quoted so FTS5 operators and column filters typed by the
+    user are searched for literally; the last word is a prefix match.
+    """
+    words = _search_words(terms)
+    if not words:
+        return None
+    quoted = ['"' + word.replace('"', '""') + '"' for word in words]
+    quoted[-1] += "*"
+    return f'owner : "{search_owner_token(user_id)}" AND notes : ({" ".join(quoted)})'
+
+def _render_snippet(preview: str, words: list, highlight: bool) -> str:
+    """
+    The notes preview as a search snippet, with the searched words marked.
+
+    The index is contentless, so FTS5 can't build snippets itself; words are
+    marked where they appear literally (the last one as a prefix), which
+    misses matches found only through stemming.
+    """
+    preview = preview or ""
+    if not highlight:
+        return preview
+    pattern = re.compile(
+        r"\b(?:" + "|".join([re.escape(word) + r"\b" for word in words[:-1]] + [re.escape(words[-1])]) + r")\w*",
+        re.IGNORECASE
+    )
+    parts, last = [], 0
+    for match in pattern.finditer(preview):
+        parts.append(html.escape(preview[last:match.start()]))
+        parts.append(f"<mark>{html.escape(match.group())}</mark>")
+        last = match.end()
+    parts.append(html.escape(preview[last:]))
+    return "".join(parts)
+
+async def _index_notes(session: AsyncSession, session_id: str, user_id: int, notes: str):
+    result = await session.execute(insert(notes_fts).values(notes=notes, owner=search_owner_token(user_id)))
+    await session.execute(
+        update(Dashboard)
+        .where(Dashboard.id == session_id)
+        .values(search_indexed=True, search_rowid=result.lastrowid)
+    )
+
+async def _unindex_notes(session: AsyncSession, condition):
+    """Remove matching dashboards' notes from the search index"""
+    if CONTENTLESS_DELETE:
+        await session.execute(
+            delete(notes_fts).where(notes_fts.c.rowid.in_(select(Dashboard.search_rowid).where(condition)))
+        )
+        return
+    # Older SQLite removes a contentless row through the 'delete' command,
+    # which needs the text that was indexed
+    result = await session.execute(
+        select(Dashboard.search_rowid, Dashboard.user_id, Dashboard.notes, *_COLD_COLUMNS)
+        .where(condition, Dashboard.search_rowid.isnot(None))
+    )
+    for row in result.all():
+        notes = row.notes
+        if row.cold_segment is not None:
+            notes = cold_store.read(row.cold_segment, row.cold_offset, row.cold_length)["notes"]
+        await session.execute(
+            text("INSERT INTO notes_fts (notes_fts, rowid, notes, owner) VALUES ('delete', :rowid, :notes, :owner)"),
+            {"rowid": row.search_rowid, "notes": notes or "", "owner": search_owner_token(row.user_id)}
+        )
+
+def _due_mail(now: datetime):
+    """Messages ready to send: pending and due, or claimed by a worker whose claim lapsed"""
+    return or_(
+        and_(OutboundMail.status == "pending", OutboundMail.next_attempt_at <= now),
+        and_(OutboundMail.status == "sending", OutboundMail.claim_expires < now)
+    )
+
+async def _delete_dashboards(session: AsyncSession, condition) -> int:
+    """Delete matching dashboards and their children with a fixed number of set-based statements"""
+    result = await session.execute(
+        select(Dashboard.user_id, Dashboard.total_questions, Dashboard.total_correct).where(condition)
+    )
+    deleted = result.all()
+    if not deleted:
+        return 0
+    # Children are deleted explicitly as well, since tables created before
+    # ON DELETE CASCADE was declared don't carry it
+    matching = select(Dashboard.id).where(condition)
+    await _unindex_notes(session, condition)
+    await session.execute(delete(QuizAttempt).where(QuizAttempt.dashboard_id.in_(matching)))
+    await session.execute(delete(QuizQuestionEntry).where(QuizQuestionEntry.dashboard_id.in_(matching)))
+    await session.execute(delete(Dashboard).where(condition))
+    by_user = {}
+    for dashboard in deleted:
+        if dashboard.user_id is not None:
+            by_user.setdefault(dashboard.user_id, []).append(dashboard)
+    for user_id, dashboards in by_user.items():
+        await _remove_from_user_stats(session, user_id, dashboards)
+    return len(deleted)
+
+def _question_entries(session_id: str, start: int, questions: list) -> list:
+    return [
+        QuizQuestionEntry(dashboard_id=session_id, position=start + i, question=question)
+        for i, question in enumerate(questions)
+    ]
+
+@tracing.trace_methods("db")
+@metrics.instrument_db
 class DatabaseService:
     @staticmethod
     async def create_user(email: str, username: str, password: str) -> User:
         """Create a new user"""
-        async with async_session() as session:
-            user = User(
-                email=email,
-                username=username,
-                hashed_password=User.get_password_hash(password)
-            )
+        # Hashed before queueing so bcrypt never holds up the writer
+        user = User(
+            email=email,
+            username=username,
+            hashed_password=await passwords.hash_password(password)
+        )
+
+        async def _create(session: AsyncSession) -> User:
             session.add(user)
-            await session.commit()
-            await session.refresh(user)
+            await session.flush()
             return user
 
+        return await writer.submit(_create)
+
+    @staticmethod
+    async def update_password(user_id: int, hashed_password: str):
+        """Replace a user's password hash"""
+        async def _update(session: AsyncSession):
+            await session.execute(
+                update(User).where(User.id == user_id).values(hashed_password=hashed_password)
+            )
+
+        await writer.submit(_update)
+
     @staticmethod
     async def get_user_by_username(username: str) -> User:
         """Get user by username"""
@@ -46,26 +381,32 @@ class DatabaseService:
     @staticmethod
     async def create_dashboard(session_id: str, user_id: int, notes: str, initial_questions: list) -> Dashboard:
         """Create a new dashboard entry"""
+        async def _create(session: AsyncSession) -> Dashboard:
+            dashboard = Dashboard(
+                id=session_id,
+                user_id=user_id,
+                notes=notes,
+                notes_preview=make_notes_preview(notes),
+                current_set=0,
+                current_set_at=datetime.utcnow()
+            )
+            session.add(dashboard)
+            await session.flush()
+            await _index_notes(session, session_id, user_id, notes)
+            session.add_all(_question_entries(session_id, 0, initial_questions))
+            await _bump_user_stats(session, user_id, dashboards=1)
+            await session.flush()
+            return dashboard
+
         try:
-            async with async_session() as session:
-                dashboard = Dashboard(
-                    id=session_id,
-                    user_id=user_id,
-                    notes=notes,
-                    buffered_questions=initial_questions,
-                    current_set=0
-                )
-                session.add(dashboard)
-                await session.commit()
-                await session.refresh(dashboard)
-                return dashboard
+            return await writer.submit(_create)
         except Exception as e:
             print(f"Error creating dashboard: {e}")
             raise
 
     @staticmethod
     async def get_dashboard(session_id: str) -> Dashboard:
-        """Get dashboard by session ID"""
+        """Get dashboard by session ID, without its relationships"""
         try:
             async with async_session() as session:
                 result = await session.get(Dashboard, session_id)
@@ -75,37 +416,118 @@ class DatabaseService:
             raise
 
     @staticmethod
-    async def update_dashboard_stats(session_id: str, total_questions: int, total_correct: int, best_streak: int):
-        """Update dashboard statistics"""
+    async def dashboard_exists(session_id: str) -> bool:
+        """Check a dashboard exists without loading any of its columns"""
         async with async_session() as session:
-            dashboard = await session.get(Dashboard, session_id)
-            if dashboard:
-                dashboard.total_questions = total_questions
-                dashboard.total_correct = total_correct
-                dashboard.best_streak = best_streak
-                await session.commit()
+            result = await session.execute(select(Dashboard.id).where(Dashboard.id == session_id))
+            return result.scalar_one_or_none() is not None
 
     @staticmethod
-    async def add_quiz_attempt(session_id: str, questions_answered: int, correct_answers: int, streak: int):
-        """Add a new quiz attempt"""
+    async def get_dashboard_versions(session_id: str) -> Optional[dict]:
+        """
+        Owner and stats version of a dashboard, for validating cached copies
+        of its notes and stats without loading them. Counts as an access.
+        """
         async with async_session() as session:
-            score = (correct_answers / questions_answered * 100) if questions_answered > 0 else 0
-            attempt = QuizAttempt(
-                dashboard_id=session_id,
-                questions_answered=questions_answered,
-                correct_answers=correct_answers,
-                score=score,
-                streak=streak
+            result = await session.execute(
+                select(Dashboard.user_id, Dashboard.stats_version, Dashboard.last_accessed_at)
+                .where(Dashboard.id == session_id)
             )
-            session.add(attempt)
-            await session.commit()
-            return attempt
+            row = result.one_or_none()
+        if row is None:
+            return None
+        await _touch_dashboard(session_id, row.last_accessed_at)
+        return {"user_id": row.user_id, "stats_version": row.stats_version or 0}
+
+    @staticmethod
+    async def get_dashboard_notes(session_id: str) -> Optional[str]:
+        """Get only the notes of a dashboard, or None if it doesn't exist"""
+        async with async_session() as session:
+            result = await session.execute(
+                select(Dashboard.notes, Dashboard.last_accessed_at, *_COLD_COLUMNS)
+                .where(Dashboard.id == session_id)
+            )
+            row = result.one_or_none()
+        if row is None:
+            return None
+        await _touch_dashboard(session_id, row.last_accessed_at)
+        if row.cold_segment is not None:
+            # Archived notes are read straight from the memory-mapped segment, in a
+            # thread since decompressing and parsing a large record takes a while
+            record = await metrics.run_in_thread(cold_store.read, row.cold_segment, row.cold_offset, row.cold_length)
+            return record["notes"]
+        return row.notes
+
+    @staticmethod
+    async def record_quiz_results(session_id: str, attempts: list) -> bool:
+        """
+        Insert quiz attempts and fold them into the dashboard totals in one transaction.
+
+        Args:
+            session_id: Dashboard the attempts belong to
+            attempts: Dicts with questions_answered, correct_answers and streak
+
+        Returns:
+            False if the dashboard doesn't exist, in which case nothing is written
+        """
+        rows = [
+            {
+                "dashboard_id": session_id,
+                "questions_answered": a["questions_answered"],
+                "correct_answers": a["correct_answers"],
+                "score": (a["correct_answers"] / a["questions_answered"] * 100) if a["questions_answered"] > 0 else 0,
+                "streak": a.get("streak", 0),
+            }
+            for a in attempts
+        ]
+        total_questions = sum(row["questions_answered"] for row in rows)
+        total_correct = sum(row["correct_answers"] for row in rows)
+        best_streak = max((row["streak"] for row in rows), default=0)
+
+        async def _record(session: AsyncSession) -> bool:
+            before = (await session.execute(
+                select(Dashboard.user_id, Dashboard.total_questions).where(Dashboard.id == session_id)
+            )).one_or_none()
+            if before is None:
+                return False
+            # Increments are applied in SQL so concurrent submissions can't lose updates
+            result = await session.execute(
+                update(Dashboard)
+                .where(Dashboard.id == session_id)
+                .values(
+                    total_questions=Dashboard.total_questions + total_questions,
+                    total_correct=Dashboard.total_correct + total_correct,
+                    best_streak=func.max(Dashboard.best_streak, best_streak),
+                    stats_version=func.coalesce(Dashboard.stats_version, 0) + 1
+                )
+            )
+            if result.rowcount == 0:
+                return False
+            if rows:
+                await session.execute(insert(QuizAttempt), rows)
+            if before.user_id is not None:
+                first_answers = not before.total_questions and total_questions > 0
+                await _bump_user_stats(
+                    session,
+                    before.user_id,
+                    quizzes=int(first_answers),
+                    questions=total_questions,
+                    correct=total_correct,
+                    best_streak=best_streak
+                )
+            return True
+
+        return await writer.submit(_record)
 
     @staticmethod
     async def get_dashboard_stats(session_id: str) -> dict:
         """Get dashboard statistics"""
         async with async_session() as session:
-            dashboard = await session.get(Dashboard, session_id)
+            result = await session.execute(
+                select(Dashboard.total_questions, Dashboard.total_correct, Dashboard.best_streak)
+                .where(Dashboard.id == session_id)
+            )
+            dashboard = result.one_or_none()
             if not dashboard:
                 return None
             
@@ -117,113 +539,439 @@ class DatabaseService:
             }
 
     @staticmethod
-    async def get_quiz_questions(session_id: str, set_number: int) -> tuple:
-        """Get questions for a specific set"""
+    async def get_user_stats(user_id: int) -> dict:
+        """Read a user's precomputed totals (a single row)"""
         async with async_session() as session:
-            dashboard = await session.get(Dashboard, session_id)
-            if not dashboard:
-                return None, False
+            stats = await session.get(UserStats, user_id)
+            if stats is None:
+                return {"total_dashboards": 0, "total_quizzes": 0, "avg_score": 0, "best_streak": 0}
+            return {
+                "total_dashboards": stats.total_dashboards,
+                "total_quizzes": stats.total_quizzes,
+                "avg_score": round((stats.total_correct / stats.total_questions * 100)
+                                   if stats.total_questions > 0 else 0, 1),
+                "best_streak": stats.best_streak
+            }
+
+    @staticmethod
+    async def get_dashboard_trend(user_id: int, session_id: str, bucket: str = "day",
+                                  window: int = 7, days: int = 90) -> Optional[list]:
+        """Score trend of one of the user's dashboards; None if it doesn't exist or isn't theirs"""
+        async with async_session() as session:
+            owner = await session.scalar(select(Dashboard.user_id).where(Dashboard.id == session_id))
+            if owner is None or owner != user_id:
+                return None
+            since = datetime.utcnow() - timedelta(days=days)
+            return await _attempt_trend(session, QuizAttempt.dashboard_id == session_id, bucket, window, since)
 
-            # Initialize buffered_questions if it's None
-            if dashboard.buffered_questions is None:
-                dashboard.buffered_questions = []
-                await session.commit()
-                await session.refresh(dashboard)
+    @staticmethod
+    async def get_user_trend(user_id: int, bucket: str = "day", window: int = 7, days: int = 90) -> list:
+        """Score trend across all of a user's dashboards"""
+        async with async_session() as session:
+            since = datetime.utcnow() - timedelta(days=days)
+            user_dashboards = select(Dashboard.id).where(Dashboard.user_id == user_id)
+            return await _attempt_trend(
+                session, QuizAttempt.dashboard_id.in_(user_dashboards), bucket, window, since
+            )
 
-            start_idx = set_number * 10
-            end_idx = start_idx + 10
-            
-            # Check if we need more questions (keep 3 sets buffered)
-            needs_more = len(dashboard.buffered_questions) - start_idx < 30
-            
-            # If we have enough questions for this set, return them
-            if start_idx < len(dashboard.buffered_questions):
-                questions_slice = dashboard.buffered_questions[start_idx:end_idx]
-                if len(questions_slice) == 10:  # Only return if we have a full set
-                    return questions_slice, needs_more
-            
-            # If we don't have enough questions but we're generating more, indicate that
-            if dashboard.is_generating:
-                return None, True
-                
-            # Otherwise, we need more questions
+    @staticmethod
+    async def rebuild_user_stats(only_if_empty: bool = False) -> int:
+        """Recompute every user's stats row from their dashboards"""
+        async def _rebuild(session: AsyncSession) -> int:
+            if only_if_empty:
+                existing = await session.execute(select(UserStats.user_id).limit(1))
+                if existing.first() is not None:
+                    return 0
+            await session.execute(delete(UserStats))
+            totals = (
+                select(
+                    Dashboard.user_id,
+                    func.count(),
+                    func.sum(case((Dashboard.total_questions > 0, 1), else_=0)),
+                    func.coalesce(func.sum(Dashboard.total_questions), 0),
+                    func.coalesce(func.sum(Dashboard.total_correct), 0),
+                    func.coalesce(func.max(Dashboard.best_streak), 0)
+                )
+                .where(Dashboard.user_id.isnot(None))
+                .group_by(Dashboard.user_id)
+            )
+            result = await session.execute(
+                insert(UserStats).from_select(
+                    ["user_id", "total_dashboards", "total_quizzes", "total_questions", "total_correct", "best_streak"],
+                    totals
+                )
+            )
+            return result.rowcount
+
+        return await writer.submit(_rebuild)
+
+    @staticmethod
+    async def get_quiz_questions(session_id: str, set_number: int, load_questions: bool = True) -> tuple:
+        """
+        Get questions for a specific set and record it as served.
+
+        With load_questions=False the set is only checked and recorded, for a
+        client revalidating a copy it already has; an empty list stands in
+        for its questions.
+
+        Returns:
+            (questions or None if the set isn't generated yet, whether a refill is needed);
+            (None, False) if the dashboard doesn't exist
+        """
+        async with async_session() as session:
+            result = await session.execute(
+                select(
+                    Dashboard.last_accessed_at, Dashboard.cold_segment, Dashboard.current_set,
+                    Dashboard.current_set_at, Dashboard.seconds_per_set
+                ).where(Dashboard.id == session_id)
+            )
+            dashboard = result.one_or_none()
+        if dashboard is None:
+            return None, False
+        if dashboard.cold_segment is not None:
+            # The quiz is being used again, so its questions go back to the hot tables
+            await DatabaseService.thaw_dashboard(session_id)
+
+        start_idx = set_number * QUESTIONS_PER_SET
+        end_idx = start_idx + QUESTIONS_PER_SET
+        questions_slice = None
+        async with async_session() as session:
+            buffered = await _next_question_position(session, session_id)
+            if end_idx <= buffered and load_questions:
+                result = await session.execute(
+                    select(QuizQuestionEntry.question)
+                    .where(
+                        QuizQuestionEntry.dashboard_id == session_id,
+                        QuizQuestionEntry.position >= start_idx,
+                        QuizQuestionEntry.position < end_idx
+                    )
+                    .order_by(QuizQuestionEntry.position)
+                )
+                questions_slice = list(result.scalars().all())
+
+        # Recorded after the read session is closed, so a reader connection
+        # isn't held while this waits on the writer queue
+        state = await _record_served_set(session_id, dashboard, set_number, buffered // QUESTIONS_PER_SET)
+        needs_more = prefetch.sets_to_generate(state) > 0
+
+        # Only return full sets
+        if end_idx > buffered:
             return None, True
+        if not load_questions:
+            return [], needs_more
+        if len(questions_slice) < QUESTIONS_PER_SET:
+            return None, True
+        return questions_slice, needs_more
 
     @staticmethod
-    async def add_questions_to_buffer(session_id: str, new_questions: list):
-        """Add new questions to the buffer"""
+    async def get_prefetch_state(session_id: str) -> Optional[prefetch.PrefetchState]:
+        """Served position, answer rate and buffered sets of a quiz; None if it doesn't exist"""
         async with async_session() as session:
-            dashboard = await session.get(Dashboard, session_id)
-            if dashboard:
-                # Initialize the list if it's None
-                if dashboard.buffered_questions is None:
-                    dashboard.buffered_questions = []
-                
-                # Create a new list with existing and new questions
-                updated_questions = dashboard.buffered_questions.copy()
-                updated_questions.extend(new_questions)
-                
-                # Update the dashboard with the new questions
-                dashboard.buffered_questions = updated_questions
-                await session.commit()
-                await session.refresh(dashboard)  # Refresh to ensure we have the latest state
+            result = await session.execute(
+                select(Dashboard.current_set, Dashboard.seconds_per_set, Dashboard.current_set_at)
+                .where(Dashboard.id == session_id)
+            )
+            dashboard = result.one_or_none()
+            if dashboard is None:
+                return None
+            buffered = await _next_question_position(session, session_id)
+            return prefetch.PrefetchState(
+                current_set=dashboard.current_set or 0,
+                buffered_sets=buffered // QUESTIONS_PER_SET,
+                seconds_per_set=dashboard.seconds_per_set,
+                current_set_at=dashboard.current_set_at
+            )
 
     @staticmethod
-    async def set_generating_status(session_id: str, is_generating: bool):
-        """Set the generating status"""
+    async def archive_idle_dashboards(idle_days: float = COLD_AFTER_DAYS, batch_size: int = 20) -> int:
+        """
+        Move notes and questions of dashboards idle for idle_days into cold storage.
+
+        Candidates are read on a reader and appended to cold storage (an
+        fsync each) before the writer is involved, so archiving never holds
+        the single writer for more than a short conditional UPDATE per
+        dashboard. A dashboard used or refilled in between is left hot; the
+        record appended for it is then unreferenced, like a thawed one.
+        """
+        cutoff = datetime.utcnow() - timedelta(days=idle_days)
+
+        def _archivable():
+            return and_(
+                Dashboard.cold_segment.is_(None),
+                or_(
+                    Dashboard.generation_lease_expires.is_(None),
+                    Dashboard.generation_lease_expires < datetime.utcnow()
+                ),
+                func.coalesce(Dashboard.last_accessed_at, Dashboard.created_at) < cutoff
+            )
+
+        def _swap(session_id: str, question_count: int, location: tuple):
+            async def _apply(session: AsyncSession) -> bool:
+                # Questions appended since they were read would be lost
+                if await _next_question_position(session, session_id) != question_count:
+                    return False
+                segment, offset, length = location
+                result = await session.execute(
+                    update(Dashboard)
+                    .where(Dashboard.id == session_id, _archivable())
+                    .values(notes=None, cold_segment=segment, cold_offset=offset, cold_length=length)
+                )
+                if result.rowcount != 1:
+                    return False
+                # The notes stay in the search index, which holds only their tokens
+                await session.execute(
+                    delete(QuizQuestionEntry).where(QuizQuestionEntry.dashboard_id == session_id)
+                )
+                return True
+            return _apply
+
+        archived = 0
+        last_id = ""
+        while True:
+            async with async_session() as session:
+                result = await session.execute(
+                    select(Dashboard.id, Dashboard.notes)
+                    .where(_archivable(), Dashboard.id > last_id)
+                    .order_by(Dashboard.id)
+                    .limit(batch_size)
+                )
+                candidates = []
+                for session_id, notes in result.all():
+                    questions = await session.execute(
+                        select(QuizQuestionEntry.question)
+                        .where(QuizQuestionEntry.dashboard_id == session_id)
+                        .order_by(QuizQuestionEntry.position)
+                    )
+                    candidates.append((session_id, notes, list(questions.scalars().all())))
+
+            for session_id, notes, questions in candidates:
+                location = await metrics.run_in_thread(cold_store.append, {"notes": notes, "questions": questions})
+                if await writer.submit(_swap(session_id, len(questions), location)):
+                    archived += 1
+            if len(candidates) < batch_size:
+                return archived
+            last_id = candidates[-1][0]
+
+    @staticmethod
+    async def thaw_dashboard(session_id: str):
+        """Restore an archived dashboard's notes and questions to the hot tables"""
         async with async_session() as session:
-            dashboard = await session.get(Dashboard, session_id)
-            if dashboard:
-                dashboard.is_generating = int(is_generating)
-                await session.commit()
+            result = await session.execute(
+                select(*_COLD_COLUMNS)
+                .where(Dashboard.id == session_id, Dashboard.cold_segment.isnot(None))
+            )
+            location = result.one_or_none()
+        if location is None:
+            return  # Not archived
+        # Read and decoded off the event loop, and before the writer is involved
+        record = await metrics.run_in_thread(
+            cold_store.read, location.cold_segment, location.cold_offset, location.cold_length
+        )
+
+        async def _thaw(session: AsyncSession):
+            result = await session.execute(
+                update(Dashboard)
+                .where(
+                    Dashboard.id == session_id,
+                    Dashboard.cold_segment == location.cold_segment,
+                    Dashboard.cold_offset == location.cold_offset
+                )
+                .values(
+                    notes=record["notes"],
+                    cold_segment=None,
+                    cold_offset=None,
+                    cold_length=None,
+                    last_accessed_at=datetime.utcnow()
+                )
+            )
+            if result.rowcount != 1:
+                return  # Already thawed by a concurrent request
+            session.add_all(_question_entries(session_id, 0, record["questions"]))
+            await session.flush()
+
+        await writer.submit(_thaw)
+
+    @staticmethod
+    async def add_questions_to_buffer(session_id: str, new_questions: list,
+                                      owner: Optional[str] = None) -> Optional[int]:
+        """
+        Append new questions to the dashboard's question table; returns the number of complete sets.
+
+        With an owner, the append only happens while that owner still holds the
+        refill lease, checked in the same transaction, and None is returned
+        otherwise, so a worker whose lease was taken over can't add a set.
+        """
+        async def _append(session: AsyncSession) -> Optional[int]:
+            if owner is not None:
+                holder = await session.scalar(
+                    select(Dashboard.generation_owner).where(Dashboard.id == session_id)
+                )
+                if holder != owner:
+                    return None
+            # Runs on the single writer, so the position can't be taken concurrently
+            start = await _next_question_position(session, session_id)
+            session.add_all(_question_entries(session_id, start, new_questions))
+            await session.flush()
+            return (start + len(new_questions)) // QUESTIONS_PER_SET
+
+        return await writer.submit(_append)
+
+    @staticmethod
+    async def migrate_question_buffers(batch_size: int = 50) -> int:
+        """Move legacy buffered_questions blobs into quiz_questions rows"""
+        async def _migrate_batch(session: AsyncSession) -> int:
+            result = await session.execute(
+                select(Dashboard.id, Dashboard.buffered_questions)
+                .where(Dashboard.buffered_questions.isnot(None))
+                .limit(batch_size)
+            )
+            rows = result.all()
+            if not rows:
+                return -1
+            count = 0
+            for session_id, questions in rows:
+                if questions:
+                    start = await _next_question_position(session, session_id)
+                    session.add_all(_question_entries(session_id, start, questions))
+                    count += 1
+            # SQL NULL rather than JSON null so the dashboard is not picked up again
+            await session.execute(
+                update(Dashboard)
+                .where(Dashboard.id.in_([session_id for session_id, _ in rows]))
+                .values(buffered_questions=null())
+            )
+            return count
+
+        migrated = 0
+        while True:
+            count = await writer.submit(_migrate_batch)
+            if count < 0:
+                return migrated
+            migrated += count
+
+    @staticmethod
+    async def acquire_generation_lease(session_id: str, owner: str,
+                                       ttl: float = GENERATION_LEASE_SECONDS) -> bool:
+        """
+        Take the question refill lease unless another owner holds an unexpired one.
+
+        A single conditional UPDATE, so concurrent callers in any process can't
+        both win, and a lease left behind by a crashed worker is reclaimed once
+        it expires.
+        """
+        async def _acquire(session: AsyncSession) -> bool:
+            now = datetime.utcnow()
+            result = await session.execute(
+                update(Dashboard)
+                .where(
+                    Dashboard.id == session_id,
+                    or_(
+                        Dashboard.generation_owner.is_(None),
+                        Dashboard.generation_owner == owner,
+                        Dashboard.generation_lease_expires < now
+                    )
+                )
+                .values(generation_owner=owner, generation_lease_expires=now + timedelta(seconds=ttl))
+            )
+            return result.rowcount == 1
+
+        return await writer.submit(_acquire)
+
+    @staticmethod
+    async def renew_generation_lease(session_id: str, owner: str,
+                                     ttl: float = GENERATION_LEASE_SECONDS) -> bool:
+        """Extend a held lease; False if it expired and was taken over"""
+        async def _renew(session: AsyncSession) -> bool:
+            result = await session.execute(
+                update(Dashboard)
+                .where(Dashboard.id == session_id, Dashboard.generation_owner == owner)
+                .values(generation_lease_expires=datetime.utcnow() + timedelta(seconds=ttl))
+            )
+            return result.rowcount == 1
+
+        return await writer.submit(_renew)
+
+    @staticmethod
+    async def release_generation_lease(session_id: str, owner: str):
+        """Give up a lease if still held by owner"""
+        async def _release(session: AsyncSession):
+            await session.execute(
+                update(Dashboard)
+                .where(Dashboard.id == session_id, Dashboard.generation_owner == owner)
+                .values(generation_owner=None, generation_lease_expires=None)
+            )
+
+        await writer.submit(_release)
 
     @staticmethod
     async def is_generating_questions(session_id: str) -> bool:
-        """Check if questions are being generated"""
+        """Check if a refill holds an unexpired lease on this quiz"""
         async with async_session() as session:
-            dashboard = await session.get(Dashboard, session_id)
-            return bool(dashboard.is_generating) if dashboard else False
+            result = await session.execute(
+                select(Dashboard.generation_lease_expires).where(Dashboard.id == session_id)
+            )
+            expires = result.scalar_one_or_none()
+            return expires is not None and expires > datetime.utcnow()
 
     @staticmethod
     async def delete_dashboard(session_id: str) -> bool:
         """Delete a dashboard and all its associated quiz attempts"""
         try:
-            async with async_session() as session:
-                dashboard = await session.get(Dashboard, session_id)
-                if dashboard:
-                    await session.delete(dashboard)
-                    await session.commit()
-                    return True
-                return False
+            deleted = await writer.submit(lambda session: _delete_dashboards(session, Dashboard.id == session_id))
+            return deleted > 0
         except Exception as e:
             print(f"Error deleting dashboard: {e}")
             raise 
+
+    @staticmethod
+    async def delete_dashboards(user_id: int, session_ids: list) -> int:
+        """Delete several of a user's dashboards in one transaction; returns how many existed"""
+        condition = and_(Dashboard.user_id == user_id, Dashboard.id.in_(session_ids))
+        return await writer.submit(lambda session: _delete_dashboards(session, condition))
             
     @staticmethod
-    async def get_user_dashboards(user_id: int) -> list:
-        """Get all dashboards for a user"""
+    async def get_user_dashboards(user_id: int, limit: Optional[int] = None, cursor: Optional[str] = None) -> list:
+        """
+        Get a user's dashboards for display, newest first.
+
+        Never touches the notes or question columns. With limit/cursor this
+        reads one keyset page; see get_user_dashboards_page for the next cursor.
+        """
         try:
             async with async_session() as session:
-                result = await session.execute(
-                    select(Dashboard).where(Dashboard.user_id == user_id).order_by(Dashboard.created_at.desc())
+                query = (
+                    select(
+                        Dashboard.id,
+                        Dashboard.notes_preview,
+                        Dashboard.created_at,
+                        Dashboard.total_questions,
+                        Dashboard.total_correct,
+                        Dashboard.best_streak
+                    )
+                    .where(Dashboard.user_id == user_id)
+                    .order_by(Dashboard.created_at.desc(), Dashboard.id.desc())
                 )
-                dashboards = result.scalars().all()
+                if cursor:
+                    created_at, last_id = decode_dashboard_cursor(cursor)
+                    query = query.where(tuple_(Dashboard.created_at, Dashboard.id) < tuple_(created_at, last_id))
+                if limit is not None:
+                    query = query.limit(limit)
+                result = await session.execute(query)
+                dashboards = result.all()
                 
                 # Format dashboard data for display
                 dashboard_list = []
                 for dashboard in dashboards:
-                    # Extract first 100 characters of notes as preview
-                    notes_preview = dashboard.notes[:100] + "..." if len(dashboard.notes) > 100 else dashboard.notes
-                    
                     # Calculate stats
                     total_questions = dashboard.total_questions
                     accuracy = round((dashboard.total_correct / total_questions * 100) if total_questions > 0 else 0, 1)
                     
                     dashboard_list.append({
                         "id": dashboard.id,
-                        "notes_preview": notes_preview,
+                        "notes_preview": dashboard.notes_preview or "",
                         "created_at": dashboard.created_at,
                         "total_questions": total_questions,
+                        "total_correct": dashboard.total_correct,
                         "accuracy": accuracy,
                         "best_streak": dashboard.best_streak
                     })
@@ -233,17 +981,357 @@ class DatabaseService:
             print(f"Error getting user dashboards: {e}")
             raise
 
+    @classmethod
+    async def get_user_dashboards_page(cls, user_id: int, limit: int, cursor: Optional[str] = None) -> tuple:
+        """Get one page of a user's dashboards and the cursor of the next page (None on the last)"""
+        # Fetch one extra row to know whether another page exists
+        dashboards = await cls.get_user_dashboards(user_id, limit=limit + 1, cursor=cursor)
+        if len(dashboards) <= limit:
+            return dashboards, None
+        dashboards = dashboards[:limit]
+        last = dashboards[-1]
+        return dashboards, encode_dashboard_cursor(last["created_at"], last["id"])
+
+    @staticmethod
+    async def backfill_notes_previews(batch_size: int = 500) -> int:
+        """Fill notes_preview for dashboards created before the column existed"""
+        async def _backfill_batch(session: AsyncSession) -> int:
+            result = await session.execute(
+                select(Dashboard.id, func.substr(Dashboard.notes, 1, NOTES_PREVIEW_LENGTH + 1))
+                .where(Dashboard.notes_preview.is_(None))
+                .limit(batch_size)
+            )
+            rows = result.all()
+            for session_id, notes_head in rows:
+                await session.execute(
+                    update(Dashboard)
+                    .where(Dashboard.id == session_id)
+                    .values(notes_preview=make_notes_preview(notes_head))
+                )
+            return len(rows)
+
+        filled = 0
+        while True:
+            count = await writer.submit(_backfill_batch)
+            filled += count
+            if count < batch_size:
+                return filled
+
+    @staticmethod
+    async def search_notes(user_id: int, terms: str, limit: int = 20, offset: int = 0,
+                           highlight: bool = True) -> list:
+        """
+        Rank a user's dashboards by how well their notes match terms.
+
+        Args:
+            user_id: Only this user's notes are searched
+            terms: Free text; every word must match
+            limit, offset: Page of results to return, best match first
+            highlight: Wrap matches in <mark> in an HTML-escaped snippet; if
+                False the snippet is plain text, e.g. for use as chat context
+
+        Returns:
+            Dicts with id, notes_preview, created_at, snippet and rank
+        """
+        query = build_match_query(terms, user_id)
+        if query is None:
+            return []
+        words = _search_words(terms)
+        async with async_session() as session:
+            result = await session.execute(
+                _SEARCH_QUERY,
+                {"query": query, "limit": limit, "offset": offset}
+            )
+            return [
+                {
+                    "id": row.id,
+                    "notes_preview": row.notes_preview,
+                    "created_at": row.created_at,
+                    "snippet": _render_snippet(row.notes_preview, words, highlight),
+                    "rank": row.rank
+                }
+                for row in result
+            ]
+
+    @staticmethod
+    async def backfill_search_index(batch_size: int = 100) -> int:
+        """
+        Index notes of dashboards the search index hasn't seen yet.
+
+        Pending dashboards are found through a partial index on
+        search_indexed IS NULL, so once everything is indexed this is a single
+        empty lookup rather than a comparison against the whole index.
+        Archived notes are read from cold storage before the writer is involved.
+        """
+        indexed = 0
+        while True:
+            async with async_session() as session:
+                result = await session.execute(
+                    select(Dashboard.id, Dashboard.user_id, Dashboard.notes, *_COLD_COLUMNS)
+                    .where(Dashboard.search_indexed.is_(None))
+                    .limit(batch_size)
+                )
+                rows = result.all()
+            pending = []
+            for row in rows:
+                notes = row.notes
+                if row.cold_segment is not None:
+                    record = await metrics.run_in_thread(cold_store.read, row.cold_segment, row.cold_offset, row.cold_length)
+                    notes = record["notes"]
+                pending.append((row.id, row.user_id, notes or ""))
+
+            async def _index_batch(session: AsyncSession):
+                # Skip dashboards deleted or indexed since they were read
+                result = await session.execute(
+                    select(Dashboard.id)
+                    .where(Dashboard.id.in_([item[0] for item in pending]), Dashboard.search_indexed.is_(None))
+                )
+                still_pending = set(result.scalars().all())
+                for session_id, user_id, notes in pending:
+                    if session_id in still_pending:
+                        await _index_notes(session, session_id, user_id, notes)
+
+            if pending:
+                await writer.submit(_index_batch)
+            indexed += len(rows)
+            if len(rows) < batch_size:
+                return indexed
+
+    @staticmethod
+    async def enqueue_mail(recipient: str, subject: str, body: str, subtype: str = "html") -> int:
+        """Queue a message for the mail worker; returns its id"""
+        async def _enqueue(session: AsyncSession) -> int:
+            mail = OutboundMail(recipient=recipient, subject=subject, body=body, subtype=subtype)
+            session.add(mail)
+            await session.flush()
+            return mail.id
+
+        return await writer.submit(_enqueue)
+
+    @staticmethod
+    async def count_due_mail(limit: int) -> int:
+        """How many messages are due for sending, counting no further than limit"""
+        async with async_session() as session:
+            due = select(OutboundMail.id).where(_due_mail(datetime.utcnow())).limit(limit).subquery()
+            result = await session.execute(select(func.count()).select_from(due))
+            return result.scalar_one()
+
+    @staticmethod
+    async def claim_mail(owner: str, limit: int, claim_seconds: float) -> list:
+        """
+        Claim up to limit due messages for sending.
+
+        Messages claimed by a worker that stopped before finishing them are
+        claimable again once the claim expires.
+        """
+        async def _claim(session: AsyncSession) -> list:
+            now = datetime.utcnow()
+            result = await session.execute(
+                select(OutboundMail.id, OutboundMail.recipient, OutboundMail.subject,
+                       OutboundMail.body, OutboundMail.subtype, OutboundMail.attempts)
+                .where(_due_mail(now))
+                .order_by(OutboundMail.next_attempt_at)
+                .limit(limit)
+            )
+            rows = [dict(row._mapping) for row in result]
+            if rows:
+                await session.execute(
+                    update(OutboundMail)
+                    .where(OutboundMail.id.in_([row["id"] for row in rows]))
+                    .values(status="sending", claimed_by=owner,
+                            claim_expires=now + timedelta(seconds=claim_seconds))
+                )
+            return rows
+
+        return await writer.submit(_claim)
+
+    @staticmethod
+    async def finish_mail(mail_id: int, owner: str, error: Optional[str] = None,
+                          retry_at: Optional[datetime] = None):
+        """
+        Record the outcome of a send: sent when error is None, otherwise
+        pending again until retry_at, or failed for good without retry_at.
+        """
+        async def _finish(session: AsyncSession):
+            if error is None:
+                values = {"status": "sent", "sent_at": datetime.utcnow(), "last_error": None}
+            elif retry_at is not None:
+                values = {"status": "pending", "next_attempt_at": retry_at, "last_error": error}
+            else:
+                values = {"status": "failed", "last_error": error}
+            await session.execute(
+                update(OutboundMail)
+                .where(OutboundMail.id == mail_id, OutboundMail.claimed_by == owner)
+                .values(attempts=OutboundMail.attempts + 1, claimed_by=None, claim_expires=None, **values)
+            )
+
+        await writer.submit(_finish)
+
+    @staticmethod
+    async def prune_sent_mail(older_than: timedelta) -> int:
+        """Delete sent messages (they contain reset links) once they are old"""
+        async def _prune(session: AsyncSession) -> int:
+            result = await session.execute(
+                delete(OutboundMail)
+                .where(OutboundMail.status == "sent", OutboundMail.sent_at < datetime.utcnow() - older_than)
+            )
+            return result.rowcount
+
+        return await writer.submit(_prune)
+
+    @staticmethod
+    async def create_note_job(user_id: int, cleaned_text: str, transcription: Optional[str], owner: str,
+                              chunking: Optional[str] = None) -> str:
+        """Record a new notes generation, held by owner; returns the job id"""
+        job_id = str(uuid.uuid4())
+
+        async def _create(session: AsyncSession):
+            now = datetime.utcnow()
+            session.add(NoteJob(
+                id=job_id,
+                user_id=user_id,
+                transcription=transcription,
+                cleaned_text=cleaned_text,
+                chunking=chunking,
+                owner=owner,
+                lease_expires=now + timedelta(seconds=NOTE_JOB_LEASE_SECONDS),
+                created_at=now,
+                updated_at=now
+            ))
+
+        await writer.submit(_create)
+        return job_id
+
+    @staticmethod
+    async def claim_note_job(job_id: str, user_id: int, owner: str) -> Optional[dict]:
+        """
+        Take over one of the user's notes jobs to resume it.
+
+        Returns:
+            None if the job doesn't exist or isn't theirs; otherwise its status,
+            texts and final notes, with claimed=True if owner now holds it.
+            Completed jobs, and jobs still running under a live lease, aren't claimed.
+        """
+        async def _claim(session: AsyncSession) -> Optional[dict]:
+            now = datetime.utcnow()
+            result = await session.execute(
+                select(NoteJob.status, NoteJob.transcription, NoteJob.cleaned_text, NoteJob.chunking,
+                       NoteJob.notes, NoteJob.lease_expires)
+                .where(NoteJob.id == job_id, NoteJob.user_id == user_id)
+            )
+            job = result.one_or_none()
+            if job is None:
+                return None
+            info = {
+                "status": job.status,
+                "transcription": job.transcription,
+                "cleaned_text": job.cleaned_text,
+                "chunking": job.chunking,
+                "notes": job.notes,
+                "claimed": False
+            }
+            live = job.status == "running" and job.lease_expires is not None and job.lease_expires > now
+            if job.status == "completed" or live:
+                return info
+            await session.execute(
+                update(NoteJob)
+                .where(NoteJob.id == job_id)
+                .values(status="running", owner=owner, error=None, updated_at=now,
+                        lease_expires=now + timedelta(seconds=NOTE_JOB_LEASE_SECONDS))
+            )
+            info.update(status="running", claimed=True)
+            return info
+
+        return await writer.submit(_claim)
+
+    @staticmethod
+    async def get_note_checkpoints(job_id: str) -> dict:
+        """Notes of a job's finished chunks, by chunk hash"""
+        async with async_session() as session:
+            result = await session.execute(
+                select(NoteCheckpoint.chunk_hash, NoteCheckpoint.notes).where(NoteCheckpoint.job_id == job_id)
+            )
+            return {row.chunk_hash: row.notes for row in result}
+
+    @staticmethod
+    async def save_note_checkpoint(job_id: str, owner: str, chunk_hash: str, notes: str) -> bool:
+        """Store a finished chunk and renew owner's lease; False if another run has taken the job over"""
+        async def _save(session: AsyncSession) -> bool:
+            now = datetime.utcnow()
+            result = await session.execute(
+                update(NoteJob)
+                .where(NoteJob.id == job_id, NoteJob.owner == owner)
+                .values(lease_expires=now + timedelta(seconds=NOTE_JOB_LEASE_SECONDS), updated_at=now)
+            )
+            if result.rowcount == 0:
+                return False
+            await session.execute(
+                sqlite_insert(NoteCheckpoint)
+                .values(job_id=job_id, chunk_hash=chunk_hash, notes=notes, created_at=now)
+                .on_conflict_do_nothing()
+            )
+            return True
+
+        return await writer.submit(_save)
+
+    @staticmethod
+    async def finish_note_job(job_id: str, owner: str, notes: Optional[str] = None, error: Optional[str] = None):
+        """
+        Record the outcome of a run: completed with its notes when error is
+        None, dropping the checkpoints; otherwise failed and resumable.
+        """
+        async def _finish(session: AsyncSession):
+            if error is None:
+                values = {"status": "completed", "notes": notes, "error": None}
+            else:
+                values = {"status": "failed", "error": error}
+            result = await session.execute(
+                update(NoteJob)
+                .where(NoteJob.id == job_id, NoteJob.owner == owner)
+                .values(owner=None, lease_expires=None, updated_at=datetime.utcnow(), **values)
+            )
+            if result.rowcount and error is None:
+                await session.execute(delete(NoteCheckpoint).where(NoteCheckpoint.job_id == job_id))
+
+        await writer.submit(_finish)
+
+    @staticmethod
+    async def prune_note_jobs(older_than: timedelta) -> int:
+        """Delete notes jobs, and their checkpoints, untouched for older_than"""
+        async def _prune(session: AsyncSession) -> int:
+            now = datetime.utcnow()
+            stale = select(NoteJob.id).where(
+                NoteJob.updated_at < now - older_than,
+                or_(NoteJob.lease_expires.is_(None), NoteJob.lease_expires < now)
+            )
+            await session.execute(delete(NoteCheckpoint).where(NoteCheckpoint.job_id.in_(stale)))
+            result = await session.execute(delete(NoteJob).where(NoteJob.id.in_(stale)))
+            return result.rowcount
+
+        return await writer.submit(_prune)
+
     @classmethod
     async def delete_user(cls, user_id: int) -> bool:
         """Delete a user and all associated data."""
-        async with async_session() as session:
-            try:
-                # Delete the user
-                query = delete(User).where(User.id == user_id)
-                await session.execute(query)
-                await session.commit()
-                return True
-            except Exception as e:
-                print(f"Error deleting user: {e}")
-                await session.rollback()
-                return False
\ No newline at end of file
+        async def _delete(session: AsyncSession):
+            # Children are deleted explicitly as well, since tables created before
+            # ON DELETE CASCADE was declared don't carry it
+            user_dashboards = select(Dashboard.id).where(Dashboard.user_id == user_id)
+            await _unindex_notes(session, Dashboard.user_id == user_id)
+            await session.execute(delete(QuizAttempt).where(QuizAttempt.dashboard_id.in_(user_dashboards)))
+            await session.execute(delete(QuizQuestionEntry).where(QuizQuestionEntry.dashboard_id.in_(user_dashboards)))
+            await session.execute(delete(Dashboard).where(Dashboard.user_id == user_id))
+            await session.execute(delete(UserStats).where(UserStats.user_id == user_id))
+            user_jobs = select(NoteJob.id).where(NoteJob.user_id == user_id)
+            await session.execute(delete(NoteCheckpoint).where(NoteCheckpoint.job_id.in_(user_jobs)))
+            await session.execute(delete(NoteJob).where(NoteJob.user_id == user_id))
+            # Delete the user
+            query = delete(User).where(User.id == user_id)
+            await session.execute(query)
+
+        try:
+            await writer.submit(_delete)
+            return True
+        except Exception as e:
+            print(f"Error deleting user: {e}")
+            return False
\ No newline at end of file
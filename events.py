@@ -0,0 +1,40 @@
+import os
+import json
+from typing import Any
+import metrics
+from state import store
+
+# Event stream settings
+EVENT_KEEPALIVE_SECONDS = float(os.getenv("EVENT_KEEPALIVE_SECONDS", 15))
+
+events_published = metrics.REGISTRY.register(metrics.Counter(
+    "learnai_events_published_total",
+    "Dashboard events published to subscribers, by event type",
+    labels=("event",),
+))
+
+
+def dashboard_channel(session_id: str) -> str:
+    return f"dashboard:{session_id}"
+
+
+async def publish(session_id: str, event: str, data: Any):
+    """
+    Announce an event on a dashboard's channel.
+
+    Goes through the shared state store, so subscribers connected to any
+    worker receive it. Events carry the full current value rather than a
+    delta, so a subscriber that drops some still ends up up to date.
+    """
+    events_published.inc(event=event)
+    await store.publish(dashboard_channel(session_id), {"event": event, "data": data})
+
+
+def subscribe(session_id: str):
+    """Context manager yielding a queue of {"event", "data"} messages for a dashboard"""
+    return store.subscribe(dashboard_channel(session_id))
+
+
+def format_sse(event: str, data: Any) -> str:
+    """Encode one server-sent event"""
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
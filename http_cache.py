@@ -0,0 +1,51 @@
+from fastapi import Request
+from fastapi.responses import Response
+import metrics
+
+# Bump when a cached response body changes shape, so ETags issued for the
+# old shape stop matching
+ETAG_SCHEME = "1"
+
+# For resources that never change once they exist (filled quiz sets, notes)
+IMMUTABLE_CACHE_CONTROL = "private, max-age=31536000, immutable"
+# For resources that change; clients keep them but revalidate every time
+REVALIDATE_CACHE_CONTROL = "private, no-cache"
+
+conditional_requests = metrics.REGISTRY.register(metrics.Counter(
+    "learnai_conditional_requests_total",
+    "Requests for ETag-validated resources by resource and outcome (not_modified or full)",
+    labels=("resource", "outcome"),
+))
+
+
+def make_etag(*parts) -> str:
+    """
+    Strong ETag built from version parts, e.g. a resource id and counter.
+
+    Validators come from cheap columns rather than a hash of the payload, so
+    a matching request is answered without loading or serializing it.
+    """
+    return '"' + "-".join([ETAG_SCHEME, *map(str, parts)]) + '"'
+
+
+def etag_matches(request: Request, etag: str) -> bool:
+    """Whether the request's If-None-Match lists etag"""
+    header = request.headers.get("if-none-match")
+    if not header:
+        return False
+    if header.strip() == "*":
+        return True
+    # If-None-Match uses weak comparison, so W/ prefixes added by proxies still match
+    return any(candidate.strip().removeprefix("W/") == etag for candidate in header.split(","))
+
+
+def not_modified(resource: str, etag: str, cache_control: str) -> Response:
+    conditional_requests.inc(resource=resource, outcome="not_modified")
+    return Response(status_code=304, headers={"ETag": etag, "Cache-Control": cache_control})
+
+
+def set_validators(resource: str, response: Response, etag: str, cache_control: str):
+    """Add the ETag and caching policy to a full response"""
+    conditional_requests.inc(resource=resource, outcome="full")
+    response.headers["ETag"] = etag
+    response.headers["Cache-Control"] = cache_control
@@ -0,0 +1,225 @@
+import os
+import time
+import socket
+import random
+import asyncio
+from contextlib import asynccontextmanager
+from datetime import datetime, timedelta
+from email.message import EmailMessage
+from typing import Tuple
+import aiosmtplib
+import metrics
+from database import DatabaseService
+from state import StateStore, store
+
+# SMTP settings
+MAIL_SERVER = os.getenv("MAIL_SERVER")
+MAIL_PORT = int(os.getenv("MAIL_PORT", 587))
+MAIL_USERNAME = os.getenv("MAIL_USERNAME")
+MAIL_PASSWORD = os.getenv("MAIL_PASSWORD")
+MAIL_FROM = os.getenv("MAIL_FROM")
+MAIL_STARTTLS = os.getenv("MAIL_STARTTLS", "True") == "True"
+MAIL_SSL_TLS = os.getenv("MAIL_SSL_TLS", "False") == "True"
+MAIL_TIMEOUT = float(os.getenv("MAIL_TIMEOUT", 30))
+
+# Queue settings
+MAIL_POOL_SIZE = int(os.getenv("MAIL_POOL_SIZE", 2))  # SMTP connections kept open per worker
+MAIL_RATE_PER_MINUTE = int(os.getenv("MAIL_RATE_PER_MINUTE", 30))  # Across all workers
+MAIL_MAX_ATTEMPTS = int(os.getenv("MAIL_MAX_ATTEMPTS", 8))
+MAIL_RETRY_BASE_SECONDS = float(os.getenv("MAIL_RETRY_BASE_SECONDS", 30))
+MAIL_RETRY_MAX_SECONDS = float(os.getenv("MAIL_RETRY_MAX_SECONDS", 3600))
+MAIL_POLL_INTERVAL = float(os.getenv("MAIL_POLL_INTERVAL", 5))
+MAIL_IDLE_DISCONNECT_SECONDS = float(os.getenv("MAIL_IDLE_DISCONNECT_SECONDS", 60))
+MAIL_CLAIM_SECONDS = float(os.getenv("MAIL_CLAIM_SECONDS", 300))
+MAIL_RETENTION = timedelta(days=float(os.getenv("MAIL_RETENTION_DAYS", 7)))
+
+mail_sent = metrics.REGISTRY.register(metrics.Counter(
+    "learnai_mail_sent_total",
+    "Outbound mail send attempts by outcome",
+    labels=("outcome",),
+))
+mail_send_duration = metrics.REGISTRY.register(metrics.Histogram(
+    "learnai_mail_send_duration_seconds",
+    "Time to hand one message to the SMTP server, including connecting",
+))
+
+
+class SMTPPool:
+    """
+    A few long-lived SMTP connections reused across messages.
+
+    Connections are opened on first use and closed after sitting idle, so
+    the connect and TLS handshake is paid once per burst of mail rather
+    than once per message.
+    """
+
+    def __init__(self, size: int = MAIL_POOL_SIZE):
+        self._idle: asyncio.Queue = asyncio.Queue()
+        for _ in range(size):
+            self._idle.put_nowait(None)  # Slot without an open connection yet
+        self._last_used: dict = {}
+
+    @staticmethod
+    async def _connect() -> aiosmtplib.SMTP:
+        smtp = aiosmtplib.SMTP(
+            hostname=MAIL_SERVER,
+            port=MAIL_PORT,
+            use_tls=MAIL_SSL_TLS,
+            start_tls=MAIL_STARTTLS,
+            timeout=MAIL_TIMEOUT,
+        )
+        await smtp.connect()
+        if MAIL_USERNAME:
+            await smtp.login(MAIL_USERNAME, MAIL_PASSWORD)
+        return smtp
+
+    @staticmethod
+    async def _close(smtp: aiosmtplib.SMTP):
+        try:
+            await smtp.quit()
+        except Exception:
+            smtp.close()
+
+    @asynccontextmanager
+    async def connection(self):
+        smtp = await self._idle.get()
+        try:
+            if smtp is None or not smtp.is_connected:
+                smtp = await self._connect()
+            yield smtp
+        except Exception:
+            # The connection may be in an unknown state; start fresh next time
+            if smtp is not None:
+                smtp.close()
+            smtp = None
+            raise
+        finally:
+            if smtp is not None:
+                self._last_used[id(smtp)] = time.monotonic()
+            self._idle.put_nowait(smtp)
+
+    async def close_idle(self, idle_seconds: float = MAIL_IDLE_DISCONNECT_SECONDS):
+        """Close connections unused for idle_seconds; the server would drop them anyway"""
+        slots = [self._idle.get_nowait() for _ in range(self._idle.qsize())]
+        for smtp in slots:
+            if smtp is not None and time.monotonic() - self._last_used.get(id(smtp), 0) > idle_seconds:
+                self._last_used.pop(id(smtp), None)
+                await self._close(smtp)
+                smtp = None
+            self._idle.put_nowait(smtp)
+
+    async def close(self):
+        await self.close_idle(idle_seconds=-1)
+
+
+def _is_permanent(error: Exception) -> bool:
+    """5xx replies and refused recipients won't succeed on retry"""
+    if isinstance(error, aiosmtplib.SMTPRecipientsRefused):
+        return True
+    return isinstance(error, aiosmtplib.SMTPResponseException) and 500 <= error.code < 600
+
+
+def retry_delay(attempts: int) -> float:
+    """Exponential backoff with jitter for a message that has failed attempts times"""
+    delay = min(MAIL_RETRY_MAX_SECONDS, MAIL_RETRY_BASE_SECONDS * 2 ** max(0, attempts - 1))
+    return delay * random.uniform(0.5, 1.5)
+
+
+class MailWorker:
+    """Sends queued outbound_mail rows within the shared per-minute rate limit"""
+
+    def __init__(self, pool: SMTPPool, state: StateStore):
+        self.pool = pool
+        self.state = state
+        self.owner = f"{socket.gethostname()}:{os.getpid()}"
+        self._wake = asyncio.Event()
+
+    def notify(self):
+        """Wake the worker now instead of at its next poll"""
+        self._wake.set()
+
+    async def _reserve(self, wanted: int) -> Tuple[str, int]:
+        """
+        Take up to wanted sends from this minute's budget shared by all workers.
+
+        Returns the budget key along with the number granted, so unused sends
+        go back to the minute they were taken from even if it has since ended.
+        """
+        key = f"mail:sent:{int(time.time() // 60)}"
+        used = await self.state.incr(key, wanted, ttl=120)
+        over = max(0, min(wanted, used - MAIL_RATE_PER_MINUTE))
+        if over:
+            await self.state.incr(key, -over, ttl=120)
+        return key, wanted - over
+
+    async def _send(self, mail: dict):
+        message = EmailMessage()
+        message["From"] = MAIL_FROM
+        message["To"] = mail["recipient"]
+        message["Subject"] = mail["subject"]
+        message.set_content(mail["body"], subtype=mail["subtype"] or "plain")
+
+        start = time.perf_counter()
+        try:
+            async with self.pool.connection() as smtp:
+                await smtp.send_message(message)
+        except Exception as e:
+            attempts = mail["attempts"] + 1
+            retry_at = None
+            if not _is_permanent(e) and attempts < MAIL_MAX_ATTEMPTS:
+                retry_at = datetime.utcnow() + timedelta(seconds=retry_delay(attempts))
+            mail_sent.inc(outcome="retry" if retry_at else "failed")
+            print(f"Error sending mail {mail['id']} (attempt {attempts}): {e}")
+            await DatabaseService.finish_mail(mail["id"], self.owner, error=str(e)[:500], retry_at=retry_at)
+            return
+        finally:
+            mail_send_duration.observe(time.perf_counter() - start)
+        mail_sent.inc(outcome="sent")
+        await DatabaseService.finish_mail(mail["id"], self.owner)
+
+    async def drain(self) -> int:
+        """Send one batch of due mail; returns how many were attempted"""
+        # A read-only check first, so an idle poll neither spends budget nor
+        # queues a claim on the writer
+        due = await DatabaseService.count_due_mail(MAIL_POOL_SIZE * 4)
+        if not due:
+            return 0
+        key, allowed = await self._reserve(due)
+        if not allowed:
+            return 0
+        batch = await DatabaseService.claim_mail(self.owner, allowed, MAIL_CLAIM_SECONDS)
+        if len(batch) < allowed:
+            # Give back the budget we didn't use, e.g. another worker claimed it first
+            await self.state.incr(key, len(batch) - allowed, ttl=120)
+        # As many in flight as there are pooled connections
+        await asyncio.gather(*(self._send(mail) for mail in batch))
+        return len(batch)
+
+    async def run(self):
+        last_prune = 0.0
+        while True:
+            try:
+                sent = await self.drain()
+                if time.monotonic() - last_prune > 3600:
+                    await DatabaseService.prune_sent_mail(MAIL_RETENTION)
+                    last_prune = time.monotonic()
+                await self.pool.close_idle()
+            except Exception as e:
+                print(f"Error in mail worker: {e}")
+                sent = 0
+            if not sent:
+                try:
+                    await asyncio.wait_for(self._wake.wait(), MAIL_POLL_INTERVAL)
+                except asyncio.TimeoutError:
+                    pass
+                self._wake.clear()
+
+
+worker = MailWorker(SMTPPool(), store)
+
+
+async def send_mail(recipient: str, subject: str, body: str, subtype: str = "html") -> int:
+    """Queue a message and return immediately; the worker delivers it"""
+    mail_id = await DatabaseService.enqueue_mail(recipient, subject, body, subtype)
+    worker.notify()
+    return mail_id
@@ -1,39 +1,122 @@
-from fastapi import FastAPI, HTTPException, Request, BackgroundTasks, Depends, status, Form
+from fastapi import FastAPI, HTTPException, Request, BackgroundTasks, Depends, status, Form, Query
 from fastapi.templating import Jinja2Templates
-from fastapi.staticfiles import StaticFiles
 from fastapi.security import OAuth2PasswordRequestForm
-from jose import JWTError, jwt
 from pydantic import BaseModel, Field, field_validator
 from typing import Optional, List, Dict
 from ai_service import NoteTaker, TranscriptionService, QuizGenerator
+import ai_service
 from contextlib import asynccontextmanager
 from datetime import timedelta
 import secrets
-from fastapi.responses import RedirectResponse
+import asyncio
+import functools
+from fastapi.responses import RedirectResponse, Response, StreamingResponse, JSONResponse
+import time
+import socket
+import metrics
+import tracing
+import admission
+import prefetch
+import events
+import passwords
+import state
+import mail
+import cold_storage
+import assets
+import http_cache
 
 from ai_service import ChatBot
+from resilience import CircuitOpenError
 
 import uuid
 from models import init_db, User
-from database import DatabaseService, engine, async_session
+from database import DatabaseService, engine, writer, GENERATION_LEASE_SECONDS
 from auth import (
     Token, UserCreate, hash_password, verify_password, create_access_token,
     get_current_active_user, get_current_user, ACCESS_TOKEN_EXPIRE_MINUTES,
-    SECRET_KEY, ALGORITHM, REFRESH_TOKEN_EXPIRE_DAYS
+    SECRET_KEY, ALGORITHM, REFRESH_TOKEN_EXPIRE_DAYS,
+    decode_token, get_user_from_token, invalidate_user, TokenError, authenticate_user,
+    listen_for_invalidations
 )
-from fastapi_mail import FastMail, MessageSchema, ConnectionConfig
 import os
 
 # Update token expiration time to 30 days
 ACCESS_TOKEN_EXPIRE_MINUTES = 43200  # 30 days * 24 hours * 60 minutes
 
+GZIP_MIN_SIZE = int(os.getenv("GZIP_MIN_SIZE", 500))  # Smaller responses are sent uncompressed
+# Failed notes jobs can be resumed for this long
+NOTE_JOB_RETENTION = timedelta(days=float(os.getenv("NOTE_JOB_RETENTION_DAYS", 7)))
+
+async def archive_idle_dashboards_periodically():
+    """Background loop moving idle dashboards to cold storage and pruning old notes jobs"""
+    while True:
+        try:
+            archived = await DatabaseService.archive_idle_dashboards(cold_storage.COLD_AFTER_DAYS)
+            if archived:
+                print(f"Archived {archived} idle dashboards to cold storage")
+        except Exception as e:
+            print(f"Error archiving idle dashboards: {e}")
+        try:
+            pruned = await DatabaseService.prune_note_jobs(NOTE_JOB_RETENTION)
+            if pruned:
+                print(f"Pruned {pruned} old notes jobs")
+        except Exception as e:
+            print(f"Error pruning notes jobs: {e}")
+        await asyncio.sleep(cold_storage.COLD_ARCHIVE_INTERVAL_HOURS * 3600)
+
+# Filled in by the startup warm-up; /readyz reports it
+readiness = {"services": False, "error": None}
+
+async def warm_up():
+    """Do the slow first-use work in the background so startup isn't held up"""
+    start = time.perf_counter()
+    try:
+        await asyncio.to_thread(warm_up_services)
+    except Exception as e:
+        readiness["error"] = str(e)
+        print(f"Error warming up services: {e}")
+        return
+    readiness["services"] = True
+    print(f"Services warmed up in {time.perf_counter() - start:.2f}s")
+
 # Initialize database
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     # Create tables on startup
     async with engine.begin() as conn:
         await conn.run_sync(lambda bind: init_db(bind=bind))
+    migrated = await DatabaseService.migrate_question_buffers()
+    if migrated:
+        print(f"Migrated question buffers for {migrated} dashboards")
+    backfilled = await DatabaseService.backfill_notes_previews()
+    if backfilled:
+        print(f"Backfilled notes previews for {backfilled} dashboards")
+    indexed = await DatabaseService.backfill_search_index()
+    if indexed:
+        print(f"Indexed notes of {indexed} dashboards for search")
+    rebuilt = await DatabaseService.rebuild_user_stats(only_if_empty=True)
+    if rebuilt:
+        print(f"Backfilled statistics for {rebuilt} users")
+    # Fingerprint static files and write their compressed variants before serving pages
+    await asyncio.to_thread(assets.manifest.build)
+    print(f"Fingerprinted {len(assets.manifest.digests)} static assets")
+    warmup = asyncio.create_task(warm_up())
+    archiver = asyncio.create_task(archive_idle_dashboards_periodically())
+    auth_invalidations = asyncio.create_task(listen_for_invalidations())
+    mail_worker = asyncio.create_task(mail.worker.run())
+    trace_exporter = asyncio.create_task(tracing.run_exporter())
     yield
+    warmup.cancel()
+    archiver.cancel()
+    auth_invalidations.cancel()
+    mail_worker.cancel()
+    trace_exporter.cancel()
+    await tracing.flush()
+    await mail.worker.pool.close()
+    await writer.close()
+    passwords.shutdown()
+    cold_storage.cold_store.close()
+    await state.store.close()
 
 from fastapi.middleware.cors import CORSMiddleware
 
@@ -53,46 +136,167 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Compress HTML and JSON responses. Static assets are already compressed,
+# static images are skipped by path and the event streams by content type
+app.add_middleware(assets.AssetAwareGZipMiddleware, minimum_size=GZIP_MIN_SIZE)
+
+@app.middleware("http")
+async def record_request_metrics(request: Request, call_next):
+    start = time.perf_counter()
+    status_code = 500
+    try:
+        response = await call_next(request)
+        status_code = response.status_code
+        return response
+    finally:
+        # Label by route template, not raw path, to keep cardinality bounded
+        route = request.scope.get("route")
+        metrics.http_request_duration.observe(
+            time.perf_counter() - start,
+            method=request.method,
+            route=getattr(route, "path", "unmatched"),
+            status=status_code
+        )
+
+@app.middleware("http")
+async def trace_requests(request: Request, call_next):
+    request_id = tracing.request_id_from(request.headers.get("X-Request-ID"))
+    # Named by route template, never the raw path: dashboard ids in paths grant access to them
+    with tracing.start_trace(request.method, request_id, method=request.method) as root:
+        response = await call_next(request)
+        if root:
+            route = request.scope.get("route")
+            root.name = f"{request.method} {getattr(route, 'path', 'unmatched')}"
+            root.set(status=response.status_code)
+        response.headers["X-Request-ID"] = request_id
+        return response
+
+@app.get("/debug/traces", include_in_schema=False)
+async def get_slowest_traces(limit: int = 20):
+    """Slowest recently finished request traces, with nested stage spans"""
+    if not tracing.TRACE_ENDPOINT_ENABLED:
+        raise HTTPException(status_code=404, detail="Not Found")
+    return {"traces": tracing.slowest_traces(limit)}
+
+@app.get("/readyz", include_in_schema=False)
+async def readyz():
+    """200 once startup has finished warming up services, 503 before then or if it failed"""
+    if readiness["services"]:
+        return {"status": "ready"}
+    status_text = "failed" if readiness["error"] else "starting"
+    return JSONResponse({"status": status_text, "error": readiness["error"]}, status_code=503)
+
+@app.get("/metrics", include_in_schema=False)
+async def get_metrics():
+    return Response(metrics.REGISTRY.render(), media_type=metrics.CONTENT_TYPE)
+
 # Set up templates and static files
 templates = Jinja2Templates(directory="templates")
-app.mount("/static", StaticFiles(directory="static"), name="static")
-
-# Initialize services
-note_taker = NoteTaker()
-transcription_service = TranscriptionService()
-quiz_generator = QuizGenerator()
-
-# In-memory store for password reset tokens (for demo; use DB/Redis in prod)
-reset_tokens = {}
-
-conf = ConnectionConfig(
-    MAIL_USERNAME = os.getenv("MAIL_USERNAME"),
-    MAIL_PASSWORD = os.getenv("MAIL_PASSWORD"),
-    MAIL_FROM = os.getenv("MAIL_FROM"),
-    MAIL_PORT = int(os.getenv("MAIL_PORT", 587)),
-    MAIL_SERVER = os.getenv("MAIL_SERVER"),
-    MAIL_STARTTLS = os.getenv("MAIL_STARTTLS", "True") == "True",
-    MAIL_SSL_TLS = os.getenv("MAIL_SSL_TLS", "False") == "True",
-    USE_CREDENTIALS = True
-)
+templates.env.globals["asset_url"] = assets.asset_url
+app.mount("/static", assets.AssetFiles(), name="static")
+
+# Services are created on first use (or by the startup warm-up), so
+# importing this module stays fast and needs no network
+@functools.lru_cache(maxsize=None)
+def get_note_taker() -> NoteTaker:
+    return NoteTaker()
+
+@functools.lru_cache(maxsize=None)
+def get_transcription_service() -> TranscriptionService:
+    return TranscriptionService()
+
+@functools.lru_cache(maxsize=None)
+def get_quiz_generator() -> QuizGenerator:
+    return QuizGenerator()
+
+async def load_service(getter):
+    """
+    A service from one of the getters above, for request handlers.
+
+    Creating the first one imports the model client, which takes seconds, so
+    that happens in a thread if the warm-up hasn't finished yet.
+    """
+    await ai_service.load_genai()
+    return getter()
+
+def warm_up_services():
+    """Blocking: load the model client and tokenizer and create the services"""
+    ai_service.warm_up()
+    get_note_taker()
+    get_transcription_service()
+    get_quiz_generator()
+
+# Password reset tokens are kept in the shared state store, so any worker can redeem them
+RESET_TOKEN_TTL_SECONDS = int(os.getenv("RESET_TOKEN_TTL_SECONDS", 3600))
+
+def reset_token_key(token: str) -> str:
+    return f"reset_token:{token}"
+
+# Identifies this process in generation lease owners
+REFILL_WORKER_ID = f"{socket.gethostname()}:{os.getpid()}"
+
+def schedule_question_refill(background_tasks: BackgroundTasks, session_id: str, notes: str):
+    """Queue a background refill, tracking it in the refill queue depth gauge"""
+    metrics.refill_queue_depth.inc()
+    background_tasks.add_task(generate_more_questions, session_id, notes)
 
 async def generate_more_questions(session_id: str, notes: str):
     """Background task to generate more questions"""
-    if await DatabaseService.is_generating_questions(session_id):
+    try:
+        with tracing.start_trace("question_refill"):
+            await _generate_more_questions(session_id, notes)
+    finally:
+        metrics.refill_queue_depth.dec()
+
+async def renew_generation_lease_periodically(session_id: str, owner: str, lost: asyncio.Event):
+    """
+    Keep a refill lease alive while its holder works.
+
+    A single generate_quiz call can run for up to LLM_TIMEOUT, longer than the
+    lease, so renewing only between sets would let it expire mid-call.
+    """
+    while True:
+        await asyncio.sleep(GENERATION_LEASE_SECONDS / 3)
+        try:
+            renewed = await DatabaseService.renew_generation_lease(session_id, owner)
+        except Exception as e:
+            print(f"Error renewing generation lease: {e}")
+            continue
+        if not renewed:
+            lost.set()
+            return
+
+async def _generate_more_questions(session_id: str, notes: str):
+    owner = f"{REFILL_WORKER_ID}:{uuid.uuid4().hex[:8]}"
+    if not await DatabaseService.acquire_generation_lease(session_id, owner):
         print(f"Already generating questions for session {session_id}")
         return
-        
+
+    lost = asyncio.Event()
+    heartbeat = asyncio.create_task(renew_generation_lease_periodically(session_id, owner, lost))
     try:
-        await DatabaseService.set_generating_status(session_id, True)
         print(f"Generating more questions for session {session_id}")
         
-        # Generate 3 sets of questions at once
-        for _ in range(3):
+        # Generate one set at a time, asking the prefetch policy again after
+        # each so a quiz the user has left stops getting questions
+        for _ in range(prefetch.PREFETCH_MAX_SETS + 1):
+            if lost.is_set():
+                print(f"Lost generation lease for session {session_id}")
+                break
+            state = await DatabaseService.get_prefetch_state(session_id)
+            if state is None or prefetch.sets_to_generate(state) == 0:
+                break
             try:
-                response = await quiz_generator.generate_quiz(notes)
+                quiz_generator = await load_service(get_quiz_generator)
+                with tracing.span("quiz.generate_set"):
+                    response = await quiz_generator.generate_quiz(notes)
                 new_questions = response.get("questions", [])
                 if new_questions:
-                    await DatabaseService.add_questions_to_buffer(session_id, new_questions)
+                    buffered_sets = await DatabaseService.add_questions_to_buffer(session_id, new_questions, owner)
+                    if buffered_sets is None:
+                        print(f"Lost generation lease for session {session_id}")
+                        break
+                    await events.publish(session_id, "set_ready", {"buffered_sets": buffered_sets})
                     print(f"Added {len(new_questions)} questions to buffer for session {session_id}")
             except Exception as e:
                 print(f"Error generating quiz set: {e}")
@@ -102,9 +306,25 @@ async def generate_more_questions(session_id: str, notes: str):
     except Exception as e:
         print(f"Error in generate_more_questions: {e}")
     finally:
-        await DatabaseService.set_generating_status(session_id, False)
+        heartbeat.cancel()
+        await DatabaseService.release_generation_lease(session_id, owner)
         print(f"Finished generating questions for session {session_id}")
 
+def admit_user(endpoint: str):
+    """Admission control dependency for authenticated LLM-backed endpoints"""
+    async def dependency(current_user: User = Depends(get_current_active_user)):
+        async with admission.controller.admit(f"user:{current_user.id}", endpoint):
+            yield
+    return dependency
+
+def admit_client(endpoint: str):
+    """Admission control dependency keyed by client address for anonymous endpoints"""
+    async def dependency(request: Request):
+        host = request.client.host if request.client else "unknown"
+        async with admission.controller.admit(f"client:{host}", endpoint):
+            yield
+    return dependency
+
 class NotesRequest(BaseModel):
     text: Optional[str] = Field(None, min_length=1, description="The text to generate notes from")
     youtube_url: Optional[str] = Field(None, description="YouTube URL to transcribe and generate notes from")
@@ -124,6 +344,7 @@ class NotesRequest(BaseModel):
         return v
 
 class NotesResponse(BaseModel):
+    job_id: str = Field(..., description="The generation job, which can be resumed if it fails")
     transcription: Optional[str] = Field(None, description="The transcribed text (if YouTube URL was provided)")
     cleaned_text: str = Field(..., description="The cleaned and preprocessed text")
     notes: str = Field(..., description="The generated notes")
@@ -141,7 +362,48 @@ class QuizResponse(BaseModel):
     questions: List[QuizQuestion]
     set_number: int = 0
 
-@app.post("/generate-notes", response_model=NotesResponse)
+def note_job_owner() -> str:
+    return f"{REFILL_WORKER_ID}:{uuid.uuid4().hex[:8]}"
+
+async def run_note_job(job_id: str, owner: str, cleaned_text: str, chunking: Optional[str]) -> str:
+    """
+    Generate notes for a job held by owner. Each finished chunk is saved
+    as a checkpoint, so when this fails only the missing chunks are
+    generated on resume; chunking is the mode the job was created with.
+    """
+    checkpoints = await DatabaseService.get_note_checkpoints(job_id)
+    if checkpoints:
+        print(f"Resuming notes job {job_id} with {len(checkpoints)} chunks checkpointed")
+
+    async def save_chunk(chunk_hash: str, chunk_notes: str):
+        if not await DatabaseService.save_note_checkpoint(job_id, owner, chunk_hash, chunk_notes):
+            raise RuntimeError("The notes job was resumed by another request")
+
+    try:
+        note_taker = await load_service(get_note_taker)
+        notes = await note_taker.generate_notes(
+            cleaned_text, checkpoints=checkpoints, on_chunk=save_chunk, chunking=chunking
+        )
+    except (Exception, asyncio.CancelledError) as e:
+        # Also on disconnect, so the job can be resumed right away instead of after its lease
+        await asyncio.shield(DatabaseService.finish_note_job(job_id, owner, error=str(e)[:500] or type(e).__name__))
+        raise
+    await DatabaseService.finish_note_job(job_id, owner, notes=notes)
+    return notes
+
+def note_job_error(job_id: str, error: Exception) -> HTTPException:
+    """HTTP error for a failed notes job, naming it in X-Note-Job-ID so the client can resume it"""
+    headers = {"X-Note-Job-ID": job_id}
+    if isinstance(error, CircuitOpenError):
+        headers["Retry-After"] = str(error.retry_after)
+        return HTTPException(
+            status_code=503,
+            detail="The AI service is temporarily unavailable. Please resume the job shortly.",
+            headers=headers
+        )
+    return HTTPException(status_code=500, detail=f"An error occurred: {str(error)}", headers=headers)
+
+@app.post("/generate-notes", response_model=NotesResponse, dependencies=[Depends(admit_user("generate_notes"))])
 async def generate_notes(
     request: NotesRequest,
     current_user: User = Depends(get_current_active_user)
@@ -156,6 +418,7 @@ async def generate_notes(
         elif request.youtube_url:
             # YouTube URL
             try:
+                transcription_service = await load_service(get_transcription_service)
                 transcribed_text = await transcription_service.transcribe(request.youtube_url)
                 if not transcribed_text:
                     raise HTTPException(
@@ -174,19 +437,30 @@ async def generate_notes(
                 detail="Please provide either text or a YouTube URL"
             )
 
-        cleaned_text = note_taker._preprocess_text(raw_text)
+        note_taker = await load_service(get_note_taker)
+        with tracing.span("notes.preprocess", input_chars=len(raw_text)):
+            cleaned_text = note_taker._preprocess_text(raw_text)
         if not cleaned_text.strip():
             raise HTTPException(
                 status_code=400,
                 detail="The processed text is empty. Please provide valid input."
             )
 
-        # Step 3: Generate notes from the cleaned text
-        notes = await note_taker.generate_notes(cleaned_text)
+        # Step 3: Generate notes from the cleaned text, checkpointing each chunk
+        owner = note_job_owner()
+        chunking = await asyncio.to_thread(ai_service.chunking_mode)
+        job_id = await DatabaseService.create_note_job(
+            current_user.id, cleaned_text, transcribed_text, owner, chunking
+        )
+        try:
+            notes = await run_note_job(job_id, owner, cleaned_text, chunking)
+        except Exception as e:
+            raise note_job_error(job_id, e)
         print(f"Generated notes length: {len(notes)}")  # Debug print
 
         # Return all the information
         return NotesResponse(
+            job_id=job_id,
             transcription=transcribed_text,
             cleaned_text=cleaned_text,
             notes=notes
@@ -194,14 +468,45 @@ async def generate_notes(
 
     except HTTPException:
         raise
+    except CircuitOpenError as e:
+        raise HTTPException(
+            status_code=503,
+            detail="The AI service is temporarily unavailable. Please try again shortly.",
+            headers={"Retry-After": str(e.retry_after)}
+        )
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"An error occurred: {str(e)}")
 
+@app.post("/generate-notes/{job_id}/resume", response_model=NotesResponse,
+          dependencies=[Depends(admit_user("generate_notes"))])
+async def resume_notes(job_id: str, current_user: User = Depends(get_current_active_user)):
+    """Finish a failed notes job, generating only the chunks without a checkpoint"""
+    owner = note_job_owner()
+    job = await DatabaseService.claim_note_job(job_id, current_user.id, owner)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Notes job not found")
+    if job["status"] == "completed":
+        # Finished already, e.g. the response to the original request was lost
+        notes = job["notes"]
+    elif not job["claimed"]:
+        raise HTTPException(status_code=409, detail="This notes job is still running")
+    else:
+        try:
+            notes = await run_note_job(job_id, owner, job["cleaned_text"], job["chunking"])
+        except Exception as e:
+            raise note_job_error(job_id, e)
+
+    return NotesResponse(
+        job_id=job_id,
+        transcription=job["transcription"],
+        cleaned_text=job["cleaned_text"],
+        notes=notes
+    )
+
 @app.get("/quiz/{quiz_id}")
 async def show_quiz(request: Request, quiz_id: str):
     # Check if quiz exists
-    dashboard = await DatabaseService.get_dashboard(quiz_id)
-    if not dashboard:
+    if not await DatabaseService.dashboard_exists(quiz_id):
         raise HTTPException(status_code=404, detail="Quiz not found")
     
     return templates.TemplateResponse(
@@ -210,16 +515,20 @@ async def show_quiz(request: Request, quiz_id: str):
     )
 
 @app.get("/api/quiz/{quiz_id}")
-async def get_quiz_data(background_tasks: BackgroundTasks, quiz_id: str, set_number: int = 0):
-    dashboard = await DatabaseService.get_dashboard(quiz_id)
-    if not dashboard:
+async def get_quiz_data(request: Request, response: Response, background_tasks: BackgroundTasks,
+                        quiz_id: str, set_number: int = 0):
+    # A filled set never changes, so a client that already has it only needs
+    # the set checked and recorded as served, not loaded again
+    etag = http_cache.make_etag("set", quiz_id, set_number)
+    cached = http_cache.etag_matches(request, etag)
+    questions, needs_more = await DatabaseService.get_quiz_questions(quiz_id, set_number, load_questions=not cached)
+    if questions is None and not needs_more:
         raise HTTPException(status_code=404, detail="Quiz not found")
     
-    questions, needs_more = await DatabaseService.get_quiz_questions(quiz_id, set_number)
-    
     # If we need more questions and we're not already generating them
     if needs_more and not await DatabaseService.is_generating_questions(quiz_id):
-        background_tasks.add_task(generate_more_questions, quiz_id, dashboard.notes)
+        notes = await DatabaseService.get_dashboard_notes(quiz_id)
+        schedule_question_refill(background_tasks, quiz_id, notes)
     
     # If we don't have questions for this set yet
     if questions is None:
@@ -227,15 +536,50 @@ async def get_quiz_data(background_tasks: BackgroundTasks, quiz_id: str, set_num
             status_code=202,  # 202 Accepted indicates the request was accepted but not completed
             detail="Questions are being generated. Please try again in a moment."
         )
+
+    if cached:
+        return http_cache.not_modified("quiz_set", etag, http_cache.IMMUTABLE_CACHE_CONTROL)
     
     # Return the questions we have
+    http_cache.set_validators("quiz_set", response, etag, http_cache.IMMUTABLE_CACHE_CONTROL)
     return {
         "questions": questions,
         "set_number": set_number,
         "has_next": True  # Always true since we're making it infinite
     }
 
-@app.post("/generate-quiz", response_model=QuizResponse)
+@app.get("/api/quiz/{quiz_id}/events")
+async def quiz_events(request: Request, quiz_id: str):
+    """
+    Server-sent events for a dashboard: set_ready when new questions are
+    buffered and stats when results are recorded.
+
+    The stream starts with the current number of buffered sets, so a client
+    that got a 202 can wait here instead of polling.
+    """
+    prefetch_state = await DatabaseService.get_prefetch_state(quiz_id)
+    if prefetch_state is None:
+        raise HTTPException(status_code=404, detail="Quiz not found")
+
+    async def stream():
+        with events.subscribe(quiz_id) as queue:
+            yield "retry: 3000\n\n"
+            yield events.format_sse("set_ready", {"buffered_sets": prefetch_state.buffered_sets})
+            while not await request.is_disconnected():
+                try:
+                    message = await asyncio.wait_for(queue.get(), events.EVENT_KEEPALIVE_SECONDS)
+                except asyncio.TimeoutError:
+                    yield ": keepalive\n\n"
+                    continue
+                yield events.format_sse(message["event"], message["data"])
+
+    return StreamingResponse(
+        stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+@app.post("/generate-quiz", response_model=QuizResponse, dependencies=[Depends(admit_user("generate_quiz"))])
 async def generate_quiz(
     request: QuizRequest,
     background_tasks: BackgroundTasks,
@@ -249,6 +593,7 @@ async def generate_quiz(
             
         # Initialize first set of questions
         try:
+            quiz_generator = await load_service(get_quiz_generator)
             response = await quiz_generator.generate_quiz(request.notes)
             questions = response.get("questions", [])
             
@@ -257,6 +602,12 @@ async def generate_quiz(
                     status_code=500,
                     detail="Failed to generate quiz questions. Please try again."
                 )
+        except CircuitOpenError as e:
+            raise HTTPException(
+                status_code=503,
+                detail="The AI service is temporarily unavailable. Please try again shortly.",
+                headers={"Retry-After": str(e.retry_after)}
+            )
         except Exception as e:
             print(f"Error generating quiz: {e}")
             raise HTTPException(
@@ -278,7 +629,7 @@ async def generate_quiz(
             )
         
         # Start generating next set in the background
-        background_tasks.add_task(generate_more_questions, session_id, request.notes)
+        schedule_question_refill(background_tasks, session_id, request.notes)
         
         return {
             "quiz_id": session_id,
@@ -299,7 +650,7 @@ async def register(user_data: UserCreate):
     existing_user = await DatabaseService.get_user_by_username(user_data.username)
     if existing_user:
         raise HTTPException(status_code=400, detail="Username already registered")
-    # Use the User model's password hashing method to be consistent with existing users
+    # create_user hashes the password in the shared process pool
     user = await DatabaseService.create_user(user_data.email, user_data.username, user_data.password)
     # Automatically log in the user after registration
     access_token_expires = timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
@@ -323,8 +674,8 @@ async def register(user_data: UserCreate):
 
 @app.post("/token", response_model=Token)
 async def login_for_access_token(form_data: OAuth2PasswordRequestForm = Depends()):
-    user = await DatabaseService.get_user_by_username(form_data.username)
-    if not user or not User.verify_password(form_data.password, user.hashed_password):
+    user = await authenticate_user(form_data.username, form_data.password)
+    if not user:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Incorrect username or password",
@@ -396,75 +747,131 @@ async def root(request: Request):
     # Try to validate the token
     try:
         token = auth_header.split(" ")[1]
-        # Use jwt.decode directly for simple validation without DB lookup
-        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
+        # Decode only (cached until exp), no user lookup needed here
+        await decode_token(token)
         # If we get here, token is valid
         return templates.TemplateResponse("index.html", {"request": request, "authenticated": True})
-    except JWTError:
+    except TokenError:
         # Instead of raising an error, log the user out and redirect to login
         return templates.TemplateResponse(
             "logout.html",
             {"request": request}
         )
 
+DASHBOARDS_PAGE_SIZE = 30
+
+async def get_dashboards_page(user_id: int, cursor: Optional[str], limit: int = DASHBOARDS_PAGE_SIZE) -> tuple:
+    try:
+        return await DatabaseService.get_user_dashboards_page(user_id, limit, cursor)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
 @app.get("/dashboards")
 async def show_dashboards(
     request: Request,
+    cursor: Optional[str] = None,
     current_user: User = Depends(get_current_active_user)
 ):
-    # Get all dashboards for the current user
-    dashboards = await DatabaseService.get_user_dashboards(current_user.id)
+    # Get one page of dashboards for the current user
+    dashboards, next_cursor = await get_dashboards_page(current_user.id, cursor)
     
     return templates.TemplateResponse(
         "dashboards.html",
         {
             "request": request,
             "username": current_user.username,
-            "dashboards": dashboards
+            "dashboards": dashboards,
+            "next_cursor": next_cursor
         }
     )
 
+@app.get("/api/dashboards")
+async def list_dashboards(
+    cursor: Optional[str] = None,
+    limit: int = Query(DASHBOARDS_PAGE_SIZE, ge=1, le=100),
+    current_user: User = Depends(get_current_active_user)
+):
+    dashboards, next_cursor = await get_dashboards_page(current_user.id, cursor, limit)
+    return {"dashboards": dashboards, "next_cursor": next_cursor}
+
+SEARCH_PAGE_SIZE = 20
+
+@app.get("/api/search")
+async def search_notes(
+    q: str = Query(..., min_length=1, max_length=200),
+    limit: int = Query(SEARCH_PAGE_SIZE, ge=1, le=50),
+    offset: int = Query(0, ge=0, le=1000),
+    current_user: User = Depends(get_current_active_user)
+):
+    # Fetch one extra row to tell whether another page exists
+    results = await DatabaseService.search_notes(current_user.id, q, limit + 1, offset)
+    next_offset = offset + limit if len(results) > limit else None
+    return {"results": results[:limit], "next_offset": next_offset}
+
+ANALYTICS_BUCKET_PATTERN = "^(hour|day|week|month)$"
+
+@app.get("/api/analytics/dashboards/{session_id}")
+async def dashboard_analytics(
+    session_id: str,
+    bucket: str = Query("day", pattern=ANALYTICS_BUCKET_PATTERN),
+    window: int = Query(7, ge=1, le=90),
+    days: int = Query(90, ge=1, le=3650),
+    current_user: User = Depends(get_current_active_user)
+):
+    points = await DatabaseService.get_dashboard_trend(current_user.id, session_id, bucket, window, days)
+    if points is None:
+        raise HTTPException(status_code=404, detail="Session not found")
+    return {"bucket": bucket, "window": window, "points": points}
+
+@app.get("/api/analytics/user")
+async def user_analytics(
+    bucket: str = Query("day", pattern=ANALYTICS_BUCKET_PATTERN),
+    window: int = Query(7, ge=1, le=90),
+    days: int = Query(90, ge=1, le=3650),
+    current_user: User = Depends(get_current_active_user)
+):
+    points = await DatabaseService.get_user_trend(current_user.id, bucket, window, days)
+    return {"bucket": bucket, "window": window, "points": points}
+
+class DashboardDeletion(BaseModel):
+    ids: List[str] = Field(..., min_length=1, max_length=500)
+
+@app.post("/api/dashboards/delete")
+async def delete_dashboards(
+    deletion: DashboardDeletion,
+    current_user: User = Depends(get_current_active_user)
+):
+    # Only the caller's own dashboards match, so foreign ids are silently ignored
+    deleted = await DatabaseService.delete_dashboards(current_user.id, deletion.ids)
+    return {"deleted": deleted}
+
 @app.post("/dashboards")
 async def post_dashboards(
     request: Request,
+    cursor: Optional[str] = None,
     token: str = Form(...)  # Get token from form data
 ):
-    # Manually validate the token
-    try:
-        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
-        username = payload.get("sub")
-        if not username:
-            return templates.TemplateResponse(
-                "logout.html",
-                {"request": request}
-            )
-            
-        # Get the user from database
-        user = await DatabaseService.get_user_by_username(username)
-        if not user:
-            return templates.TemplateResponse(
-                "logout.html",
-                {"request": request}
-            )
-            
-        # Get all dashboards for the user
-        dashboards = await DatabaseService.get_user_dashboards(user.id)
-        
-        # Return the dashboards template
-        return templates.TemplateResponse(
-            "dashboards.html",
-            {
-                "request": request,
-                "username": user.username,
-                "dashboards": dashboards
-            }
-        )
-    except JWTError:
-        # Instead of raising an error, log the user out and redirect to login
+    # Validate the token posted with the form (cached, usually no database lookup)
+    user = await get_user_from_token(token)
+    if not user:
         return templates.TemplateResponse(
             "logout.html",
             {"request": request}
         )
+        
+    # Get one page of dashboards for the user
+    dashboards, next_cursor = await get_dashboards_page(user.id, cursor)
+    
+    # Return the dashboards template
+    return templates.TemplateResponse(
+        "dashboards.html",
+        {
+            "request": request,
+            "username": user.username,
+            "dashboards": dashboards,
+            "next_cursor": next_cursor
+        }
+    )
 
 @app.get("/dashboard/{session_id}")
 async def show_dashboard(
@@ -472,8 +879,8 @@ async def show_dashboard(
     session_id: str,
     current_user: User = Depends(get_current_active_user)
 ):
-    dashboard = await DatabaseService.get_dashboard(session_id)
-    if not dashboard:
+    notes = await DatabaseService.get_dashboard_notes(session_id)
+    if notes is None:
         raise HTTPException(status_code=404, detail="Session not found")
     
     return templates.TemplateResponse(
@@ -481,7 +888,7 @@ async def show_dashboard(
         {
             "request": request,
             "session_id": session_id,
-            "notes": dashboard.notes
+            "notes": notes
         }
     )
 
@@ -492,78 +899,103 @@ async def post_dashboard(
     session_id: str,
     token: str = Form(...)  # Get token from form data
 ):
-    # Manually validate the token
-    try:
-        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
-        username = payload.get("sub")
-        if not username:
-            return templates.TemplateResponse(
-                "logout.html",
-                {"request": request}
-            )
-            
-        # Get the user from database
-        user = await DatabaseService.get_user_by_username(username)
-        if not user:
-            return templates.TemplateResponse(
-                "logout.html",
-                {"request": request}
-            )
-            
-        # Get the dashboard
-        dashboard = await DatabaseService.get_dashboard(session_id)
-        if not dashboard:
-            raise HTTPException(status_code=404, detail="Session not found")
-        
-        # Return the dashboard template
-        return templates.TemplateResponse(
-            "dashboard.html",
-            {
-                "request": request,
-                "session_id": session_id,
-                "notes": dashboard.notes
-            }
-        )
-    except JWTError:
-        # Instead of raising an error, log the user out and redirect to login
+    # Validate the token posted with the form (cached, usually no database lookup)
+    user = await get_user_from_token(token)
+    if not user:
         return templates.TemplateResponse(
             "logout.html",
             {"request": request}
         )
+        
+    # Get the dashboard
+    notes = await DatabaseService.get_dashboard_notes(session_id)
+    if notes is None:
+        raise HTTPException(status_code=404, detail="Session not found")
+    
+    # Return the dashboard template
+    return templates.TemplateResponse(
+        "dashboard.html",
+        {
+            "request": request,
+            "session_id": session_id,
+            "notes": notes
+        }
+    )
+
+@app.get("/api/notes/{session_id}")
+async def get_notes(
+    request: Request,
+    response: Response,
+    session_id: str,
+    current_user: User = Depends(get_current_active_user)
+):
+    """A dashboard's notes, which never change after creation"""
+    versions = await DatabaseService.get_dashboard_versions(session_id)
+    if versions is None or versions["user_id"] != current_user.id:
+        raise HTTPException(status_code=404, detail="Session not found")
+    etag = http_cache.make_etag("notes", session_id)
+    if http_cache.etag_matches(request, etag):
+        return http_cache.not_modified("notes", etag, http_cache.IMMUTABLE_CACHE_CONTROL)
+    notes = await DatabaseService.get_dashboard_notes(session_id)
+    if notes is None:
+        raise HTTPException(status_code=404, detail="Session not found")
+    http_cache.set_validators("notes", response, etag, http_cache.IMMUTABLE_CACHE_CONTROL)
+    return {"session_id": session_id, "notes": notes}
 
 @app.get("/api/quiz-stats/{session_id}")
-async def get_quiz_stats(session_id: str):
+async def get_quiz_stats(request: Request, response: Response, session_id: str):
+    versions = await DatabaseService.get_dashboard_versions(session_id)
+    if versions is None:
+        raise HTTPException(status_code=404, detail="Session not found")
+    etag = http_cache.make_etag("stats", session_id, versions["stats_version"])
+    if http_cache.etag_matches(request, etag):
+        return http_cache.not_modified("stats", etag, http_cache.REVALIDATE_CACHE_CONTROL)
     stats = await DatabaseService.get_dashboard_stats(session_id)
     if not stats:
         raise HTTPException(status_code=404, detail="Session not found")
+    http_cache.set_validators("stats", response, etag, http_cache.REVALIDATE_CACHE_CONTROL)
     return stats
 
+class QuizResult(BaseModel):
+    total_questions: int = Field(..., ge=0)
+    correct_answers: int = Field(..., ge=0)
+    streak: int = Field(0, ge=0)
+
+class QuizResultBatch(BaseModel):
+    attempts: List[QuizResult] = Field(..., min_length=1, max_length=500)
+
+async def _record_quiz_results(session_id: str, results: List[QuizResult]):
+    recorded = await DatabaseService.record_quiz_results(session_id, [
+        {
+            "questions_answered": result.total_questions,
+            "correct_answers": result.correct_answers,
+            "streak": result.streak
+        }
+        for result in results
+    ])
+    if not recorded:
+        raise HTTPException(status_code=404, detail="Session not found")
+    # Subscribers may be connected to any worker, so stats are always published
+    await events.publish(session_id, "stats", await DatabaseService.get_dashboard_stats(session_id))
+
 @app.post("/submit-quiz-results/{session_id}")
-async def submit_quiz_results(session_id: str, results: dict):
+async def submit_quiz_results(session_id: str, results: QuizResult):
     try:
-        # Add the quiz attempt
-        await DatabaseService.add_quiz_attempt(
-            session_id=session_id,
-            questions_answered=results["total_questions"],
-            correct_answers=results["correct_answers"],
-            streak=results.get("streak", 0)
-        )
-        
-        # Update overall dashboard stats
-        dashboard = await DatabaseService.get_dashboard(session_id)
-        if dashboard:
-            new_total = dashboard.total_questions + results["total_questions"]
-            new_correct = dashboard.total_correct + results["correct_answers"]
-            new_streak = max(dashboard.best_streak, results.get("streak", 0))
-            
-            await DatabaseService.update_dashboard_stats(
-                session_id=session_id,
-                total_questions=new_total,
-                total_correct=new_correct,
-                best_streak=new_streak
-            )
-        
+        await _record_quiz_results(session_id, [results])
         return {"success": True}
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Failed to submit results: {str(e)}")
+
+@app.post("/submit-quiz-results/{session_id}/batch")
+async def submit_quiz_results_batch(session_id: str, batch: QuizResultBatch):
+    """Apply several attempts (e.g. queued by an offline client) in one commit"""
+    try:
+        await _record_quiz_results(session_id, batch.attempts)
+        return {"success": True, "recorded": len(batch.attempts)}
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Failed to submit results: {str(e)}")
 
@@ -585,20 +1017,8 @@ async def profile_page(
     request: Request,
     current_user: User = Depends(get_current_active_user)
 ):
-    # Get user's dashboards
-    dashboards = await DatabaseService.get_user_dashboards(current_user.id)
-    
-    # Calculate statistics
-    total_dashboards = len(dashboards)
-    total_quizzes = sum(1 for d in dashboards if d.total_questions > 0)
-    
-    # Calculate average score
-    total_correct = sum(d.total_correct for d in dashboards)
-    total_questions = sum(d.total_questions for d in dashboards)
-    avg_score = round((total_correct / total_questions * 100) if total_questions > 0 else 0, 1)
-    
-    # Get best streak across all dashboards
-    best_streak = max((d.best_streak for d in dashboards), default=0)
+    # Read the user's precomputed statistics
+    stats = await DatabaseService.get_user_stats(current_user.id)
     
     return templates.TemplateResponse(
         "profile.html",
@@ -607,10 +1027,7 @@ async def profile_page(
             "username": current_user.username,
             "email": current_user.email,
             "joined_date": current_user.created_at,
-            "total_dashboards": total_dashboards,
-            "total_quizzes": total_quizzes,
-            "avg_score": avg_score,
-            "best_streak": best_streak
+            **stats
         }
     )
 
@@ -619,72 +1036,35 @@ async def post_profile(
     request: Request,
     token: str = Form(...)  # Get token from form data
 ):
-    # Manually validate the token
-    try:
-        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
-        username = payload.get("sub")
-        if not username:
-            return templates.TemplateResponse(
-                "logout.html",
-                {"request": request}
-            )
-            
-        # Get the user from database
-        user = await DatabaseService.get_user_by_username(username)
-        if not user:
-            return templates.TemplateResponse(
-                "logout.html",
-                {"request": request}
-            )
-            
-        # Get user's dashboards
-        dashboards = await DatabaseService.get_user_dashboards(user.id)
-        
-        # Calculate statistics
-        total_dashboards = len(dashboards)
-        total_quizzes = sum(1 for d in dashboards if d.get('total_questions', 0) > 0)
-        
-        # Calculate average score
-        total_correct = sum(d.get('total_correct', 0) for d in dashboards)
-        total_questions = sum(d.get('total_questions', 0) for d in dashboards)
-        avg_score = round((total_correct / total_questions * 100) if total_questions > 0 else 0, 1)
-        
-        # Get best streak across all dashboards
-        best_streak = max((d.get('best_streak', 0) for d in dashboards), default=0)
-        
-        # Return the profile template
-        return templates.TemplateResponse(
-            "profile.html",
-            {
-                "request": request,
-                "username": user.username,
-                "email": user.email,
-                "joined_date": user.created_at,
-                "total_dashboards": total_dashboards,
-                "total_quizzes": total_quizzes,
-                "avg_score": avg_score,
-                "best_streak": best_streak
-            }
-        )
-    except JWTError:
-        # Instead of raising an error, log the user out and redirect to login
+    # Validate the token posted with the form (cached, usually no database lookup)
+    user = await get_user_from_token(token)
+    if not user:
         return templates.TemplateResponse(
             "logout.html",
             {"request": request}
         )
+        
+    # Read the user's precomputed statistics
+    stats = await DatabaseService.get_user_stats(user.id)
+    
+    # Return the profile template
+    return templates.TemplateResponse(
+        "profile.html",
+        {
+            "request": request,
+            "username": user.username,
+            "email": user.email,
+            "joined_date": user.created_at,
+            **stats
+        }
+    )
 
 @app.delete("/api/user/delete")
 async def delete_user(current_user: User = Depends(get_current_active_user)):
     try:
-        # Get all user's dashboards
-        dashboards = await DatabaseService.get_user_dashboards(current_user.id)
-        
-        # Delete all dashboards
-        for dashboard in dashboards:
-            await DatabaseService.delete_dashboard(dashboard['id'])
-        
-        # Delete the user
+        # Dashboards, questions, attempts and stats go in the same transaction
         await DatabaseService.delete_user(current_user.id)
+        await invalidate_user(current_user.username)
         
         return {"message": "User account deleted successfully"}
     except Exception as e:
@@ -699,39 +1079,22 @@ async def post_quiz(
     quiz_id: str,
     token: str = Form(...)  # Get token from form data
 ):
-    # Manually validate the token
-    try:
-        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
-        username = payload.get("sub")
-        if not username:
-            return templates.TemplateResponse(
-                "logout.html",
-                {"request": request}
-            )
-            
-        # Get the user from database
-        user = await DatabaseService.get_user_by_username(username)
-        if not user:
-            return templates.TemplateResponse(
-                "logout.html",
-                {"request": request}
-            )
-            
-        # Check if quiz exists
-        dashboard = await DatabaseService.get_dashboard(quiz_id)
-        if not dashboard:
-            raise HTTPException(status_code=404, detail="Quiz not found")
-        
-        return templates.TemplateResponse(
-            "quiz.html", 
-            {"request": request, "quiz_id": quiz_id}
-        )
-    except JWTError:
-        # Instead of raising an error, log the user out and redirect to login
+    # Validate the token posted with the form (cached, usually no database lookup)
+    user = await get_user_from_token(token)
+    if not user:
         return templates.TemplateResponse(
             "logout.html",
             {"request": request}
         )
+        
+    # Check if quiz exists
+    if not await DatabaseService.dashboard_exists(quiz_id):
+        raise HTTPException(status_code=404, detail="Quiz not found")
+    
+    return templates.TemplateResponse(
+        "quiz.html", 
+        {"request": request, "quiz_id": quiz_id}
+    )
 
 @app.get("/forgot-password")
 async def forgot_password_page(request: Request):
@@ -742,12 +1105,13 @@ async def forgot_password_submit(request: Request, email: str = Form(...)):
     user = await DatabaseService.get_user_by_email(email)
     if user:
         token = secrets.token_urlsafe(32)
-        reset_tokens[token] = user.username
+        await state.store.set(reset_token_key(token), user.username, ttl=RESET_TOKEN_TTL_SECONDS)
         reset_link = f"http://localhost:8000/reset-password/{token}"
-        message = MessageSchema(
-            subject="Password Reset Request",
-            recipients=[user.email],
-            body=f"""
+        # Queued for the mail worker, so the page never waits on the SMTP server
+        await mail.send_mail(
+            user.email,
+            "Password Reset Request",
+            f"""
                 <div style='font-family: Arial, sans-serif; max-width: 500px; margin: auto; border: 1px solid #eee; border-radius: 8px; padding: 24px; background: #f9f9f9;'>
                     <h2 style='color: #2c3e50;'>Password Reset Request</h2>
                     <p>Hi <strong>{user.username}</strong>,</p>
@@ -765,39 +1129,34 @@ async def forgot_password_submit(request: Request, email: str = Form(...)):
             """,
             subtype="html"
         )
-        fm = FastMail(conf)
-        await fm.send_message(message)
     # Always show the same response
     return templates.TemplateResponse("forgot_password_submitted.html", {"request": request})
 
 @app.get("/reset-password/{token}")
 async def reset_password_page(request: Request, token: str):
-    username = reset_tokens.get(token)
+    username = await state.store.get(reset_token_key(token))
     if not username:
         return templates.TemplateResponse("reset_password_invalid.html", {"request": request})
     return templates.TemplateResponse("reset_password.html", {"request": request, "token": token})
 
 @app.post("/reset-password/{token}")
 async def reset_password_submit(request: Request, token: str, password: str = Form(...)):
-    username = reset_tokens.get(token)
+    # Popped atomically, so a token can only be redeemed once even across workers
+    username = await state.store.pop(reset_token_key(token))
     if not username:
         return templates.TemplateResponse("reset_password_invalid.html", {"request": request})
     user = await DatabaseService.get_user_by_username(username)
     if not user:
         return templates.TemplateResponse("reset_password_invalid.html", {"request": request})
     # Update password
-    user.hashed_password = User.get_password_hash(password)
-    async with async_session() as session:
-        session.add(user)
-        await session.commit()
-    del reset_tokens[token]
+    await DatabaseService.update_password(user.id, await passwords.hash_password(password))
+    await invalidate_user(user.username)
     return RedirectResponse("/login", status_code=303)
 
 @app.get("/chat/{quiz_id}")
 async def show_chat(request: Request, quiz_id: str):
     # Check if quiz exists
-    dashboard = await DatabaseService.get_dashboard(quiz_id)
-    if not dashboard:
+    if not await DatabaseService.dashboard_exists(quiz_id):
         raise HTTPException(status_code=404, detail="Quiz not found")
     
     return templates.TemplateResponse(
@@ -811,54 +1170,38 @@ async def post_chat(
     quiz_id: str,
     token: str = Form(...)  # Get token from form data
 ):
-    # Manually validate the token
-    try:
-        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
-        username = payload.get("sub")
-        if not username:
-            return templates.TemplateResponse(
-                "logout.html",
-                {"request": request}
-            )
-            
-        # Get the user from database
-        user = await DatabaseService.get_user_by_username(username)
-        if not user:
-            return templates.TemplateResponse(
-                "logout.html",
-                {"request": request}
-            )
-            
-        # Check if quiz exists
-        dashboard = await DatabaseService.get_dashboard(quiz_id)
-        if not dashboard:
-            raise HTTPException(status_code=404, detail="Quiz not found")
-        
-        return templates.TemplateResponse(
-            "chat.html", 
-            {"request": request, "quiz_id": quiz_id}
-        )
-    except JWTError:
-        # Instead of raising an error, log the user out and redirect to login
+    # Validate the token posted with the form (cached, usually no database lookup)
+    user = await get_user_from_token(token)
+    if not user:
         return templates.TemplateResponse(
             "logout.html",
             {"request": request}
         )
+        
+    # Check if quiz exists
+    if not await DatabaseService.dashboard_exists(quiz_id):
+        raise HTTPException(status_code=404, detail="Quiz not found")
+    
+    return templates.TemplateResponse(
+        "chat.html", 
+        {"request": request, "quiz_id": quiz_id}
+    )
 
 class ChatRequest(BaseModel):
     question: str
     history: Optional[List[Dict[str, str]]] = []
 
-@app.post("/api/chat/{quiz_id}")
+@app.post("/api/chat/{quiz_id}", dependencies=[Depends(admit_client("chat"))])
 async def chat_with_ai(quiz_id: str, request: ChatRequest):
     try:
         # Get the dashboard to access the notes
-        dashboard = await DatabaseService.get_dashboard(quiz_id)
-        if not dashboard:
+        notes = await DatabaseService.get_dashboard_notes(quiz_id)
+        if notes is None:
             raise HTTPException(status_code=404, detail="Quiz not found")
         
         # Initialize the chatbot with the notes
-        chatbot = ChatBot(dashboard.notes)
+        await ai_service.load_genai()
+        chatbot = ChatBot(notes)
         
         # Add previous conversation history if provided
         if request.history:
@@ -879,261 +1222,6 @@ async def chat_with_ai(quiz_id: str, request: ChatRequest):
             detail="Failed to get a response from the AI. Please try again."
         )
 
-@app.post("/submit-quiz-results/{session_id}")
-async def submit_quiz_results(session_id: str, results: dict):
-    try:
-        # Add the quiz attempt
-        await DatabaseService.add_quiz_attempt(
-            session_id=session_id,
-            questions_answered=results["total_questions"],
-            correct_answers=results["correct_answers"],
-            streak=results.get("streak", 0)
-        )
-        
-        # Update overall dashboard stats
-        dashboard = await DatabaseService.get_dashboard(session_id)
-        if dashboard:
-            new_total = dashboard.total_questions + results["total_questions"]
-            new_correct = dashboard.total_correct + results["correct_answers"]
-            new_streak = max(dashboard.best_streak, results.get("streak", 0))
-            
-            await DatabaseService.update_dashboard_stats(
-                session_id=session_id,
-                total_questions=new_total,
-                total_correct=new_correct,
-                best_streak=new_streak
-            )
-        
-        return {"success": True}
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Failed to submit results: {str(e)}")
-
-@app.delete("/api/dashboard/{session_id}")
-async def delete_dashboard(session_id: str):
-    try:
-        success = await DatabaseService.delete_dashboard(session_id)
-        if not success:
-            raise HTTPException(status_code=404, detail="Dashboard not found")
-        return {"success": True, "message": "Dashboard deleted successfully"}
-    except HTTPException:
-        raise
-    except Exception as e:
-        print(f"Error deleting dashboard: {e}")
-        raise HTTPException(status_code=500, detail="Failed to delete dashboard")
-
-@app.get("/profile")
-async def profile_page(
-    request: Request,
-    current_user: User = Depends(get_current_active_user)
-):
-    # Get user's dashboards
-    dashboards = await DatabaseService.get_user_dashboards(current_user.id)
-    
-    # Calculate statistics
-    total_dashboards = len(dashboards)
-    total_quizzes = sum(1 for d in dashboards if d.total_questions > 0)
-    
-    # Calculate average score
-    total_correct = sum(d.total_correct for d in dashboards)
-    total_questions = sum(d.total_questions for d in dashboards)
-    avg_score = round((total_correct / total_questions * 100) if total_questions > 0 else 0, 1)
-    
-    # Get best streak across all dashboards
-    best_streak = max((d.best_streak for d in dashboards), default=0)
-    
-    return templates.TemplateResponse(
-        "profile.html",
-        {
-            "request": request,
-            "username": current_user.username,
-            "email": current_user.email,
-            "joined_date": current_user.created_at,
-            "total_dashboards": total_dashboards,
-            "total_quizzes": total_quizzes,
-            "avg_score": avg_score,
-            "best_streak": best_streak
-        }
-    )
-
-@app.post("/profile")
-async def post_profile(
-    request: Request,
-    token: str = Form(...)  # Get token from form data
-):
-    # Manually validate the token
-    try:
-        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
-        username = payload.get("sub")
-        if not username:
-            return templates.TemplateResponse(
-                "logout.html",
-                {"request": request}
-            )
-            
-        # Get the user from database
-        user = await DatabaseService.get_user_by_username(username)
-        if not user:
-            return templates.TemplateResponse(
-                "logout.html",
-                {"request": request}
-            )
-            
-        # Get user's dashboards
-        dashboards = await DatabaseService.get_user_dashboards(user.id)
-        
-        # Calculate statistics
-        total_dashboards = len(dashboards)
-        total_quizzes = sum(1 for d in dashboards if d.get('total_questions', 0) > 0)
-        
-        # Calculate average score
-        total_correct = sum(d.get('total_correct', 0) for d in dashboards)
-        total_questions = sum(d.get('total_questions', 0) for d in dashboards)
-        avg_score = round((total_correct / total_questions * 100) if total_questions > 0 else 0, 1)
-        
-        # Get best streak across all dashboards
-        best_streak = max((d.get('best_streak', 0) for d in dashboards), default=0)
-        
-        # Return the profile template
-        return templates.TemplateResponse(
-            "profile.html",
-            {
-                "request": request,
-                "username": user.username,
-                "email": user.email,
-                "joined_date": user.created_at,
-                "total_dashboards": total_dashboards,
-                "total_quizzes": total_quizzes,
-                "avg_score": avg_score,
-                "best_streak": best_streak
-            }
-        )
-    except JWTError:
-        # Instead of raising an error, log the user out and redirect to login
-        return templates.TemplateResponse(
-            "logout.html",
-            {"request": request}
-        )
-
-@app.delete("/api/user/delete")
-async def delete_user(current_user: User = Depends(get_current_active_user)):
-    try:
-        # Get all user's dashboards
-        dashboards = await DatabaseService.get_user_dashboards(current_user.id)
-        
-        # Delete all dashboards
-        for dashboard in dashboards:
-            await DatabaseService.delete_dashboard(dashboard['id'])
-        
-        # Delete the user
-        await DatabaseService.delete_user(current_user.id)
-        
-        return {"message": "User account deleted successfully"}
-    except Exception as e:
-        raise HTTPException(
-            status_code=500,
-            detail=f"Failed to delete account: {str(e)}"
-        )
-
-@app.post("/quiz/{quiz_id}")
-async def post_quiz(
-    request: Request,
-    quiz_id: str,
-    token: str = Form(...)  # Get token from form data
-):
-    # Manually validate the token
-    try:
-        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
-        username = payload.get("sub")
-        if not username:
-            return templates.TemplateResponse(
-                "logout.html",
-                {"request": request}
-            )
-            
-        # Get the user from database
-        user = await DatabaseService.get_user_by_username(username)
-        if not user:
-            return templates.TemplateResponse(
-                "logout.html",
-                {"request": request}
-            )
-            
-        # Check if quiz exists
-        dashboard = await DatabaseService.get_dashboard(quiz_id)
-        if not dashboard:
-            raise HTTPException(status_code=404, detail="Quiz not found")
-        
-        return templates.TemplateResponse(
-            "quiz.html", 
-            {"request": request, "quiz_id": quiz_id}
-        )
-    except JWTError:
-        # Instead of raising an error, log the user out and redirect to login
-        return templates.TemplateResponse(
-            "logout.html",
-            {"request": request}
-        )
-
-@app.get("/forgot-password")
-async def forgot_password_page(request: Request):
-    return templates.TemplateResponse("forgot_password.html", {"request": request})
-
-@app.post("/forgot-password")
-async def forgot_password_submit(request: Request, email: str = Form(...)):
-    user = await DatabaseService.get_user_by_email(email)
-    if user:
-        token = secrets.token_urlsafe(32)
-        reset_tokens[token] = user.username
-        reset_link = f"http://localhost:8000/reset-password/{token}"
-        message = MessageSchema(
-            subject="Password Reset Request",
-            recipients=[user.email],
-            body=f"""
-                <div style='font-family: Arial, sans-serif; max-width: 500px; margin: auto; border: 1px solid #eee; border-radius: 8px; padding: 24px; background: #f9f9f9;'>
-                    <h2 style='color: #2c3e50;'>Password Reset Request</h2>
-                    <p>Hi <strong>{user.username}</strong>,</p>
-                    <p>We received a request to reset your password for your LearnAI account.</p>
-                    <p style='margin: 24px 0;'>
-                        <a href='{reset_link}' style='display: inline-block; padding: 12px 24px; background: #3498db; color: #fff; text-decoration: none; border-radius: 5px; font-weight: bold;'>
-                            Reset Password
-                        </a>
-                    </p>
-                    <p>If you did not request this, you can safely ignore this email.</p>
-                    <hr style='margin: 24px 0; border: none; border-top: 1px solid #eee;'>
-                    <p style='font-size: 12px; color: #888;'>If the button above does not work, copy and paste this link into your browser:<br>{reset_link}</p>
-                    <p style='font-size: 12px; color: #888;'>Thank you,<br>The LearnAI Team</p>
-                </div>
-            """,
-            subtype="html"
-        )
-        fm = FastMail(conf)
-        await fm.send_message(message)
-    # Always show the same response
-    return templates.TemplateResponse("forgot_password_submitted.html", {"request": request})
-
-@app.get("/reset-password/{token}")
-async def reset_password_page(request: Request, token: str):
-    username = reset_tokens.get(token)
-    if not username:
-        return templates.TemplateResponse("reset_password_invalid.html", {"request": request})
-    return templates.TemplateResponse("reset_password.html", {"request": request, "token": token})
-
-@app.post("/reset-password/{token}")
-async def reset_password_submit(request: Request, token: str, password: str = Form(...)):
-    username = reset_tokens.get(token)
-    if not username:
-        return templates.TemplateResponse("reset_password_invalid.html", {"request": request})
-    user = await DatabaseService.get_user_by_username(username)
-    if not user:
-        return templates.TemplateResponse("reset_password_invalid.html", {"request": request})
-    # Update password
-    user.hashed_password = User.get_password_hash(password)
-    async with async_session() as session:
-        session.add(user)
-        await session.commit()
-    del reset_tokens[token]
-    return RedirectResponse("/login", status_code=303)
-
 if __name__ == "__main__":
     import uvicorn
     uvicorn.run("main:app", host="0.0.0.0", port=8000, reload=True)
\ No newline at end of file
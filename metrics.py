@@ -0,0 +1,330 @@
+import os
+import time
+import asyncio
+import functools
+import threading
+import contextvars
+from collections import deque
+from contextlib import contextmanager
+from typing import Callable, Dict, Optional, Tuple
+
+# Default latency buckets in seconds; LLM calls routinely run for minutes
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0, 300.0)
+
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(names: Tuple[str, ...], values: Tuple[str, ...], extra: str = "") -> str:
+    parts = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+
+class _Metric:
+    type_name = "untyped"
+
+    def __init__(self, name: str, documentation: str, labels: Tuple[str, ...] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.label_names = tuple(labels)
+        # Metrics are updated from the event loop and from executor threads
+        self._lock = threading.Lock()
+
+    def _key(self, labels: Dict[str, str]) -> Tuple[str, ...]:
+        return tuple(str(labels.get(name, "")) for name in self.label_names)
+
+    def samples(self):
+        raise NotImplementedError
+
+    def render(self) -> str:
+        lines = [
+            f"# HELP {self.name} {self.documentation}",
+            f"# TYPE {self.name} {self.type_name}",
+        ]
+        lines.extend(self.samples())
+        return "\n".join(lines)
+
+
+class Counter(_Metric):
+    """Monotonically increasing counter"""
+    type_name = "counter"
+
+    def __init__(self, name: str, documentation: str, labels: Tuple[str, ...] = ()):
+        super().__init__(name, documentation, labels)
+        self._values: Dict[Tuple[str, ...], float] = {}
+
+    def inc(self, amount: float = 1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def samples(self):
+        with self._lock:
+            items = sorted(self._values.items())
+        for key, value in items:
+            yield f"{self.name}{_format_labels(self.label_names, key)} {_format_value(value)}"
+
+
+class Gauge(_Metric):
+    """Value that can go up and down, optionally computed on scrape"""
+    type_name = "gauge"
+
+    def __init__(self, name: str, documentation: str, labels: Tuple[str, ...] = ()):
+        super().__init__(name, documentation, labels)
+        self._values: Dict[Tuple[str, ...], float] = {}
+        self._function: Optional[Callable[[], float]] = None
+
+    def set(self, value: float, **labels):
+        with self._lock:
+            self._values[self._key(labels)] = value
+
+    def inc(self, amount: float = 1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def dec(self, amount: float = 1, **labels):
+        self.inc(-amount, **labels)
+
+    def get(self, **labels) -> float:
+        if self._function is not None:
+            return self._function()
+        with self._lock:
+            return self._values.get(self._key(labels), 0)
+
+    def set_function(self, function: Callable[[], float]):
+        """Compute the (unlabelled) value at scrape time"""
+        self._function = function
+
+    def samples(self):
+        if self._function is not None:
+            yield f"{self.name} {_format_value(self._function())}"
+            return
+        with self._lock:
+            items = sorted(self._values.items())
+        for key, value in items:
+            yield f"{self.name}{_format_labels(self.label_names, key)} {_format_value(value)}"
+
+
+class Histogram(_Metric):
+    """Cumulative histogram of observed values"""
+    type_name = "histogram"
+
+    def __init__(self, name: str, documentation: str, labels: Tuple[str, ...] = (), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labels)
+        self.buckets = tuple(sorted(buckets)) + (float("inf"),)
+        self._series: Dict[Tuple[str, ...], list] = {}
+
+    def observe(self, value: float, **labels):
+        key = self._key(labels)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                # Per-bucket counts followed by sum and count
+                series = self._series[key] = [0] * len(self.buckets) + [0.0, 0]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series[i] += 1
+                    break
+            series[-2] += value
+            series[-1] += 1
+
+    @contextmanager
+    def time(self, **labels):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, **labels)
+
+    def samples(self):
+        with self._lock:
+            items = sorted((key, list(series)) for key, series in self._series.items())
+        for key, series in items:
+            cumulative = 0
+            for i, bound in enumerate(self.buckets):
+                cumulative += series[i]
+                le = 'le="' + _format_value(bound) + '"'
+                yield f"{self.name}_bucket{_format_labels(self.label_names, key, le)} {cumulative}"
+            yield f"{self.name}_sum{_format_labels(self.label_names, key)} {_format_value(series[-2])}"
+            yield f"{self.name}_count{_format_labels(self.label_names, key)} {series[-1]}"
+
+
+class LatencyWindow:
+    """Sliding window of recent latencies per key, for live percentiles"""
+
+    def __init__(self, size: int = 200):
+        self.size = size
+        self._samples: Dict[str, deque] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, key: str, value: float):
+        with self._lock:
+            samples = self._samples.get(key)
+            if samples is None:
+                samples = self._samples[key] = deque(maxlen=self.size)
+            samples.append(value)
+
+    def percentile(self, q: float, key: Optional[str] = None) -> Optional[float]:
+        """q-th percentile (0-100) for one key, or across all keys; None without samples"""
+        with self._lock:
+            if key is not None:
+                values = list(self._samples.get(key, ()))
+            else:
+                values = [v for samples in self._samples.values() for v in samples]
+        if not values:
+            return None
+        values.sort()
+        index = min(len(values) - 1, int(round(q / 100 * (len(values) - 1))))
+        return values[index]
+
+    def count(self, key: Optional[str] = None) -> int:
+        with self._lock:
+            if key is not None:
+                return len(self._samples.get(key, ()))
+            return sum(len(samples) for samples in self._samples.values())
+
+
+class Registry:
+    def __init__(self):
+        self._metrics: Dict[str, _Metric] = {}
+
+    def register(self, metric: _Metric) -> _Metric:
+        if metric.name in self._metrics:
+            raise ValueError(f"Metric {metric.name} already registered")
+        self._metrics[metric.name] = metric
+        return metric
+
+    def render(self) -> str:
+        """Render every registered metric in the Prometheus text exposition format"""
+        return "\n".join(metric.render() for metric in self._metrics.values()) + "\n"
+
+
+REGISTRY = Registry()
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+# Instruments
+http_request_duration = REGISTRY.register(Histogram(
+    "learnai_http_request_duration_seconds",
+    "HTTP request latency by route",
+    labels=("method", "route", "status"),
+))
+db_call_duration = REGISTRY.register(Histogram(
+    "learnai_db_call_duration_seconds",
+    "DatabaseService method latency",
+    labels=("method",),
+))
+db_call_errors = REGISTRY.register(Counter(
+    "learnai_db_call_errors_total",
+    "DatabaseService method failures",
+    labels=("method",),
+))
+llm_call_duration = REGISTRY.register(Histogram(
+    "learnai_llm_call_duration_seconds",
+    "LLM call latency by pipeline stage",
+    labels=("stage",),
+))
+llm_call_errors = REGISTRY.register(Counter(
+    "learnai_llm_call_errors_total",
+    "LLM call failures by pipeline stage",
+    labels=("stage",),
+))
+refill_queue_depth = REGISTRY.register(Gauge(
+    "learnai_question_refill_queue_depth",
+    "Background question refills queued or running",
+))
+# Recent successful LLM latencies by stage, read by admission control
+llm_recent_latency = LatencyWindow()
+executor_inflight = REGISTRY.register(Gauge(
+    "learnai_executor_inflight",
+    "Blocking calls currently running on the default thread executor",
+))
+executor_max_workers = REGISTRY.register(Gauge(
+    "learnai_executor_max_workers",
+    "Worker threads available in the default thread executor",
+))
+# Same sizing rule as concurrent.futures.ThreadPoolExecutor's default
+executor_max_workers.set(min(32, (os.cpu_count() or 1) + 4))
+executor_saturation = REGISTRY.register(Gauge(
+    "learnai_executor_saturation_ratio",
+    "Fraction of default executor workers in use",
+))
+executor_saturation.set_function(
+    lambda: executor_inflight.get() / max(executor_max_workers.get(), 1)
+)
+
+
+def _thread_finished(future: asyncio.Future):
+    executor_inflight.dec()
+    if not future.cancelled():
+        future.exception()  # Retrieved here in case the caller stopped waiting
+
+
+async def run_in_thread(func, *args, **kwargs):
+    """
+    asyncio.to_thread that keeps the executor gauges up to date.
+
+    A thread can't be interrupted, so when the caller is cancelled (a
+    wait_for timeout, a hedge that lost) the work keeps its worker until it
+    returns. The gauge is therefore decremented when the thread's future
+    completes, not when the caller stops waiting.
+    """
+    loop = asyncio.get_running_loop()
+    call = functools.partial(contextvars.copy_context().run, func, *args, **kwargs)
+    executor_inflight.inc()
+    future = loop.run_in_executor(None, call)
+    future.add_done_callback(_thread_finished)
+    # Shielded so cancelling the caller doesn't mark the future done early
+    return await asyncio.shield(future)
+
+
+@contextmanager
+def track_llm(stage: str):
+    """Record latency and failures of one LLM call"""
+    start = time.perf_counter()
+    try:
+        yield
+    except Exception:
+        llm_call_errors.inc(stage=stage)
+        raise
+    else:
+        llm_recent_latency.observe(stage, time.perf_counter() - start)
+    finally:
+        llm_call_duration.observe(time.perf_counter() - start, stage=stage)
+
+
+def instrument_db(cls):
+    """Class decorator timing every async static/class method of a service"""
+    for attr, value in list(vars(cls).items()):
+        if not isinstance(value, (staticmethod, classmethod)):
+            continue
+        func = value.__func__
+        if not asyncio.iscoroutinefunction(func):
+            continue
+
+        def wrap(func, method=attr):
+            @functools.wraps(func)
+            async def wrapper(*args, **kwargs):
+                start = time.perf_counter()
+                try:
+                    return await func(*args, **kwargs)
+                except Exception:
+                    db_call_errors.inc(method=method)
+                    raise
+                finally:
+                    db_call_duration.observe(time.perf_counter() - start, method=method)
+            return wrapper
+
+        setattr(cls, attr, type(value)(wrap(func)))
+    return cls
@@ -1,20 +1,15 @@
+import sqlite3
 from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy import Column, Integer, String, Float, JSON, ForeignKey, DateTime, Boolean
+from sqlalchemy import Column, Integer, String, Float, JSON, ForeignKey, DateTime, Boolean, Index
 from sqlalchemy.orm import relationship
+from sqlalchemy import inspect
+from sqlalchemy.sql import table, column, text
 from datetime import datetime
-from passlib.context import CryptContext
+from passwords import pwd_context
+from compression import CompressedText, CompressedJSON
 
 Base = declarative_base()
 
-# Password hashing context
-# Use bcrypt with specific configuration to avoid version reading errors
-pwd_context = CryptContext(
-    schemes=["bcrypt"],
-    deprecated="auto",
-    bcrypt__rounds=12,  # Explicitly set rounds
-    bcrypt__ident="2b"  # Use the standard identifier
-)
-
 class User(Base):
     __tablename__ = 'users'
 
@@ -25,53 +20,96 @@ class User(Base):
     is_active = Column(Boolean, default=True)
     created_at = Column(DateTime, default=datetime.utcnow)
 
-    # Relationship to dashboards
-    dashboards = relationship("Dashboard", back_populates="user", lazy="selectin")
+    # Relationships are never loaded implicitly; opt in per query with selectinload()
+    dashboards = relationship("Dashboard", back_populates="user", lazy="raise",
+                              cascade="all, delete-orphan", passive_deletes=True)
 
     @staticmethod
     def verify_password(plain_password: str, hashed_password: str) -> bool:
-        # Use the module-level pwd_context without importing
-        # This avoids circular imports
-        return CryptContext(
-            schemes=["bcrypt"],
-            deprecated="auto",
-            bcrypt__rounds=12,
-            bcrypt__ident="2b"
-        ).verify(plain_password, hashed_password)
+        # Blocking; request handlers use passwords.verify_password instead
+        return pwd_context.verify(plain_password, hashed_password)
 
     @staticmethod
     def get_password_hash(password: str) -> str:
-        # Use the same approach as verify_password
-        return CryptContext(
-            schemes=["bcrypt"],
-            deprecated="auto",
-            bcrypt__rounds=12,
-            bcrypt__ident="2b"
-        ).hash(password)
+        # Blocking; request handlers use passwords.hash_password instead
+        return pwd_context.hash(password)
 
 class Dashboard(Base):
     __tablename__ = 'dashboards'
+    __table_args__ = (
+        # Keyset pagination of a user's dashboards, newest first
+        Index('ix_dashboards_user_created', 'user_id', 'created_at', 'id'),
+        # Dashboards the search index backfill still has to look at; empty once it has run
+        Index('ix_dashboards_search_pending', 'id', sqlite_where=text('search_indexed IS NULL')),
+        # Maps search hits back to their dashboard
+        Index('ix_dashboards_search_rowid', 'search_rowid', unique=True),
+    )
 
     id = Column(String, primary_key=True)
-    user_id = Column(Integer, ForeignKey('users.id'))
-    notes = Column(String)
-    buffered_questions = Column(JSON)  # Store questions as JSON
-    current_set = Column(Integer, default=0)
+    user_id = Column(Integer, ForeignKey('users.id', ondelete='CASCADE'))
+    notes = Column(CompressedText)  # NULL while the dashboard is archived to cold storage
+    notes_preview = Column(String)  # First 100 characters of notes, filled at creation
+    buffered_questions = Column(JSON)  # Legacy question blob, migrated into quiz_questions on startup
+    current_set = Column(Integer, default=0)  # Furthest quiz set served, drives question prefetch
+    current_set_at = Column(DateTime, default=datetime.utcnow)
+    seconds_per_set = Column(Float)  # Smoothed time the user spends per set
     total_questions = Column(Integer, default=0)
     total_correct = Column(Integer, default=0)
     best_streak = Column(Integer, default=0)
-    is_generating = Column(Integer, default=0)  # Use as boolean
+    stats_version = Column(Integer, default=0)  # Bumped whenever the totals above change; validates cached stats
+    is_generating = Column(Integer, default=0)  # Legacy flag, superseded by the generation lease
+    # Question refill lease: held by generation_owner until it expires
+    generation_owner = Column(String)
+    generation_lease_expires = Column(DateTime)
     created_at = Column(DateTime, default=datetime.utcnow)
+    last_accessed_at = Column(DateTime, default=datetime.utcnow)
+    # Location of the archived notes and questions in cold storage
+    cold_segment = Column(String)
+    cold_offset = Column(Integer)
+    cold_length = Column(Integer)
+    # Whether the notes are in notes_fts, archived or not; NULL until the backfill has seen the dashboard
+    search_indexed = Column(Boolean)
+    search_rowid = Column(Integer)  # rowid of the dashboard's notes_fts entry
     
     # Relationships
-    user = relationship("User", back_populates="dashboards", lazy="selectin")
-    attempts = relationship("QuizAttempt", back_populates="dashboard", lazy="selectin")
+    user = relationship("User", back_populates="dashboards", lazy="raise")
+    attempts = relationship("QuizAttempt", back_populates="dashboard", lazy="raise",
+                            cascade="all, delete-orphan", passive_deletes=True)
+
+class UserStats(Base):
+    """Per-user totals, maintained in the same transactions that change dashboards"""
+    __tablename__ = 'user_stats'
+
+    user_id = Column(Integer, ForeignKey('users.id', ondelete='CASCADE'), primary_key=True)
+    total_dashboards = Column(Integer, default=0, nullable=False)
+    total_quizzes = Column(Integer, default=0, nullable=False)  # Dashboards with at least one answered question
+    total_questions = Column(Integer, default=0, nullable=False)
+    total_correct = Column(Integer, default=0, nullable=False)
+    best_streak = Column(Integer, default=0, nullable=False)
+
+class QuizQuestionEntry(Base):
+    __tablename__ = 'quiz_questions'
+    __table_args__ = (
+        # Range reads per set and max(position) lookups are single index seeks
+        Index('ix_quiz_questions_dashboard_position', 'dashboard_id', 'position', unique=True),
+    )
+
+    id = Column(Integer, primary_key=True)
+    dashboard_id = Column(String, ForeignKey('dashboards.id', ondelete='CASCADE'), nullable=False)
+    position = Column(Integer, nullable=False)  # 0-based index in the dashboard's infinite quiz
+    question = Column(CompressedJSON, nullable=False)
 
 class QuizAttempt(Base):
     __tablename__ = 'quiz_attempts'
+    __table_args__ = (
+        # Analytics scan one dashboard's attempts in time order; the trailing
+        # columns make the index covering so those scans never touch the table
+        Index('ix_quiz_attempts_dashboard_created', 'dashboard_id', 'created_at',
+              'questions_answered', 'correct_answers', 'score', 'streak'),
+    )
 
     id = Column(Integer, primary_key=True)
-    dashboard_id = Column(String, ForeignKey('dashboards.id'))
+    dashboard_id = Column(String, ForeignKey('dashboards.id', ondelete='CASCADE'))
     questions_answered = Column(Integer)
     correct_answers = Column(Integer)
     score = Column(Float)
@@ -79,8 +117,116 @@ class QuizAttempt(Base):
     created_at = Column(DateTime, default=datetime.utcnow)
     
     # Relationship to dashboard
-    dashboard = relationship("Dashboard", back_populates="attempts", lazy="selectin")
+    dashboard = relationship("Dashboard", back_populates="attempts", lazy="raise")
+
+class OutboundMail(Base):
+    __tablename__ = 'outbound_mail'
+    __table_args__ = (
+        # The mail worker picks due messages in send order
+        Index('ix_outbound_mail_status_next_attempt', 'status', 'next_attempt_at'),
+    )
+
+    id = Column(Integer, primary_key=True)
+    recipient = Column(String, nullable=False)
+    subject = Column(String, nullable=False)
+    body = Column(CompressedText, nullable=False)
+    subtype = Column(String, default="html")
+    status = Column(String, default="pending", nullable=False)  # pending, sending, sent or failed
+    attempts = Column(Integer, default=0, nullable=False)
+    next_attempt_at = Column(DateTime, default=datetime.utcnow)
+    claimed_by = Column(String)  # Worker sending it; the claim lapses at claim_expires
+    claim_expires = Column(DateTime)
+    last_error = Column(String)
+    created_at = Column(DateTime, default=datetime.utcnow)
+    sent_at = Column(DateTime)
+
+class NoteJob(Base):
+    """One notes generation request, kept so a failed run can be resumed"""
+    __tablename__ = 'note_jobs'
+
+    id = Column(String, primary_key=True)
+    user_id = Column(Integer, ForeignKey('users.id', ondelete='CASCADE'), index=True)
+    status = Column(String, default="running", nullable=False)  # running, failed or completed
+    transcription = Column(CompressedText)  # Raw transcript when the input was a YouTube URL
+    cleaned_text = Column(CompressedText, nullable=False)  # Input to chunking, so a resume needs no re-transcription
+    # "tokens" or "chars", so a resume splits into the same chunks whether or not the tokenizer loads now
+    chunking = Column(String)
+    notes = Column(CompressedText)  # Final notes once completed
+    error = Column(String)
+    # Run in progress: held by owner until it expires
+    owner = Column(String)
+    lease_expires = Column(DateTime)
+    created_at = Column(DateTime, default=datetime.utcnow)
+    updated_at = Column(DateTime, default=datetime.utcnow, index=True)
+
+class NoteCheckpoint(Base):
+    """Notes of one finished chunk of a job, so a resumed job skips it"""
+    __tablename__ = 'note_checkpoints'
+
+    job_id = Column(String, ForeignKey('note_jobs.id', ondelete='CASCADE'), primary_key=True)
+    chunk_hash = Column(String, primary_key=True)  # sha256 of the chunk text
+    notes = Column(CompressedText, nullable=False)
+    created_at = Column(DateTime, default=datetime.utcnow)
+
+def upgrade_schema(bind):
+    """Add columns and indexes that were introduced after a table was first created"""
+    inspector = inspect(bind)
+    existing_tables = set(inspector.get_table_names())
+    for table in Base.metadata.sorted_tables:
+        if table.name not in existing_tables:
+            continue
+        existing_columns = {column["name"] for column in inspector.get_columns(table.name)}
+        for column in table.columns:
+            if column.name not in existing_columns:
+                column_type = column.type.compile(dialect=bind.dialect)
+                bind.exec_driver_sql(f'ALTER TABLE {table.name} ADD COLUMN "{column.name}" {column_type}')
+        for index in table.indexes:
+            index.create(bind, checkfirst=True)
+
+# FTS5 index over dashboard notes, archived ones included. It isn't part of
+# the ORM metadata since create_all can't emit virtual tables; this lightweight
+# table construct is enough to insert into it.
+#
+# The index is contentless: it keeps only the tokens, not a second, plaintext
+# copy of every note, so its columns read back as NULL and hits are mapped to
+# dashboards through Dashboard.search_rowid. owner holds a per-user token
+# (see search_owner_token), so a query filtered on it is answered from that
+# user's postings instead of checking the owner of every matching row.
+notes_fts = table(
+    "notes_fts",
+    column("rowid"),
+    column("notes"),
+    column("owner"),
+)
+
+# From SQLite 3.43 rows of a contentless index can be deleted by rowid;
+# before that, deleting takes the original text (see database._unindex_notes)
+CONTENTLESS_DELETE = sqlite3.sqlite_version_info >= (3, 43, 0)
+
+_NOTES_FTS_SQL = (
+    "CREATE VIRTUAL TABLE notes_fts USING fts5("
+    "notes, owner, content=''" + (", contentless_delete=1" if CONTENTLESS_DELETE else "")
+    + ", tokenize='porter unicode61')"
+)
+
+def search_owner_token(user_id: int) -> str:
+    return f"user{user_id}"
+
+def create_search_index(bind):
+    """Create the notes full-text index, rebuilding it if it has an older layout"""
+    existing = bind.exec_driver_sql(
+        "SELECT sql FROM sqlite_master WHERE type = 'table' AND name = 'notes_fts'"
+    ).scalar()
+    if existing == _NOTES_FTS_SQL:
+        return
+    if existing is not None:
+        bind.exec_driver_sql("DROP TABLE notes_fts")
+    bind.exec_driver_sql(_NOTES_FTS_SQL)
+    # Start over: backfill_search_index fills the new table on startup
+    bind.exec_driver_sql("UPDATE dashboards SET search_indexed = NULL, search_rowid = NULL")
 
 def init_db(bind=None):
     """Initialize database tables"""
-    Base.metadata.create_all(bind=bind) 
\ No newline at end of file
+    Base.metadata.create_all(bind=bind)
+    upgrade_schema(bind)
+    create_search_index(bind)
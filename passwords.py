@@ -0,0 +1,86 @@
+import os
+import time
+import asyncio
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from typing import Optional, Tuple
+from passlib.context import CryptContext
+import metrics
+
+# Password hashing settings
+BCRYPT_ROUNDS = int(os.getenv("BCRYPT_ROUNDS", 12))
+PASSWORD_HASH_WORKERS = int(os.getenv("PASSWORD_HASH_WORKERS", max(1, (os.cpu_count() or 2) // 2)))
+# Hashes queued or running at once; further logins wait instead of piling onto the CPU
+PASSWORD_HASH_CONCURRENCY = int(os.getenv("PASSWORD_HASH_CONCURRENCY", PASSWORD_HASH_WORKERS * 2))
+
+# One shared context. Hashes at any other cost need an update, so changing
+# BCRYPT_ROUNDS rehashes each password on its owner's next login
+pwd_context = CryptContext(
+    schemes=["bcrypt"],
+    deprecated="auto",
+    bcrypt__rounds=BCRYPT_ROUNDS,
+    bcrypt__min_rounds=BCRYPT_ROUNDS,
+    bcrypt__max_rounds=BCRYPT_ROUNDS,
+    bcrypt__ident="2b"  # Use the standard identifier
+)
+
+password_hash_duration = metrics.REGISTRY.register(metrics.Histogram(
+    "learnai_password_hash_duration_seconds",
+    "Password hash and verify latency including queueing for the process pool",
+    labels=("operation",),
+    buckets=(0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10),
+))
+
+_executor: Optional[ProcessPoolExecutor] = None
+_slots = asyncio.Semaphore(PASSWORD_HASH_CONCURRENCY)
+
+
+def _hash(password: str) -> str:
+    return pwd_context.hash(password)
+
+
+def _verify_and_update(password: str, hashed_password: str) -> Tuple[bool, Optional[str]]:
+    return pwd_context.verify_and_update(password, hashed_password)
+
+
+def _get_executor() -> ProcessPoolExecutor:
+    global _executor
+    if _executor is None:
+        # Forking a process running an event loop and threads (the default on
+        # Linux) can copy held locks into the child; start workers clean instead
+        method = "forkserver" if "forkserver" in multiprocessing.get_all_start_methods() else "spawn"
+        _executor = ProcessPoolExecutor(max_workers=PASSWORD_HASH_WORKERS,
+                                        mp_context=multiprocessing.get_context(method))
+    return _executor
+
+
+async def _run(operation: str, func, *args):
+    start = time.perf_counter()
+    try:
+        async with _slots:
+            return await asyncio.get_running_loop().run_in_executor(_get_executor(), func, *args)
+    finally:
+        password_hash_duration.observe(time.perf_counter() - start, operation=operation)
+
+
+async def hash_password(password: str) -> str:
+    """Hash a password in the process pool"""
+    return await _run("hash", _hash, password)
+
+
+async def verify_password(password: str, hashed_password: str) -> Tuple[bool, Optional[str]]:
+    """
+    Check a password in the process pool.
+
+    Returns:
+        (whether it matches, a replacement hash if the stored one was made
+        with outdated parameters, else None)
+    """
+    return await _run("verify", _verify_and_update, password, hashed_password)
+
+
+def shutdown():
+    global _executor
+    if _executor is not None:
+        _executor.shutdown(wait=False, cancel_futures=True)
+        _executor = None
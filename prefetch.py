@@ -0,0 +1,71 @@
+import os
+import math
+from datetime import datetime
+from typing import NamedTuple, Optional
+import metrics
+
+# Question prefetch settings
+PREFETCH_MIN_SETS = int(os.getenv("PREFETCH_MIN_SETS", 1))
+PREFETCH_MAX_SETS = int(os.getenv("PREFETCH_MAX_SETS", 4))  # Cap on sets buffered past the one being answered
+PREFETCH_DEFAULT_GENERATION_SECONDS = float(os.getenv("PREFETCH_DEFAULT_GENERATION_SECONDS", 20))
+PREFETCH_IDLE_SECONDS = float(os.getenv("PREFETCH_IDLE_SECONDS", 600))  # No refills for quizzes unused this long
+PREFETCH_MAX_GAP_SECONDS = float(os.getenv("PREFETCH_MAX_GAP_SECONDS", 1800))  # Longer gaps are breaks, not answering
+PREFETCH_RATE_SMOOTHING = 0.3
+
+prefetch_decisions = metrics.REGISTRY.register(metrics.Counter(
+    "learnai_prefetch_decisions_total",
+    "Question refill decisions by outcome",
+    labels=("outcome",),
+))
+
+
+class PrefetchState(NamedTuple):
+    """What the policy knows about one quiz"""
+    current_set: int  # Furthest set served to the user
+    buffered_sets: int  # Complete sets stored
+    seconds_per_set: Optional[float]  # Smoothed time the user spends on a set, None until measured
+    current_set_at: Optional[datetime]  # When current_set was first served or last revisited
+
+
+def update_rate(previous: Optional[float], advanced_sets: int, elapsed: float) -> Optional[float]:
+    """Fold the time taken to advance advanced_sets sets into the smoothed seconds per set"""
+    if advanced_sets <= 0 or elapsed > PREFETCH_MAX_GAP_SECONDS * advanced_sets:
+        return previous
+    sample = elapsed / advanced_sets
+    if previous is None:
+        return sample
+    return previous + PREFETCH_RATE_SMOOTHING * (sample - previous)
+
+
+def generation_seconds() -> float:
+    """Time one set takes to generate, from recent quiz LLM latency"""
+    recent = metrics.llm_recent_latency.percentile(90, key="quiz")
+    return recent if recent is not None else PREFETCH_DEFAULT_GENERATION_SECONDS
+
+
+def lookahead_sets(seconds_per_set: Optional[float]) -> int:
+    """Sets to keep ready past the one being answered"""
+    if seconds_per_set is None:
+        # Nothing measured yet; a quiz abandoned after its first set then
+        # wastes at most one generation
+        return PREFETCH_MIN_SETS
+    # Sets are generated one at a time, so the buffer has to last through
+    # one generation, plus one set of slack
+    needed = math.ceil(generation_seconds() / max(seconds_per_set, 1.0)) + 1
+    return max(PREFETCH_MIN_SETS, min(PREFETCH_MAX_SETS, needed))
+
+
+def sets_to_generate(state: PrefetchState, now: Optional[datetime] = None) -> int:
+    """How many sets a refill should generate now; 0 when none is needed"""
+    now = now or datetime.utcnow()
+    if state.current_set_at is not None and (now - state.current_set_at).total_seconds() > PREFETCH_IDLE_SECONDS:
+        prefetch_decisions.inc(outcome="idle")
+        return 0
+    ahead = state.buffered_sets - state.current_set - 1
+    missing = lookahead_sets(state.seconds_per_set) - ahead
+    if missing <= 0:
+        prefetch_decisions.inc(outcome="full")
+        return 0
+    prefetch_decisions.inc(outcome="refill")
+    # A user waiting on a set past the buffer still gets at most the cap
+    return min(missing, PREFETCH_MAX_SETS + 1)
@@ -0,0 +1,124 @@
+import time
+import math
+import asyncio
+from typing import Awaitable, Callable, Optional
+import metrics
+
+breaker_state = metrics.REGISTRY.register(metrics.Gauge(
+    "learnai_circuit_breaker_state",
+    "Circuit breaker state (0 closed, 1 half-open, 2 open)",
+    labels=("name",),
+))
+breaker_rejections = metrics.REGISTRY.register(metrics.Counter(
+    "learnai_circuit_breaker_rejections_total",
+    "Calls failed fast by an open circuit breaker",
+    labels=("name",),
+))
+hedged_calls = metrics.REGISTRY.register(metrics.Counter(
+    "learnai_hedged_calls_total",
+    "Duplicate calls fired after the hedge delay, by which attempt won",
+    labels=("winner",),
+))
+
+
+class CircuitOpenError(Exception):
+    """Raised when a call is rejected by an open circuit breaker"""
+
+    def __init__(self, name: str, retry_after: float):
+        super().__init__(f"Circuit '{name}' is open; retry in {retry_after:.0f}s")
+        self.retry_after = max(1, math.ceil(retry_after))
+
+
+class CircuitBreaker:
+    """Consecutive-failure circuit breaker with half-open probing"""
+    CLOSED = "closed"
+    HALF_OPEN = "half_open"
+    OPEN = "open"
+    _STATE_VALUES = {CLOSED: 0, HALF_OPEN: 1, OPEN: 2}
+
+    def __init__(self, name: str, failure_threshold: int = 5, reset_timeout: float = 30.0, half_open_max_calls: int = 1):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.half_open_max_calls = half_open_max_calls
+        self.failures = 0
+        self.opened_at = 0.0
+        self.probes = 0
+        self._set_state(self.CLOSED)
+
+    def _set_state(self, state: str):
+        self.state = state
+        breaker_state.set(self._STATE_VALUES[state], name=self.name)
+
+    def before_call(self):
+        """Raise CircuitOpenError unless a call may proceed"""
+        if self.state == self.OPEN:
+            elapsed = time.monotonic() - self.opened_at
+            if elapsed < self.reset_timeout:
+                breaker_rejections.inc(name=self.name)
+                raise CircuitOpenError(self.name, self.reset_timeout - elapsed)
+            self._set_state(self.HALF_OPEN)
+            self.probes = 0
+        if self.state == self.HALF_OPEN:
+            if self.probes >= self.half_open_max_calls:
+                breaker_rejections.inc(name=self.name)
+                raise CircuitOpenError(self.name, self.reset_timeout)
+            self.probes += 1
+
+    def record_success(self):
+        self.failures = 0
+        if self.state != self.CLOSED:
+            print(f"Circuit '{self.name}' closed")
+            self._set_state(self.CLOSED)
+
+    def record_cancelled(self):
+        """Give back a half-open probe slot when the call never completed"""
+        if self.state == self.HALF_OPEN and self.probes > 0:
+            self.probes -= 1
+
+    def record_failure(self):
+        self.failures += 1
+        if self.state == self.HALF_OPEN or self.failures >= self.failure_threshold:
+            if self.state != self.OPEN:
+                print(f"Circuit '{self.name}' opened after {self.failures} failures")
+            self.opened_at = time.monotonic()
+            self._set_state(self.OPEN)
+
+
+async def hedged(call: Callable[[], Awaitable], delay: Optional[float]):
+    """
+    Run call(); if it hasn't finished after delay seconds, start a duplicate
+    and return whichever succeeds first.
+
+    Args:
+        call: Factory returning a fresh awaitable for each attempt
+        delay: Hedge delay in seconds, or None to disable hedging
+
+    Returns:
+        The result of the first successful attempt
+    """
+    first = asyncio.ensure_future(call())
+    if delay is None:
+        return await first
+
+    pending = {first}
+    try:
+        done, _ = await asyncio.wait(pending, timeout=delay)
+        if done:
+            return first.result()
+
+        second = asyncio.ensure_future(call())
+        pending.add(second)
+        error = None
+        while pending:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                if task.exception() is None:
+                    hedged_calls.inc(winner="primary" if task is first else "hedge")
+                    return task.result()
+                error = error or task.exception()
+        hedged_calls.inc(winner="none")
+        raise error
+    finally:
+        for task in pending:
+            task.cancel()
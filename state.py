@@ -0,0 +1,385 @@
+import os
+import json
+import time
+import sqlite3
+import asyncio
+import threading
+from abc import ABC, abstractmethod
+from contextlib import contextmanager
+from typing import Any, Dict, Optional, Set
+import metrics
+
+# Shared state settings
+STATE_BACKEND = os.getenv("STATE_BACKEND", "sqlite")  # "sqlite" shares state across workers, "memory" is per process
+STATE_DB_PATH = os.getenv("STATE_DB_PATH", "state.db")
+STATE_POLL_INTERVAL = float(os.getenv("STATE_POLL_INTERVAL", 0.25))  # How often workers check for published messages
+STATE_EVENT_RETENTION = float(os.getenv("STATE_EVENT_RETENTION", 60))
+STATE_QUEUE_SIZE = int(os.getenv("STATE_QUEUE_SIZE", 32))
+
+state_subscribers = metrics.REGISTRY.register(metrics.Gauge(
+    "learnai_state_subscribers",
+    "Open pub/sub subscriptions in this process",
+))
+state_published = metrics.REGISTRY.register(metrics.Counter(
+    "learnai_state_messages_published_total",
+    "Messages published through the state store",
+))
+
+
+class StateStore(ABC):
+    """
+    Key/value state with TTL expiry, atomic operations, expiring slot sets and pub/sub.
+
+    Values are anything JSON-serializable. ttl is in seconds; None keeps a
+    key until it is deleted. Subscribers get a bounded queue of messages;
+    one too slow to keep up loses its oldest messages.
+    """
+
+    def __init__(self, queue_size: int = STATE_QUEUE_SIZE):
+        self.queue_size = queue_size
+        self._subscribers: Dict[str, Set[asyncio.Queue]] = {}
+
+    @abstractmethod
+    async def get(self, key: str) -> Any:
+        ...
+
+    @abstractmethod
+    async def set(self, key: str, value: Any, ttl: Optional[float] = None):
+        ...
+
+    @abstractmethod
+    async def add(self, key: str, value: Any, ttl: Optional[float] = None) -> bool:
+        """Set key only if it doesn't exist; True if it was set"""
+
+    @abstractmethod
+    async def pop(self, key: str) -> Any:
+        """Atomically read and delete key; None if it doesn't exist"""
+
+    @abstractmethod
+    async def delete(self, key: str):
+        ...
+
+    @abstractmethod
+    async def incr(self, key: str, amount: int = 1, ttl: Optional[float] = None) -> int:
+        """Atomically add amount to an integer key (missing counts as 0) and return the result"""
+
+    @abstractmethod
+    async def acquire_slot(self, key: str, member: str, limit: int, ttl: float) -> bool:
+        """
+        Atomically add member to the slot set at key if it has fewer than limit live members.
+
+        Each member expires on its own after ttl, so a slot left behind by a
+        process that died is freed regardless of how busy the set is.
+        """
+
+    @abstractmethod
+    async def release_slot(self, key: str, member: str):
+        ...
+
+    @abstractmethod
+    async def publish(self, channel: str, message: Any):
+        ...
+
+    def _start_listening(self):
+        """Hook for stores that have to fetch published messages"""
+
+    @contextmanager
+    def subscribe(self, channel: str):
+        self._start_listening()
+        queue = asyncio.Queue(maxsize=self.queue_size)
+        self._subscribers.setdefault(channel, set()).add(queue)
+        state_subscribers.inc()
+        try:
+            yield queue
+        finally:
+            subscribers = self._subscribers.get(channel)
+            if subscribers is not None:
+                subscribers.discard(queue)
+                if not subscribers:
+                    del self._subscribers[channel]
+            state_subscribers.dec()
+
+    def _deliver(self, channel: str, message: Any):
+        for queue in self._subscribers.get(channel, ()):
+            if queue.full():
+                queue.get_nowait()
+            queue.put_nowait(message)
+
+    async def close(self):
+        pass
+
+
+class MemoryStateStore(StateStore):
+    """Process-local store, for tests and single-worker deployments"""
+
+    def __init__(self, queue_size: int = STATE_QUEUE_SIZE):
+        super().__init__(queue_size)
+        self._data: Dict[str, tuple] = {}  # key -> (value, expires_at or None)
+        self._slots: Dict[str, Dict[str, float]] = {}  # key -> {member: expires_at}
+
+    def _live(self, key: str) -> Optional[tuple]:
+        entry = self._data.get(key)
+        if entry is not None and entry[1] is not None and entry[1] <= time.time():
+            del self._data[key]
+            return None
+        return entry
+
+    def _expiry(self, ttl: Optional[float]) -> Optional[float]:
+        return None if ttl is None else time.time() + ttl
+
+    # No awaits in between, so every operation is atomic on the event loop
+    async def get(self, key: str) -> Any:
+        entry = self._live(key)
+        return None if entry is None else entry[0]
+
+    async def set(self, key: str, value: Any, ttl: Optional[float] = None):
+        self._data[key] = (value, self._expiry(ttl))
+
+    async def add(self, key: str, value: Any, ttl: Optional[float] = None) -> bool:
+        if self._live(key) is not None:
+            return False
+        self._data[key] = (value, self._expiry(ttl))
+        return True
+
+    async def pop(self, key: str) -> Any:
+        entry = self._live(key)
+        if entry is None:
+            return None
+        del self._data[key]
+        return entry[0]
+
+    async def delete(self, key: str):
+        self._data.pop(key, None)
+
+    async def incr(self, key: str, amount: int = 1, ttl: Optional[float] = None) -> int:
+        entry = self._live(key)
+        value = (entry[0] if entry else 0) + amount
+        self._data[key] = (value, self._expiry(ttl))
+        return value
+
+    async def acquire_slot(self, key: str, member: str, limit: int, ttl: float) -> bool:
+        now = time.time()
+        members = {m: expires for m, expires in self._slots.get(key, {}).items() if expires > now}
+        if len(members) >= limit:
+            self._slots[key] = members
+            return False
+        members[member] = now + ttl
+        self._slots[key] = members
+        return True
+
+    async def release_slot(self, key: str, member: str):
+        members = self._slots.get(key)
+        if members is not None:
+            members.pop(member, None)
+            if not members:
+                del self._slots[key]
+
+    async def publish(self, channel: str, message: Any):
+        state_published.inc()
+        self._deliver(channel, message)
+
+
+class SQLiteStateStore(StateStore):
+    """
+    Store shared by all worker processes through a WAL-mode SQLite file.
+
+    Operations run on a worker thread, each in its own transaction.
+    Published messages go into an append-only table that every process
+    polls, so subscribers in any worker receive them within
+    STATE_POLL_INTERVAL.
+    """
+
+    _SCHEMA = """
+        CREATE TABLE IF NOT EXISTS state_kv (
+            key TEXT PRIMARY KEY,
+            value TEXT NOT NULL,
+            expires_at REAL
+        );
+        CREATE TABLE IF NOT EXISTS state_slots (
+            key TEXT NOT NULL,
+            member TEXT NOT NULL,
+            expires_at REAL NOT NULL,
+            PRIMARY KEY (key, member)
+        );
+        CREATE TABLE IF NOT EXISTS state_events (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            channel TEXT NOT NULL,
+            payload TEXT NOT NULL,
+            created_at REAL NOT NULL
+        );
+    """
+
+    def __init__(self, path: str = STATE_DB_PATH, poll_interval: float = STATE_POLL_INTERVAL,
+                 queue_size: int = STATE_QUEUE_SIZE):
+        super().__init__(queue_size)
+        self.path = path
+        self.poll_interval = poll_interval
+        self._conn: Optional[sqlite3.Connection] = None
+        self._lock = threading.Lock()
+        self._poller: Optional[asyncio.Task] = None
+        self._last_event_id: Optional[int] = None
+
+    def _connect(self) -> sqlite3.Connection:
+        if self._conn is None:
+            conn = sqlite3.connect(self.path, isolation_level=None, check_same_thread=False, timeout=5)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.executescript(self._SCHEMA)
+            self._conn = conn
+        return self._conn
+
+    def _transaction(self, func, write: bool = True):
+        with self._lock:
+            conn = self._connect()
+            # IMMEDIATE takes the write lock up front, so read-modify-write
+            # operations are atomic across processes
+            conn.execute("BEGIN IMMEDIATE" if write else "BEGIN")
+            try:
+                result = func(conn)
+            except BaseException:
+                conn.execute("ROLLBACK")
+                raise
+            conn.execute("COMMIT")
+            return result
+
+    async def _run(self, func, write: bool = True):
+        return await asyncio.to_thread(self._transaction, func, write)
+
+    @staticmethod
+    def _read(conn: sqlite3.Connection, key: str, now: float) -> Optional[str]:
+        row = conn.execute(
+            "SELECT value FROM state_kv WHERE key = ? AND (expires_at IS NULL OR expires_at > ?)",
+            (key, now)
+        ).fetchone()
+        return None if row is None else row[0]
+
+    @staticmethod
+    def _write(conn: sqlite3.Connection, key: str, value: Any, ttl: Optional[float], now: float):
+        conn.execute(
+            "INSERT OR REPLACE INTO state_kv (key, value, expires_at) VALUES (?, ?, ?)",
+            (key, json.dumps(value), None if ttl is None else now + ttl)
+        )
+
+    async def get(self, key: str) -> Any:
+        value = await self._run(lambda conn: self._read(conn, key, time.time()), write=False)
+        return None if value is None else json.loads(value)
+
+    async def set(self, key: str, value: Any, ttl: Optional[float] = None):
+        await self._run(lambda conn: self._write(conn, key, value, ttl, time.time()))
+
+    async def add(self, key: str, value: Any, ttl: Optional[float] = None) -> bool:
+        def _add(conn):
+            now = time.time()
+            if self._read(conn, key, now) is not None:
+                return False
+            self._write(conn, key, value, ttl, now)
+            return True
+        return await self._run(_add)
+
+    async def pop(self, key: str) -> Any:
+        def _pop(conn):
+            value = self._read(conn, key, time.time())
+            conn.execute("DELETE FROM state_kv WHERE key = ?", (key,))
+            return value
+        value = await self._run(_pop)
+        return None if value is None else json.loads(value)
+
+    async def delete(self, key: str):
+        await self._run(lambda conn: conn.execute("DELETE FROM state_kv WHERE key = ?", (key,)))
+
+    async def incr(self, key: str, amount: int = 1, ttl: Optional[float] = None) -> int:
+        def _incr(conn):
+            now = time.time()
+            current = self._read(conn, key, now)
+            value = (json.loads(current) if current is not None else 0) + amount
+            self._write(conn, key, value, ttl, now)
+            return value
+        return await self._run(_incr)
+
+    async def acquire_slot(self, key: str, member: str, limit: int, ttl: float) -> bool:
+        def _acquire(conn):
+            now = time.time()
+            conn.execute("DELETE FROM state_slots WHERE key = ? AND expires_at <= ?", (key, now))
+            count = conn.execute("SELECT COUNT(*) FROM state_slots WHERE key = ?", (key,)).fetchone()[0]
+            if count >= limit:
+                return False
+            conn.execute(
+                "INSERT OR REPLACE INTO state_slots (key, member, expires_at) VALUES (?, ?, ?)",
+                (key, member, now + ttl)
+            )
+            return True
+        return await self._run(_acquire)
+
+    async def release_slot(self, key: str, member: str):
+        await self._run(lambda conn: conn.execute(
+            "DELETE FROM state_slots WHERE key = ? AND member = ?", (key, member)
+        ))
+
+    async def publish(self, channel: str, message: Any):
+        state_published.inc()
+        await self._run(lambda conn: conn.execute(
+            "INSERT INTO state_events (channel, payload, created_at) VALUES (?, ?, ?)",
+            (channel, json.dumps(message), time.time())
+        ))
+
+    def _start_listening(self):
+        if self._poller is not None and not self._poller.done():
+            return
+        self._poller = asyncio.create_task(self._poll())
+
+    def _fetch_events(self, conn: sqlite3.Connection) -> list:
+        return conn.execute(
+            "SELECT id, channel, payload FROM state_events WHERE id > ? ORDER BY id",
+            (self._last_event_id,)
+        ).fetchall()
+
+    def _prune(self, conn: sqlite3.Connection):
+        now = time.time()
+        conn.execute("DELETE FROM state_events WHERE created_at < ?", (now - STATE_EVENT_RETENTION,))
+        conn.execute("DELETE FROM state_kv WHERE expires_at IS NOT NULL AND expires_at <= ?", (now,))
+        conn.execute("DELETE FROM state_slots WHERE expires_at <= ?", (now,))
+
+    async def _poll(self):
+        last_prune = time.monotonic()
+        while True:
+            try:
+                if self._last_event_id is None:
+                    # Only messages published from now on are delivered
+                    self._last_event_id = await self._run(
+                        lambda conn: conn.execute("SELECT COALESCE(MAX(id), 0) FROM state_events").fetchone()[0],
+                        write=False
+                    )
+                for event_id, channel, payload in await self._run(self._fetch_events, write=False):
+                    self._last_event_id = event_id
+                    self._deliver(channel, json.loads(payload))
+                if time.monotonic() - last_prune > STATE_EVENT_RETENTION:
+                    await self._run(self._prune)
+                    last_prune = time.monotonic()
+            except Exception as e:
+                print(f"Error polling state events: {e}")
+            await asyncio.sleep(self.poll_interval)
+
+    async def close(self):
+        if self._poller is not None:
+            self._poller.cancel()
+            try:
+                await self._poller
+            except asyncio.CancelledError:
+                pass
+            self._poller = None
+            self._last_event_id = None
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+
+
+def create_store(backend: str = STATE_BACKEND) -> StateStore:
+    if backend == "memory":
+        return MemoryStateStore()
+    if backend == "sqlite":
+        return SQLiteStateStore()
+    raise ValueError(f"Unknown STATE_BACKEND {backend!r}")
+
+
+store = create_store()
@@ -0,0 +1,94 @@
+const quizId = window.location.pathname.split('/').pop();
+// Load chat history from localStorage if available
+let chatHistory = [];
+const chatKey = `chat_history_${quizId}`;
+if (localStorage.getItem(chatKey)) {
+  try {
+    chatHistory = JSON.parse(localStorage.getItem(chatKey));
+  } catch (e) {
+    chatHistory = [];
+  }
+}
+function saveChatHistory() {
+  localStorage.setItem(chatKey, JSON.stringify(chatHistory));
+}
+function renderChat() {
+  const container = document.getElementById('chatContainer');
+  container.innerHTML = '';
+  chatHistory.forEach(msg => {
+    const div = document.createElement('div');
+    div.className = 'message ' + msg.role;
+    const bubble = document.createElement('div');
+    bubble.className = 'bubble';
+    bubble.innerHTML = marked.parse(msg.content);
+    // Render LaTeX using MathJax after inserting the message
+    if (typeof MathJax !== 'undefined' && MathJax.typesetPromise) {
+      MathJax.typesetPromise([bubble]);
+    }
+    div.appendChild(bubble);
+    container.appendChild(div);
+  });
+  // Highlight code blocks
+  if (typeof hljs !== 'undefined') {
+    container.querySelectorAll('pre code').forEach((block) => {
+      hljs.highlightElement(block);
+    });
+  }
+  // MathJax typeset for the whole container (fallback)
+  if (typeof MathJax !== 'undefined' && MathJax.typesetPromise) {
+    MathJax.typesetPromise([container]);
+  }
+  container.scrollTop = container.scrollHeight;
+}
+// Remove and re-add event listeners to prevent duplicate bindings
+function setupChatEventListeners() {
+  const sendBtn = document.getElementById('sendBtn');
+  const chatInput = document.getElementById('chatInput');
+  const deleteBtn = document.getElementById('deleteChatBtn');
+  sendBtn.onclick = sendMessage;
+  chatInput.onkeydown = function(e) {
+    if (e.key === 'Enter') sendMessage();
+  };
+  deleteBtn.onclick = function() {
+    if (confirm('Are you sure you want to delete this chat history? This cannot be undone.')) {
+      chatHistory = [];
+      saveChatHistory();
+      renderChat();
+    }
+  };
+}
+async function sendMessage() {
+  const input = document.getElementById('chatInput');
+  const text = input.value.trim();
+  if (!text) return;
+  chatHistory.push({ role: 'user', content: text });
+  saveChatHistory();
+  renderChat();
+  input.value = '';
+  document.getElementById('chatLoading').style.display = 'block';
+  try {
+    const response = await fetch(`/api/chat/${quizId}` , {
+      method: 'POST',
+      headers: { 'Content-Type': 'application/json' },
+      body: JSON.stringify({ question: text, history: chatHistory })
+    });
+    if (!response.ok) throw new Error('Failed to get response');
+    const data = await response.json();
+    chatHistory.push({ role: 'assistant', content: data.answer });
+    saveChatHistory();
+    renderChat();
+  } catch (e) {
+    chatHistory.push({ role: 'assistant', content: '<span style="color:red">Error: Could not get a response.</span>' });
+    saveChatHistory();
+    renderChat();
+  } finally {
+    document.getElementById('chatLoading').style.display = 'none';
+  }
+}
+function navigateToDashboard(event) {
+    event.preventDefault();
+    postWithToken(`/dashboard/${quizId}`);
+}
+// On page load, render chat and set up listeners
+renderChat();
+setupChatEventListeners();
@@ -0,0 +1,43 @@
+// Shared by the signed-in pages. Page navigation is a form POST carrying
+// the token, since the pages themselves are rendered server-side.
+
+function getStoredToken() {
+    return localStorage.getItem('access_token') || sessionStorage.getItem('dashboard_token');
+}
+
+function postWithToken(action) {
+    const token = getStoredToken();
+
+    // If no token, redirect to login
+    if (!token) {
+        window.location.href = '/login';
+        return;
+    }
+
+    // Create a form to submit the token with the request
+    const form = document.createElement('form');
+    form.method = 'POST';
+    form.action = action;
+    form.style.display = 'none';
+
+    // Add token as a hidden field
+    const tokenField = document.createElement('input');
+    tokenField.type = 'hidden';
+    tokenField.name = 'token';
+    tokenField.value = token;
+    form.appendChild(tokenField);
+
+    // Submit the form
+    document.body.appendChild(form);
+    form.submit();
+}
+
+function navigateToDashboards(event) {
+    if (event) event.preventDefault();
+    postWithToken('/dashboards');
+}
+
+function navigateToProfile(event) {
+    if (event) event.preventDefault();
+    postWithToken('/profile');
+}
@@ -0,0 +1,165 @@
+function navigateToDashboard(event) {
+    event.preventDefault();
+    postWithToken(`/dashboard/${sessionId}`);
+}
+
+// Initialize marked with options
+marked.setOptions({
+    breaks: true,
+    gfm: true,
+    headerIds: true,
+    highlight: function(code, lang) {
+        if (lang && hljs.getLanguage(lang)) {
+            try {
+                return hljs.highlight(code, { language: lang }).value;
+            } catch (err) {}
+        }
+        try {
+            return hljs.highlightAuto(code).value;
+        } catch (err) {}
+        return code;
+    }
+});
+
+// Store the notes content
+const rawNotes = document.getElementById('rawNotes').textContent;
+
+// Render markdown on load
+document.getElementById('renderedNotes').innerHTML = marked.parse(rawNotes);
+
+// Initialize code highlighting
+document.querySelectorAll('pre code').forEach((block) => {
+    hljs.highlightBlock(block);
+});
+
+// Toggle between raw and rendered markdown
+let showingRaw = false;
+function toggleView() {
+    const rendered = document.getElementById('renderedNotes');
+    const raw = document.getElementById('rawNotes');
+    const button = document.getElementById('viewToggle');
+
+    if (showingRaw) {
+        rendered.style.display = 'block';
+        raw.style.display = 'none';
+        button.textContent = 'Show Raw Markdown';
+    } else {
+        rendered.style.display = 'none';
+        raw.style.display = 'block';
+        button.textContent = 'Show Rendered Notes';
+    }
+    showingRaw = !showingRaw;
+}
+
+// Copy notes function (updated to handle both raw and rendered)
+function copyNotes() {
+    const notes = showingRaw ? 
+        document.getElementById('rawNotes').textContent :
+        document.getElementById('rawNotes').textContent; // Always copy raw markdown
+
+    navigator.clipboard.writeText(notes).then(() => {
+        const button = document.querySelector('.copy-button');
+        button.textContent = 'Copied!';
+        setTimeout(() => {
+            button.textContent = 'Copy Notes';
+        }, 2000);
+    });
+}
+
+// Initialize dashboard URL
+const dashboardUrl = window.location.href;
+document.getElementById('dashboardUrl').textContent = dashboardUrl;
+
+// Fetch quiz stats
+function showQuizStats(stats) {
+    document.getElementById('totalQuestions').textContent = stats.total_questions;
+    document.getElementById('averageScore').textContent = `${stats.average_score}%`;
+    document.getElementById('bestStreak').textContent = stats.best_streak;
+}
+
+async function fetchQuizStats() {
+    try {
+        const response = await fetch(`/api/quiz-stats/${sessionId}`);
+        if (response.ok) {
+            showQuizStats(await response.json());
+        }
+    } catch (error) {
+        console.error('Failed to fetch quiz stats:', error);
+    }
+}
+
+// Initial stats fetch
+fetchQuizStats();
+
+// Stats are pushed whenever quiz results are recorded
+const quizEvents = new EventSource(`/api/quiz/${sessionId}/events`);
+quizEvents.addEventListener('stats', (event) => showQuizStats(JSON.parse(event.data)));
+
+// Delete dashboard functionality
+function deleteDashboard() {
+    document.getElementById('deleteConfirmModal').style.display = 'block';
+}
+
+function closeDeleteModal() {
+    document.getElementById('deleteConfirmModal').style.display = 'none';
+}
+
+async function confirmDelete() {
+    try {
+        const response = await fetch(`/api/dashboard/${sessionId}`, {
+            method: 'DELETE'
+        });
+
+        if (response.ok) {
+            // Get token for authentication
+            let token = localStorage.getItem('access_token');
+            if (!token) {
+                token = sessionStorage.getItem('dashboard_token');
+            }
+
+            if (!token) {
+                window.location.href = '/login';
+                return;
+            }
+
+            // Create a form to submit the token with the request
+            const form = document.createElement('form');
+            form.method = 'POST';
+            form.action = '/dashboards';
+            form.style.display = 'none';
+
+            // Add token as a hidden field
+            const tokenField = document.createElement('input');
+            tokenField.type = 'hidden';
+            tokenField.name = 'token';
+            tokenField.value = token;
+            form.appendChild(tokenField);
+
+            // Submit the form
+            document.body.appendChild(form);
+            form.submit();
+        } else {
+            const error = await response.json();
+            alert(error.detail || 'Failed to delete dashboard');
+        }
+    } catch (error) {
+        console.error('Error deleting dashboard:', error);
+        alert('Failed to delete dashboard');
+    }
+}
+
+// Close modal if clicking outside
+window.onclick = function(event) {
+    const modal = document.getElementById('deleteConfirmModal');
+    if (event.target === modal) {
+        closeDeleteModal();
+    }
+}
+
+// Update the renderNotes function to handle LaTeX
+function renderNotes(notes) {
+    const notesContainer = document.getElementById('notesContainer');
+    notesContainer.innerHTML = marked.parse(notes);
+    // After rendering markdown, typeset any LaTeX
+    MathJax.typesetPromise();
+}
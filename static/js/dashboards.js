@@ -0,0 +1,107 @@
+// Configure marked.js options
+marked.setOptions({
+    breaks: true,  // Add line breaks on single line breaks
+    gfm: true,     // Enable GitHub Flavored Markdown
+    headerIds: false // Don't add IDs to headers (for security)
+});
+
+// Token management
+const TokenManager = {
+    getToken() {
+        return localStorage.getItem('access_token');
+    },
+
+    isAuthenticated() {
+        return !!this.getToken();
+    },
+
+    redirectToLogin() {
+        window.location.href = '/login';
+    }
+};
+
+// Check authentication on page load and fetch dashboards with token
+document.addEventListener('DOMContentLoaded', async function() {
+    if (!TokenManager.isAuthenticated()) {
+        // No token found, redirect to login
+        TokenManager.redirectToLogin();
+        return;
+    }
+
+    // Send token in Authorization header for the current page
+    const token = TokenManager.getToken();
+
+    // Make authenticated request to get dashboards
+    try {
+        const response = await fetch('/dashboards', {
+            method: 'GET',
+            headers: {
+                'Authorization': `Bearer ${token}`
+            }
+        });
+
+        if (response.status === 401) {
+            // Token invalid or expired, redirect to login
+            TokenManager.redirectToLogin();
+            return;
+        }
+    } catch (error) {
+        console.error('Error fetching dashboards:', error);
+    }
+
+    // Render Markdown content
+    renderMarkdownContent();
+
+    // Add token to all links that require authentication
+    const protectedLinks = document.querySelectorAll('a[href^="/dashboard/"], a[href^="/quiz/"]');
+    protectedLinks.forEach(link => {
+        link.addEventListener('click', function(e) {
+            e.preventDefault();
+            const token = TokenManager.getToken();
+            const url = this.getAttribute('href');
+
+            // Create a form to submit the token with the request
+            const form = document.createElement('form');
+            form.method = 'POST';
+            form.action = url;
+            form.style.display = 'none';
+
+            const tokenInput = document.createElement('input');
+            tokenInput.type = 'hidden';
+            tokenInput.name = 'token';
+            tokenInput.value = token;
+
+            form.appendChild(tokenInput);
+            document.body.appendChild(form);
+            form.submit();
+        });
+    });
+});
+
+// Function to render all Markdown content on the page
+function renderMarkdownContent() {
+    // Get all elements with markdown content
+    const markdownElements = document.querySelectorAll('.markdown-content');
+
+    // Process each element
+    markdownElements.forEach(element => {
+        const rawContent = element.getAttribute('data-content');
+        if (rawContent) {
+            // Render the markdown content
+            const htmlContent = marked.parse(rawContent);
+            element.innerHTML = htmlContent;
+        }
+    });
+}
+
+function loadOlderDashboards(cursor) {
+    postWithToken(`/dashboards?cursor=${encodeURIComponent(cursor)}`);
+}
+
+function navigateToQuiz(quizId) {
+    postWithToken(`/quiz/${quizId}`);
+}
+
+function navigateToDashboard(dashboardId) {
+    postWithToken(`/dashboard/${dashboardId}`);
+}
@@ -0,0 +1,237 @@
+// Token management
+const TokenManager = {
+    setTokens(tokens) {
+        console.log('Storing tokens:', tokens);
+        localStorage.setItem('access_token', tokens.access_token);
+        localStorage.setItem('refresh_token', tokens.refresh_token);
+        localStorage.setItem('token_expiry', Date.now() + (tokens.expires_in * 1000));
+        console.log('Token expiry set to:', new Date(Date.now() + (tokens.expires_in * 1000)));
+    },
+
+    clearTokens() {
+        localStorage.removeItem('access_token');
+        localStorage.removeItem('refresh_token');
+        localStorage.removeItem('token_expiry');
+    },
+
+    async refreshTokens() {
+        const refreshToken = localStorage.getItem('refresh_token');
+        if (!refreshToken) {
+            this.clearTokens();
+            window.location.href = '/login';
+            throw new Error('No refresh token available');
+        }
+
+        const response = await fetch('/refresh', {
+            method: 'POST',
+            headers: {
+                'Authorization': `Bearer ${refreshToken}`
+            }
+        });
+
+        if (!response.ok) {
+            this.clearTokens();
+            window.location.href = '/login';
+            throw new Error('Failed to refresh token');
+        }
+
+        const tokens = await response.json();
+        this.setTokens(tokens);
+        return tokens.access_token;
+    },
+
+    async getValidToken() {
+        const expiry = localStorage.getItem('token_expiry');
+        const accessToken = localStorage.getItem('access_token');
+
+        if (!expiry || !accessToken) {
+            this.clearTokens();
+            window.location.href = '/login';
+            throw new Error('No token available');
+        }
+
+        const now = Date.now();
+        const expiryInt = parseInt(expiry);
+        console.log('[TokenManager] Now:', now, 'Expiry:', expiryInt, 'Delta (ms):', expiryInt - now);
+
+        // If token is expired or will expire in < 1 minute, refresh
+        if (now > expiryInt - 60000) {
+            return await this.refreshTokens();
+        }
+        if (now > expiryInt) {
+            // Already expired, force refresh
+            return await this.refreshTokens();
+        }
+
+        return accessToken;
+    }
+};
+
+function showTab(tabName) {
+    const tabs = document.querySelectorAll('.tab');
+    const contents = document.querySelectorAll('.tab-content');
+
+    tabs.forEach(tab => {
+        if (tab.textContent.toLowerCase().includes(tabName)) {
+            tab.classList.add('active');
+        } else {
+            tab.classList.remove('active');
+        }
+    });
+
+    contents.forEach(content => {
+        if (content.id === tabName + 'Tab') {
+            content.classList.add('active');
+        } else {
+            content.classList.remove('active');
+        }
+    });
+}
+
+async function generateQuiz() {
+    const loading = document.getElementById('loading');
+    const error = document.getElementById('error');
+    const success = document.getElementById('success');
+
+    loading.style.display = 'block';
+    error.style.display = 'none';
+    success.style.display = 'none';
+
+    try {
+        // Check if user is authenticated
+        try {
+            await TokenManager.getValidToken();
+        } catch (e) {
+            // Not authenticated, redirect to login
+            window.location.href = '/login';
+            return;
+        }
+
+        const activeTab = document.querySelector('.tab-content.active').id;
+        const requestBody = {};
+
+        if (activeTab === 'textTab') {
+            const notes = document.getElementById('notesInput').value.trim();
+            if (!notes) {
+                throw new Error('Please enter some text to generate a quiz.');
+            }
+            requestBody.text = notes;
+        } else {
+            const youtubeUrl = document.getElementById('youtubeInput').value.trim();
+            if (!youtubeUrl) {
+                throw new Error('Please enter a YouTube URL.');
+            }
+            requestBody.youtube_url = youtubeUrl;
+        }
+
+        // First generate notes if needed
+        let notes;
+        let notesData;
+        const token = await TokenManager.getValidToken();
+        console.log('Token used for /generate-notes:', token);
+        const notesResponse = await fetch('/generate-notes', {
+            method: 'POST',
+            headers: {
+                'Content-Type': 'application/json',
+                'Authorization': `Bearer ${token}`
+            },
+            body: JSON.stringify(requestBody)
+        });
+
+        if (!notesResponse.ok) {
+            throw new Error('Failed to process input. Please try again.');
+        }
+
+        notesData = await notesResponse.json();
+        notes = notesData.notes;
+
+        // Generate quiz from notes
+        const quizToken = await TokenManager.getValidToken();
+        console.log('Token used for /generate-quiz:', quizToken);
+        const quizResponse = await fetch('/generate-quiz', {
+            method: 'POST',
+            headers: {
+                'Content-Type': 'application/json',
+                'Authorization': `Bearer ${quizToken}`
+            },
+            body: JSON.stringify({ notes: notes })
+        });
+
+        if (!quizResponse.ok) {
+            throw new Error('Failed to generate quiz. Please try again.');
+        }
+
+        const quizData = await quizResponse.json();
+        console.log('Quiz data received:', quizData);
+
+        // Get the current access token for dashboard
+        const dashboardToken = await TokenManager.getValidToken();
+
+        // Make sure we have a valid quiz_id
+        if (!quizData.quiz_id) {
+            console.error('Error: quiz_id is undefined in the response');
+            throw new Error('Failed to get quiz ID from server response');
+        }
+
+        // Create dashboard URL with the quiz_id
+        const dashboardUrl = `${window.location.origin}/dashboard/${quizData.quiz_id}`;
+        console.log('Dashboard URL:', dashboardUrl);
+
+        // Store the token in sessionStorage for the dashboard page
+        sessionStorage.setItem('dashboard_token', dashboardToken);
+
+        success.innerHTML = `
+            <div style="text-align: center; padding: 20px;">
+                <h3 style="color: #27ae60; margin-bottom: 15px;">Your LearnAI Dashboard is Ready!</h3>
+                <p style="color: #666; margin-bottom: 20px;">
+                    We've generated personalized quiz questions and detailed notes based on your content.
+                    Access your interactive learning dashboard to:
+                </p>
+                <ul style="list-style: none; padding: 0; margin-bottom: 20px; color: #666;">
+                    <li>📝 Review your generated notes</li>
+                    <li>✍️ Take personalized quizzes</li>
+                    <li>📊 Track your learning progress</li>
+                </ul>
+                <button onclick="goToDashboard('${dashboardUrl}')" 
+                        style="background-color: #3498db; 
+                               color: white; 
+                               padding: 12px 24px; 
+                               border: none; 
+                               border-radius: 5px; 
+                               font-size: 16px; 
+                               cursor: pointer;
+                               transition: background-color 0.2s;">
+                    Go to Dashboard
+                </button>
+            </div>
+        `;
+        success.style.display = 'block';
+    } catch (err) {
+        error.textContent = err.message || 'An error occurred. Please try again.';
+        error.style.display = 'block';
+    } finally {
+        loading.style.display = 'none';
+    }
+}
+// Function to navigate to dashboard with token
+function goToDashboard(url) {
+    // Get the token from sessionStorage
+    const token = sessionStorage.getItem('dashboard_token');
+
+    // Create a form to submit the token with the request
+    const form = document.createElement('form');
+    form.method = 'POST';
+    form.action = url;
+    form.style.display = 'none';
+
+    // Add token as a hidden field
+    const tokenField = document.createElement('input');
+    tokenField.type = 'hidden';
+    tokenField.name = 'token';
+    tokenField.value = token;
+    form.appendChild(tokenField);
+
+    // Submit the form
+    document.body.appendChild(form);
+    form.submit();
+}
@@ -0,0 +1,58 @@
+function logout() {
+    localStorage.removeItem('access_token');
+    localStorage.removeItem('refresh_token');
+    localStorage.removeItem('token_expiry');
+    sessionStorage.removeItem('dashboard_token');
+
+    window.location.href = '/login';
+}
+
+function showDeleteAccountModal() {
+    document.getElementById('deleteAccountModal').style.display = 'block';
+}
+
+function closeDeleteAccountModal() {
+    document.getElementById('deleteAccountModal').style.display = 'none';
+}
+
+async function deleteAccount() {
+    try {
+        let token = localStorage.getItem('access_token');
+        if (!token) {
+            token = sessionStorage.getItem('dashboard_token');
+        }
+
+        if (!token) {
+            window.location.href = '/login';
+            return;
+        }
+
+        const response = await fetch('/api/user/delete', {
+            method: 'DELETE',
+            headers: {
+                'Authorization': `Bearer ${token}`
+            }
+        });
+
+        if (response.ok) {
+            localStorage.clear();
+            sessionStorage.clear();
+
+            alert('Your account has been successfully deleted.');
+            window.location.href = '/';
+        } else {
+            const error = await response.json();
+            alert(error.detail || 'Failed to delete account. Please try again.');
+        }
+    } catch (error) {
+        console.error('Error deleting account:', error);
+        alert('An error occurred while deleting your account. Please try again.');
+    }
+}
+
+window.onclick = function(event) {
+    const modal = document.getElementById('deleteAccountModal');
+    if (event.target === modal) {
+        closeDeleteAccountModal();
+    }
+}
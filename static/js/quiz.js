@@ -0,0 +1,259 @@
+const quizId = window.location.pathname.split('/').pop();
+let quizData = null;
+let currentSet = 0;
+let totalScore = 0;
+let totalQuestions = 0;
+let currentStreak = 0;
+let isSubmitted = false;
+let questionOrder = [];  // Track shuffled question order
+let bufferedSets = 0;  // Complete sets the server has ready, pushed over the event stream
+let setReadyWaiters = [];
+
+// Server-sent events tell us when new question sets are ready, so a
+// 202 can wait for the push instead of polling
+const quizEvents = new EventSource(`/api/quiz/${quizId}/events`);
+quizEvents.addEventListener('set_ready', (event) => {
+  bufferedSets = Math.max(bufferedSets, JSON.parse(event.data).buffered_sets);
+  setReadyWaiters = setReadyWaiters.filter(waiter => !waiter());
+});
+
+function waitForSet(setNumber, fallbackMs = 15000) {
+  // Resolves when the set is pushed as ready, or after fallbackMs in case
+  // the push was missed: sent while the event stream was reconnecting, or
+  // dropped because this client's event queue was full
+  return new Promise(resolve => {
+    const timer = setTimeout(resolve, fallbackMs);
+    const waiter = () => {
+      if (bufferedSets <= setNumber) return false;
+      clearTimeout(timer);
+      resolve();
+      return true;
+    };
+    if (!waiter()) setReadyWaiters.push(waiter);
+  });
+}
+
+function navigateToDashboard(event) {
+    event.preventDefault();
+    postWithToken(`/dashboard/${quizId}`);
+}
+
+function shuffleArray(array) {
+  for (let i = array.length - 1; i > 0; i--) {
+    const j = Math.floor(Math.random() * (i + 1));
+    [array[i], array[j]] = [array[j], array[i]];
+  }
+  return array;
+}
+
+async function fetchQuizData(setNumber = 0) {
+  try {
+    document.getElementById('loadingNext').classList.add('visible');
+    document.getElementById('quizContainer').className = 'loading';
+    document.getElementById('quizContainer').innerHTML = 'Loading quiz...';
+
+    // Always revalidate: a cached set comes back as a bodiless 304, but the
+    // request still tells the server which set we're on for prefetching
+    const response = await fetch(`/api/quiz/${quizId}?set_number=${setNumber}`, { cache: 'no-cache' });
+
+    if (response.status === 202) {
+      // Questions are still being generated, retry once they are pushed as ready
+      document.getElementById('quizContainer').innerHTML = 'Generating new questions...';
+      waitForSet(setNumber).then(() => fetchQuizData(setNumber));
+      return;
+    }
+
+    if (!response.ok) throw new Error('Failed to load quiz');
+
+    quizData = await response.json();
+
+    // Keep questions in original order
+    questionOrder = Array.from({length: quizData.questions.length}, (_, i) => i);
+
+    displayQuiz(quizData);
+    updateStats();
+    document.getElementById('loadingNext').classList.remove('visible');
+  } catch (error) {
+    document.getElementById('quizContainer').innerHTML = 
+      '<div class="error">Failed to load quiz. Please try again later.</div>';
+    console.error('Fetch error:', error);
+    document.getElementById('loadingNext').classList.remove('visible');
+  }
+}
+
+function updateStats() {
+  document.getElementById('currentSet').textContent = currentSet + 1;
+  document.getElementById('totalScore').textContent = totalScore;
+  document.getElementById('totalQuestions').textContent = totalQuestions;
+  document.getElementById('streakCount').textContent = currentStreak;
+}
+
+function displayQuiz(data) {
+  const container = document.getElementById('quizContainer');
+  container.className = 'questions-container';
+  container.innerHTML = '';
+
+  // Display questions in original order
+  data.questions.forEach((q, index) => {
+    const div = document.createElement('div');
+    div.className = 'question';
+    div.dataset.originalIndex = index;
+
+    // Create the question HTML
+    const questionHtml = document.createElement('div');
+    questionHtml.innerHTML = `<h3>Question ${index + 1}:</h3><p class="question-text">${q.question_text}</p>`;
+    div.appendChild(questionHtml);
+
+    // Create options container
+    const optionsDiv = document.createElement('div');
+    optionsDiv.className = 'options';
+
+    // Add options in original order (A, B, C, D)
+    Object.entries(q.options).forEach(([key, value]) => {
+      const label = document.createElement('label');
+      label.innerHTML = `
+        <input type="radio" name="q${index}" value="${key}">
+        ${value}
+      `;
+      optionsDiv.appendChild(label);
+    });
+
+    div.appendChild(optionsDiv);
+    container.appendChild(div);
+  });
+
+  // After adding all questions, typeset the math
+  MathJax.typesetPromise().catch((err) => console.log('MathJax error:', err));
+
+  document.getElementById('submitBtn').style.display = 'block';
+  document.getElementById('submitBtn').disabled = false;
+  document.getElementById('nextSetBtn').style.display = 'none';
+  isSubmitted = false;
+  updateProgressBar(0);
+}
+
+function updateProgressBar(answered) {
+  const total = quizData.questions.length;
+  const percentage = (answered / total) * 100;
+  document.getElementById('progressBar').style.width = `${percentage}%`;
+}
+
+async function submitQuizResults(score, total) {
+  try {
+    await fetch(`/submit-quiz-results/${quizId}`, {
+      method: 'POST',
+      headers: {
+        'Content-Type': 'application/json'
+      },
+      body: JSON.stringify({
+        total_questions: total,
+        correct_answers: score
+      })
+    });
+  } catch (error) {
+    console.error('Failed to submit quiz results:', error);
+  }
+}
+
+function showResults(score, total) {
+  const questions = document.querySelectorAll('.question');
+  questions.forEach((question, displayIndex) => {
+    const originalIndex = parseInt(question.dataset.originalIndex);
+    const selected = question.querySelector(`input[name="q${displayIndex}"]:checked`);
+    const correctAnswer = quizData.questions[originalIndex].correct_answer;
+
+    question.querySelectorAll('label').forEach(label => {
+      const input = label.querySelector('input');
+      if (input.value === correctAnswer) {
+        label.classList.add('correct');
+      } else if (selected && input.value === selected.value && input.value !== correctAnswer) {
+        label.classList.add('incorrect');
+      }
+    });
+  });
+
+  // Update streak
+  if (score === total) {
+    currentStreak++;
+  } else {
+    currentStreak = 0;
+  }
+  updateStats();
+
+  const scoreContainer = document.getElementById('scoreContainer');
+  const percentage = (score / total * 100).toFixed(1);
+  const dashboardUrl = `${window.location.origin}/dashboard/${quizId}`;
+
+  scoreContainer.innerHTML = `
+    <h2>Set ${currentSet + 1} Results</h2>
+    <p>You scored ${score} out of ${total} (${percentage}%)</p>
+    ${score === total ? '<p style="color: #27ae60">Perfect score! Keep the streak going!</p>' : ''}
+  `;
+
+  // Submit results to dashboard
+  submitQuizResults(score, total);
+
+  // Always show next set button since it's infinite
+  document.getElementById('nextSetBtn').style.display = 'block';
+
+  // Show overall stats
+  const overallStats = document.getElementById('overallStats');
+  const overallPercentage = (totalScore / totalQuestions * 100).toFixed(1);
+  overallStats.innerHTML = `
+    <h2>Overall Progress</h2>
+    <p>Total Score: ${totalScore} out of ${totalQuestions}</p>
+    <p>Overall Percentage: ${overallPercentage}%</p>
+    <p>Current Streak: ${currentStreak}</p>
+    <p><a href="#" onclick="navigateToDashboard(event)" style="color: #3498db;">View Full Stats on Dashboard</a></p>
+  `;
+  overallStats.style.display = 'block';
+}
+
+document.addEventListener('change', function(e) {
+  if (e.target.type === 'radio') {
+    const answered = document.querySelectorAll('input[type="radio"]:checked').length;
+    updateProgressBar(answered);
+  }
+});
+
+document.getElementById('submitBtn').addEventListener('click', function() {
+  if (isSubmitted) return;
+
+  const questions = document.querySelectorAll('.question');
+  let score = 0;
+  let total = quizData.questions.length;
+
+  // Check if all questions are answered
+  const answered = document.querySelectorAll('input[type="radio"]:checked').length;
+  if (answered < total) {
+    if (!confirm(`You have only answered ${answered} out of ${total} questions. Are you sure you want to submit?`)) {
+      return;
+    }
+  }
+
+  questions.forEach((question, displayIndex) => {
+    const originalIndex = parseInt(question.dataset.originalIndex);
+    const selected = question.querySelector(`input[name="q${displayIndex}"]:checked`);
+    if (selected && selected.value === quizData.questions[originalIndex].correct_answer) {
+      score++;
+    }
+  });
+
+  totalScore += score;
+  totalQuestions += total;
+
+  showResults(score, total);
+  this.disabled = true;
+  isSubmitted = true;
+  updateProgressBar(total);
+});
+
+document.getElementById('nextSetBtn').addEventListener('click', async function() {
+  currentSet++;
+  document.getElementById('scoreContainer').innerHTML = '';
+  document.getElementById('overallStats').style.display = 'none';
+  await fetchQuizData(currentSet);
+});
+
+// Initialize the quiz
+fetchQuizData();
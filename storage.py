@@ -0,0 +1,129 @@
+import os
+import asyncio
+from typing import Awaitable, Callable, TypeVar
+from sqlalchemy import event
+from sqlalchemy.ext.asyncio import AsyncEngine, AsyncSession, async_sessionmaker
+import metrics
+
+# SQLite connection settings
+SQLITE_BUSY_TIMEOUT_MS = int(os.getenv("SQLITE_BUSY_TIMEOUT_MS", 5000))
+SQLITE_SYNCHRONOUS = os.getenv("SQLITE_SYNCHRONOUS", "NORMAL")  # NORMAL is durable enough under WAL
+WRITE_BATCH_SIZE = int(os.getenv("WRITE_BATCH_SIZE", 64))
+
+T = TypeVar("T")
+
+write_batch_size = metrics.REGISTRY.register(metrics.Histogram(
+    "learnai_db_write_batch_size",
+    "Mutations applied per group commit",
+    buckets=(1, 2, 4, 8, 16, 32, 64, 128),
+))
+write_queue_depth = metrics.REGISTRY.register(metrics.Gauge(
+    "learnai_db_write_queue_depth",
+    "Mutations waiting for the single writer",
+))
+
+
+def configure_sqlite(engine: AsyncEngine, writer: bool):
+    """
+    Apply WAL, busy timeout, synchronous and foreign key settings on every new connection.
+
+    The driver's implicit transaction handling is switched off so that
+    BEGIN is emitted by us: IMMEDIATE on the writer, so it takes the write
+    lock up front instead of failing on upgrade, and deferred on readers.
+    Doing so also makes SAVEPOINTs work, which group commit relies on.
+    """
+    @event.listens_for(engine.sync_engine, "connect")
+    def _on_connect(dbapi_connection, connection_record):
+        dbapi_connection.isolation_level = None
+        cursor = dbapi_connection.cursor()
+        cursor.execute("PRAGMA journal_mode=WAL")
+        cursor.execute(f"PRAGMA busy_timeout={SQLITE_BUSY_TIMEOUT_MS}")
+        cursor.execute(f"PRAGMA synchronous={SQLITE_SYNCHRONOUS}")
+        cursor.execute("PRAGMA foreign_keys=ON")
+        if not writer:
+            cursor.execute("PRAGMA query_only=ON")
+        cursor.close()
+
+    @event.listens_for(engine.sync_engine, "begin")
+    def _on_begin(conn):
+        conn.exec_driver_sql("BEGIN IMMEDIATE" if writer else "BEGIN")
+
+
+class WriteQueue:
+    """
+    Single writer task that applies queued mutations in group commits.
+
+    Each mutation is an async callable taking an AsyncSession. Mutations
+    queued while a commit is in flight are applied together in the next
+    transaction, each inside its own SAVEPOINT so one failing mutation
+    doesn't roll back the others.
+    """
+
+    def __init__(self, sessionmaker: async_sessionmaker, max_batch: int = WRITE_BATCH_SIZE):
+        self.sessionmaker = sessionmaker
+        self.max_batch = max_batch
+        self._queue = None
+        self._task = None
+
+    def _ensure_started(self):
+        if self._task is None or self._task.done():
+            self._queue = self._queue or asyncio.Queue()
+            self._task = asyncio.create_task(self._run())
+
+    async def submit(self, mutation: Callable[[AsyncSession], Awaitable[T]]) -> T:
+        """Queue a mutation and wait until the transaction containing it commits"""
+        self._ensure_started()
+        future = asyncio.get_running_loop().create_future()
+        self._queue.put_nowait((mutation, future))
+        write_queue_depth.inc()
+        return await future
+
+    async def _run(self):
+        while True:
+            batch = [await self._queue.get()]
+            while len(batch) < self.max_batch and not self._queue.empty():
+                batch.append(self._queue.get_nowait())
+            write_queue_depth.dec(len(batch))
+            await self._commit(batch)
+
+    async def _commit(self, batch: list):
+        # Callers that gave up don't need their write applied
+        batch = [(mutation, future) for mutation, future in batch if not future.cancelled()]
+        if not batch:
+            return
+        write_batch_size.observe(len(batch))
+        outcomes = []
+        try:
+            async with self.sessionmaker() as session:
+                async with session.begin():
+                    for mutation, future in batch:
+                        try:
+                            async with session.begin_nested():
+                                outcomes.append((future, None, await mutation(session)))
+                        except Exception as e:
+                            outcomes.append((future, e, None))
+        except Exception as e:
+            print(f"Error committing write batch: {e}")
+            for _, future in batch:
+                if not future.done():
+                    future.set_exception(e)
+            return
+
+        for future, error, result in outcomes:
+            if future.done():
+                continue
+            if error is not None:
+                future.set_exception(error)
+            else:
+                future.set_result(result)
+
+    async def close(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+            # The queue belongs to the loop that ran the task
+            self._queue = None
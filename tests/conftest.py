@@ -0,0 +1,49 @@
+import os
+import sys
+import asyncio
+import tempfile
+
+import pytest
+
+# Point every store at a scratch directory before the app modules read their settings
+_TMP_DIR = tempfile.mkdtemp(prefix="learnai-tests-")
+DATABASE_PATH = os.path.join(_TMP_DIR, "learnai.db")
+os.environ["DATABASE_URL"] = f"sqlite+aiosqlite:///{DATABASE_PATH}"
+os.environ["STATE_BACKEND"] = "memory"
+os.environ["COLD_STORAGE_DIR"] = os.path.join(_TMP_DIR, "cold_storage")
+os.environ["TRACE_FILE"] = ""
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from models import init_db  # noqa: E402
+from database import engine, read_engine, writer  # noqa: E402
+from cold_storage import cold_store  # noqa: E402
+
+
+@pytest.fixture
+def run():
+    """
+    Run a coroutine function against a fresh database.
+
+    Each call gets its own event loop, so the writer task and pooled
+    connections are torn down afterwards rather than shared between tests.
+    """
+    for suffix in ("", "-wal", "-shm"):
+        if os.path.exists(DATABASE_PATH + suffix):
+            os.remove(DATABASE_PATH + suffix)
+
+    def _run(test, *args):
+        async def main():
+            async with engine.begin() as conn:
+                await conn.run_sync(lambda bind: init_db(bind=bind))
+            try:
+                return await test(*args)
+            finally:
+                await writer.close()
+                await engine.dispose()
+                await read_engine.dispose()
+
+        return asyncio.run(main())
+
+    yield _run
+    cold_store.close()
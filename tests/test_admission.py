@@ -0,0 +1,79 @@
+import asyncio
+
+import pytest
+from fastapi import HTTPException
+
+import admission
+from state import MemoryStateStore, SQLiteStateStore
+
+
+def stores(tmp_path):
+    return [MemoryStateStore(), SQLiteStateStore(str(tmp_path / "state.db"))]
+
+
+def test_limits_hold_and_slots_are_given_back(tmp_path):
+    async def scenario(store):
+        controller = admission.AdmissionController(3, 2, 30, store)
+        async with controller.admit("user:1", "notes"):
+            async with controller.admit("user:1", "notes"):
+                with pytest.raises(HTTPException) as rejected:
+                    async with controller.admit("user:1", "notes"):
+                        pass
+                assert rejected.value.status_code == 429
+                async with controller.admit("user:2", "notes"):
+                    with pytest.raises(HTTPException) as rejected:
+                        async with controller.admit("user:3", "notes"):
+                            pass
+                    assert rejected.value.status_code == 503
+        # Everything was released, including the rejected attempts' user slots
+        for _ in range(2):
+            await controller.try_acquire("user:3", "notes")
+        await store.close()
+
+    for store in stores(tmp_path):
+        asyncio.run(scenario(store))
+
+
+def test_concurrent_admissions_never_exceed_the_limit(tmp_path):
+    async def scenario(store):
+        controller = admission.AdmissionController(4, 100, 30, store)
+        running, peak = 0, 0
+
+        async def request(i):
+            nonlocal running, peak
+            try:
+                async with controller.admit(f"user:{i}", "notes"):
+                    running += 1
+                    peak = max(peak, running)
+                    await asyncio.sleep(0.01)
+                    running -= 1
+            except HTTPException:
+                pass
+
+        for _ in range(5):
+            await asyncio.gather(*(request(i) for i in range(12)))
+        assert peak <= 4
+        # No slot is lost or double counted once everything finished
+        assert [await store.acquire_slot(controller.INFLIGHT_KEY, f"probe{i}", 4, 60) for i in range(5)] == [
+            True, True, True, True, False
+        ]
+        await store.close()
+
+    for store in stores(tmp_path):
+        asyncio.run(scenario(store))
+
+
+def test_slots_of_a_crashed_worker_expire_under_traffic(tmp_path, monkeypatch):
+    async def scenario(store):
+        monkeypatch.setattr(admission, "ADMISSION_SLOT_TTL", 0.2)
+        controller = admission.AdmissionController(1, 1, 30, store)
+        await controller.try_acquire("user:1", "notes")  # Never released
+        with pytest.raises(HTTPException):
+            await controller.try_acquire("user:2", "notes")
+        await asyncio.sleep(0.3)
+        async with controller.admit("user:2", "notes"):
+            pass
+        await store.close()
+
+    for store in stores(tmp_path):
+        asyncio.run(scenario(store))
@@ -0,0 +1,71 @@
+import asyncio
+import threading
+from types import SimpleNamespace
+
+import pytest
+
+import ai_service
+
+
+def test_tokenizer_load_is_retried_after_a_backoff(monkeypatch):
+    clock = {"now": 1000.0}
+    attempts = []
+
+    def get_encoding(name):
+        attempts.append(clock["now"])
+        if len(attempts) == 1:
+            raise ConnectionError("offline")
+        return "encoding"
+
+    monkeypatch.setattr(ai_service, "time", SimpleNamespace(monotonic=lambda: clock["now"]))
+    monkeypatch.setattr(ai_service.tiktoken, "get_encoding", get_encoding)
+    monkeypatch.setattr(ai_service, "_tokenizer", None)
+    monkeypatch.setattr(ai_service, "_tokenizer_failures", 0)
+    monkeypatch.setattr(ai_service, "_tokenizer_retry_at", 0.0)
+
+    assert ai_service.get_tokenizer() is None
+    # Within the backoff the character fallback is used without trying again
+    clock["now"] += ai_service.TOKENIZER_RETRY_SECONDS / 2
+    assert ai_service.get_tokenizer() is None
+    assert len(attempts) == 1
+
+    clock["now"] += ai_service.TOKENIZER_RETRY_SECONDS
+    assert ai_service.get_tokenizer() == "encoding"
+    assert len(attempts) == 2
+
+
+def test_split_by_tokens_falls_back_to_characters(monkeypatch):
+    monkeypatch.setattr(ai_service, "get_tokenizer", lambda: None)
+    chunks = ai_service.split_by_tokens("x" * 10, max_tokens_per_chunk=1)
+    assert chunks == ["xxxx", "xxxx", "xx"]
+
+
+def test_split_by_tokens_repeats_the_recorded_mode(monkeypatch):
+    monkeypatch.setattr(ai_service, "get_tokenizer", lambda: pytest.fail("tokenizer loaded"))
+    assert ai_service.split_by_tokens("x" * 10, max_tokens_per_chunk=1, mode="chars") == ["xxxx", "xxxx", "xx"]
+
+    # Chunks of a job split by tokens would hash differently by characters
+    monkeypatch.setattr(ai_service, "get_tokenizer", lambda: None)
+    with pytest.raises(RuntimeError):
+        ai_service.split_by_tokens("x" * 10, max_tokens_per_chunk=1, mode="tokens")
+
+
+def test_load_genai_imports_off_the_event_loop(monkeypatch):
+    threads = []
+
+    def get_genai():
+        threads.append(threading.get_ident())
+        monkeypatch.setattr(ai_service, "_genai", "client")
+        return "client"
+
+    monkeypatch.setattr(ai_service, "_genai", None)
+    monkeypatch.setattr(ai_service, "get_genai", get_genai)
+
+    async def scenario():
+        assert await ai_service.load_genai() == "client"
+        # Already loaded: no second import
+        assert await ai_service.load_genai() == "client"
+        return threading.get_ident()
+
+    loop_thread = asyncio.run(scenario())
+    assert len(threads) == 1 and threads[0] != loop_thread
@@ -0,0 +1,90 @@
+from datetime import datetime, timedelta
+
+from sqlalchemy import insert
+
+from database import DatabaseService, writer
+from models import QuizAttempt
+
+QUESTION = {"question": "q", "options": ["a", "b", "c", "d"], "answer": "a"}
+START = datetime.combine(datetime.utcnow().date(), datetime.min.time()) - timedelta(days=10) + timedelta(hours=12)
+
+
+def day(offset: int) -> str:
+    return (START + timedelta(days=offset)).strftime("%Y-%m-%d")
+
+
+async def add_attempts(session_id: str, attempts: list):
+    """Insert (day offset, questions, correct, streak) attempts with chosen timestamps"""
+    async def _insert(session):
+        await session.execute(insert(QuizAttempt), [
+            {
+                "dashboard_id": session_id,
+                "questions_answered": questions,
+                "correct_answers": correct,
+                "score": correct / questions * 100 if questions else 0,
+                "streak": streak,
+                "created_at": START + timedelta(days=offset),
+            }
+            for offset, questions, correct, streak in attempts
+        ])
+
+    await writer.submit(_insert)
+
+
+async def seed():
+    alice = await DatabaseService.create_user("alice@example.com", "alice", "hashed")
+    bob = await DatabaseService.create_user("bob@example.com", "bob", "hashed")
+    for session_id, user in (("biology", alice), ("chemistry", alice), ("physics", bob)):
+        await DatabaseService.create_dashboard(session_id, user.id, "notes", [QUESTION] * 10)
+    await add_attempts("biology", [
+        (-200, 10, 10, 50),  # Outside the 90 day range
+        (0, 10, 5, 2), (0, 10, 7, 4),
+        (1, 10, 10, 6),
+        (2, 10, 2, 1),
+        (4, 0, 0, 0),
+    ])
+    await add_attempts("chemistry", [(1, 10, 4, 9)])
+    await add_attempts("physics", [(1, 10, 10, 20)])
+    return alice, bob
+
+
+def test_dashboard_trend_buckets_rolling_accuracy_and_streaks(run):
+    async def scenario():
+        alice, _ = await seed()
+        return await DatabaseService.get_dashboard_trend(alice.id, "biology", bucket="day", window=2)
+
+    trend = run(scenario)
+    assert [row["bucket"] for row in trend] == [day(0), day(1), day(2), day(4)]
+    assert [row["attempts"] for row in trend] == [2, 1, 1, 1]
+    assert [row["avg_score"] for row in trend] == [60.0, 100.0, 20.0, 0.0]
+    assert [row["best_streak"] for row in trend] == [4, 6, 1, 0]
+    # Over the last two non-empty buckets: 12/20, 22/30, 12/20, 2/10
+    assert [row["rolling_accuracy"] for row in trend] == [60.0, 73.3, 60.0, 20.0]
+    assert [row["best_streak_to_date"] for row in trend] == [4, 6, 6, 6]
+    assert [row["attempts_to_date"] for row in trend] == [2, 3, 4, 5]
+
+
+def test_user_trend_combines_only_their_dashboards(run):
+    async def scenario():
+        alice, _ = await seed()
+        return await DatabaseService.get_user_trend(alice.id, bucket="day", window=7)
+
+    trend = run(scenario)
+    assert [row["bucket"] for row in trend] == [day(0), day(1), day(2), day(4)]
+    day_one = trend[1]
+    assert (day_one["attempts"], day_one["questions"], day_one["correct"]) == (2, 20, 14)
+    assert day_one["best_streak"] == 9
+    assert [row["best_streak_to_date"] for row in trend] == [4, 9, 9, 9]
+    assert trend[-1]["rolling_accuracy"] == round(28 / 50 * 100, 1)
+
+
+def test_dashboard_trend_is_private_and_bucketed_by_month(run):
+    async def scenario():
+        alice, bob = await seed()
+        assert await DatabaseService.get_dashboard_trend(bob.id, "biology") is None
+        assert await DatabaseService.get_dashboard_trend(alice.id, "missing") is None
+        return await DatabaseService.get_dashboard_trend(alice.id, "biology", bucket="month", days=30)
+
+    trend = run(scenario)
+    assert sum(row["attempts"] for row in trend) == 5
+    assert trend[-1]["attempts_to_date"] == 5
@@ -0,0 +1,54 @@
+from sqlalchemy import select
+
+import database
+from database import DatabaseService, cold_store
+
+QUESTION = {"question": "q", "options": ["a", "b", "c", "d"], "answer": "a"}
+NOTES = "Glycolysis splits glucose into pyruvate. " * 500
+
+
+async def archived(session_id: str) -> bool:
+    async with database.async_session() as session:
+        segment = await session.scalar(
+            select(database.Dashboard.cold_segment).where(database.Dashboard.id == session_id)
+        )
+    return segment is not None
+
+
+def test_archive_and_thaw_round_trip(run):
+    async def scenario():
+        user = await DatabaseService.create_user("alice@example.com", "alice", "hashed")
+        await DatabaseService.create_dashboard("biology", user.id, NOTES, [QUESTION] * 20)
+
+        assert await DatabaseService.archive_idle_dashboards(idle_days=-1) == 1
+        assert await archived("biology")
+        # Already archived dashboards aren't picked up again
+        assert await DatabaseService.archive_idle_dashboards(idle_days=-1) == 0
+        assert await DatabaseService.get_dashboard_notes("biology") == NOTES
+
+        questions, _ = await DatabaseService.get_quiz_questions("biology", 1)
+        assert questions == [QUESTION] * 10
+        assert not await archived("biology")
+
+    run(scenario)
+
+
+def test_archive_skips_a_dashboard_refilled_meanwhile(run, monkeypatch):
+    run_in_thread = database.metrics.run_in_thread
+
+    async def refill_during_append(func, *args):
+        if func == cold_store.append:
+            await DatabaseService.add_questions_to_buffer("biology", [QUESTION] * 10)
+        return await run_in_thread(func, *args)
+
+    async def scenario():
+        user = await DatabaseService.create_user("alice@example.com", "alice", "hashed")
+        await DatabaseService.create_dashboard("biology", user.id, NOTES, [QUESTION] * 10)
+        monkeypatch.setattr(database.metrics, "run_in_thread", refill_during_append)
+
+        assert await DatabaseService.archive_idle_dashboards(idle_days=-1) == 0
+        assert not await archived("biology")
+        questions, _ = await DatabaseService.get_quiz_questions("biology", 1)
+        assert questions == [QUESTION] * 10
+
+    run(scenario)
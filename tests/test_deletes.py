@@ -0,0 +1,92 @@
+import pytest
+from sqlalchemy import select, func, insert, text
+from sqlalchemy.exc import IntegrityError
+
+from database import DatabaseService, engine, read_engine, async_session, writer
+from models import NoteJob, QuizAttempt, QuizQuestionEntry, UserStats
+
+QUESTION = {"question": "q", "options": ["a", "b", "c", "d"], "answer": "a"}
+ATTEMPT = {"questions_answered": 10, "correct_answers": 7, "streak": 3}
+
+
+async def count(model_or_table, column, value) -> int:
+    async with async_session() as session:
+        result = await session.execute(
+            select(func.count()).select_from(model_or_table).where(column == value)
+        )
+        return result.scalar_one()
+
+
+async def indexed(session_id: str) -> int:
+    # The index is contentless, so look rows up by the words of their notes
+    async with async_session() as session:
+        result = await session.execute(
+            text("SELECT count(*) FROM notes_fts WHERE notes_fts MATCH :query"), {"query": f'notes : "{session_id}"'}
+        )
+        return result.scalar_one()
+
+
+async def seed_user(username: str):
+    user = await DatabaseService.create_user(f"{username}@example.com", username, "hashed")
+    for i in range(2):
+        session_id = f"{username}-{i}"
+        await DatabaseService.create_dashboard(session_id, user.id, f"Notes of {session_id}", [QUESTION] * 10)
+        await DatabaseService.record_quiz_results(session_id, [ATTEMPT, ATTEMPT])
+    return user
+
+
+async def children(session_id: str) -> tuple:
+    return (
+        await count(QuizAttempt, QuizAttempt.dashboard_id, session_id),
+        await count(QuizQuestionEntry, QuizQuestionEntry.dashboard_id, session_id),
+        await indexed(session_id),
+    )
+
+
+def test_delete_dashboard_removes_its_children_only(run):
+    async def scenario():
+        await seed_user("alice")
+        assert await children("alice-0") == (2, 10, 1)
+
+        assert await DatabaseService.delete_dashboard("alice-0") is True
+        assert await DatabaseService.get_dashboard("alice-0") is None
+        assert await children("alice-0") == (0, 0, 0)
+        assert await children("alice-1") == (2, 10, 1)
+        assert await DatabaseService.delete_dashboard("alice-0") is False
+
+    run(scenario)
+
+
+def test_delete_user_removes_everything_they_own(run):
+    async def scenario():
+        alice = await seed_user("alice")
+        bob = await seed_user("bob")
+        await DatabaseService.create_note_job(alice.id, "Some text", None, "worker")
+
+        assert await DatabaseService.delete_user(alice.id)
+        assert await DatabaseService.get_user_by_username("alice") is None
+        for session_id in ("alice-0", "alice-1"):
+            assert await DatabaseService.get_dashboard(session_id) is None
+            assert await children(session_id) == (0, 0, 0)
+        assert await count(UserStats, UserStats.user_id, alice.id) == 0
+        assert await count(NoteJob, NoteJob.user_id, alice.id) == 0
+        # Other users are untouched
+        assert await children("bob-0") == (2, 10, 1)
+        assert await count(UserStats, UserStats.user_id, bob.id) == 1
+
+    run(scenario)
+
+
+def test_foreign_keys_are_enforced(run):
+    async def scenario():
+        for pool in (engine, read_engine):
+            async with pool.connect() as conn:
+                assert (await conn.exec_driver_sql("PRAGMA foreign_keys")).scalar() == 1
+
+        async def orphan_attempt(session):
+            await session.execute(insert(QuizAttempt).values(dashboard_id="missing", questions_answered=1))
+
+        with pytest.raises(IntegrityError):
+            await writer.submit(orphan_attempt)
+
+    run(scenario)
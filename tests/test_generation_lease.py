@@ -0,0 +1,58 @@
+import asyncio
+
+from database import DatabaseService
+
+QUESTION = {"question": "q", "options": ["a", "b", "c", "d"], "answer": "a"}
+
+
+async def seed_dashboard() -> str:
+    user = await DatabaseService.create_user("alice@example.com", "alice", "hashed")
+    await DatabaseService.create_dashboard("session-1", user.id, "Notes", [QUESTION] * 10)
+    return "session-1"
+
+
+def test_only_one_concurrent_acquire_wins(run):
+    async def scenario():
+        session_id = await seed_dashboard()
+        won = await asyncio.gather(
+            *(DatabaseService.acquire_generation_lease(session_id, f"worker-{i}") for i in range(5))
+        )
+        assert sorted(won) == [False] * 4 + [True]
+        assert await DatabaseService.is_generating_questions(session_id)
+
+        # The holder can take it again; the others still can't
+        winner = f"worker-{won.index(True)}"
+        assert await DatabaseService.acquire_generation_lease(session_id, winner)
+        assert not await DatabaseService.acquire_generation_lease(session_id, "latecomer")
+
+    run(scenario)
+
+
+def test_expired_lease_is_reclaimed(run):
+    async def scenario():
+        session_id = await seed_dashboard()
+        # A worker that crashed with its lease held, now expired
+        assert await DatabaseService.acquire_generation_lease(session_id, "crashed", ttl=-1)
+        assert not await DatabaseService.is_generating_questions(session_id)
+
+        assert await DatabaseService.acquire_generation_lease(session_id, "rescuer")
+        assert not await DatabaseService.renew_generation_lease(session_id, "crashed")
+        assert await DatabaseService.renew_generation_lease(session_id, "rescuer")
+
+    run(scenario)
+
+
+def test_stale_owner_cannot_add_questions_after_a_takeover(run):
+    async def scenario():
+        session_id = await seed_dashboard()
+        assert await DatabaseService.acquire_generation_lease(session_id, "stale", ttl=-1)
+        assert await DatabaseService.acquire_generation_lease(session_id, "current")
+
+        assert await DatabaseService.add_questions_to_buffer(session_id, [QUESTION] * 10, owner="stale") is None
+        assert await DatabaseService.add_questions_to_buffer(session_id, [QUESTION] * 10, owner="current") == 2
+
+        # Once released, neither owner can append on the lease
+        await DatabaseService.release_generation_lease(session_id, "current")
+        assert await DatabaseService.add_questions_to_buffer(session_id, [QUESTION] * 10, owner="current") is None
+
+    run(scenario)
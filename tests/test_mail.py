@@ -0,0 +1,93 @@
+import time
+import socket
+from types import SimpleNamespace
+
+import pytest
+
+aiosmtpd_controller = pytest.importorskip("aiosmtpd.controller")
+
+import mail  # noqa: E402
+from database import DatabaseService  # noqa: E402
+from state import MemoryStateStore  # noqa: E402
+
+
+class RecordingHandler:
+    def __init__(self):
+        self.messages = []
+
+    async def handle_DATA(self, server, session, envelope):
+        self.messages.append(envelope)
+        return "250 OK"
+
+
+@pytest.fixture
+def smtp_server(monkeypatch):
+    """A local aiosmtpd server the mail module is pointed at"""
+    with socket.socket() as probe:
+        probe.bind(("127.0.0.1", 0))
+        port = probe.getsockname()[1]
+    handler = RecordingHandler()
+    controller = aiosmtpd_controller.Controller(handler, hostname="127.0.0.1", port=port)
+    controller.start()
+    monkeypatch.setattr(mail, "MAIL_SERVER", "127.0.0.1")
+    monkeypatch.setattr(mail, "MAIL_PORT", port)
+    monkeypatch.setattr(mail, "MAIL_STARTTLS", False)
+    monkeypatch.setattr(mail, "MAIL_SSL_TLS", False)
+    monkeypatch.setattr(mail, "MAIL_USERNAME", None)
+    monkeypatch.setattr(mail, "MAIL_FROM", "learnai@example.com")
+    yield handler
+    controller.stop()
+
+
+def test_drain_delivers_queued_mail_within_the_rate_limit(run, smtp_server, monkeypatch):
+    monkeypatch.setattr(mail, "MAIL_RATE_PER_MINUTE", 2)
+
+    async def scenario():
+        worker = mail.MailWorker(mail.SMTPPool(), MemoryStateStore())
+        for i in range(3):
+            await DatabaseService.enqueue_mail(f"user{i}@example.com", f"Subject {i}", "<p>Hi</p>")
+
+        assert await worker.drain() == 2
+        # The minute's budget is spent, so the third message waits
+        assert await worker.drain() == 0
+        await worker.pool.close()
+        return await DatabaseService.count_due_mail(10)
+
+    assert run(scenario) == 1
+    assert sorted(envelope.rcpt_tos[0] for envelope in smtp_server.messages) == [
+        "user0@example.com", "user1@example.com"
+    ]
+
+
+def test_idle_drain_leaves_the_budget_alone(run, smtp_server):
+    async def scenario():
+        store = MemoryStateStore()
+        worker = mail.MailWorker(mail.SMTPPool(), store)
+        assert await worker.drain() == 0
+        key, granted = await worker._reserve(1)
+        return await store.get(key), granted
+
+    assert run(scenario) == (1, 1)
+    assert smtp_server.messages == []
+
+
+def test_unused_budget_goes_back_to_the_minute_it_came_from(run, monkeypatch):
+    clock = {"now": 120.0}
+    monkeypatch.setattr(mail, "time", SimpleNamespace(
+        time=lambda: clock["now"], monotonic=time.monotonic, perf_counter=time.perf_counter
+    ))
+
+    async def claim_lost_race(owner, limit, claim_seconds):
+        # Another worker claimed the message, and the minute ended meanwhile
+        clock["now"] += 60
+        return []
+
+    async def scenario():
+        store = MemoryStateStore()
+        worker = mail.MailWorker(mail.SMTPPool(), store)
+        await DatabaseService.enqueue_mail("user@example.com", "Subject", "<p>Hi</p>")
+        monkeypatch.setattr(DatabaseService, "claim_mail", claim_lost_race)
+        assert await worker.drain() == 0
+        return await store.get("mail:sent:2"), await store.get("mail:sent:3")
+
+    assert run(scenario) == (0, None)
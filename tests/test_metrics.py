@@ -0,0 +1,35 @@
+import time
+import asyncio
+
+import metrics
+
+
+def test_executor_inflight_follows_the_thread_not_the_caller():
+    async def scenario():
+        before = metrics.executor_inflight.get()
+        with_timeout = asyncio.wait_for(metrics.run_in_thread(time.sleep, 0.3), 0.05)
+        try:
+            await with_timeout
+        except asyncio.TimeoutError:
+            pass
+        # The caller gave up but the sleep still occupies a worker
+        assert metrics.executor_inflight.get() == before + 1
+        await asyncio.sleep(0.5)
+        assert metrics.executor_inflight.get() == before
+
+    asyncio.run(scenario())
+
+
+def test_run_in_thread_returns_and_raises():
+    async def scenario():
+        assert await metrics.run_in_thread(sum, [1, 2, 3]) == 6
+        before = metrics.executor_inflight.get()
+        try:
+            await metrics.run_in_thread(int, "not a number")
+        except ValueError:
+            pass
+        else:
+            raise AssertionError("expected ValueError")
+        assert metrics.executor_inflight.get() == before
+
+    asyncio.run(scenario())
@@ -0,0 +1,111 @@
+import pytest
+from fastapi import HTTPException
+from sqlalchemy import update
+
+import ai_service
+import main
+from database import DatabaseService, writer
+from models import NoteJob
+
+# Three chunks when split by characters, each a different word repeated
+TEXT = "".join(word * (ai_service.CHARS_PER_TOKEN * 4000 // len(word)) for word in ("alpha", "bravo", "delta"))
+
+
+class Polisher:
+    async def polish_notes(self, notes: str) -> str:
+        return notes
+
+
+@pytest.fixture
+def model(monkeypatch):
+    """Stubbed NoteTaker._call_model; chunks listed in fail_on raise once"""
+    calls = []
+    fail_on = set()
+
+    async def call_model(self, chunk: str) -> str:
+        word = chunk[:5]
+        calls.append(word)
+        if word in fail_on:
+            fail_on.discard(word)
+            raise RuntimeError(f"model failed on {word}")
+        return f"notes on {word}"
+
+    async def load_service(getter):
+        return ai_service.NoteTaker.__new__(ai_service.NoteTaker)
+
+    monkeypatch.setattr(ai_service.NoteTaker, "_call_model", call_model)
+    monkeypatch.setattr(ai_service, "NotePolisher", Polisher)
+    monkeypatch.setattr(main, "load_service", load_service)
+    return calls, fail_on
+
+
+async def expire_lease(job_id: str):
+    async def _expire(session):
+        await session.execute(update(NoteJob).where(NoteJob.id == job_id).values(lease_expires=None))
+    await writer.submit(_expire)
+
+
+def test_failed_job_resumes_from_its_checkpoints(run, model):
+    calls, fail_on = model
+
+    async def scenario():
+        user = await DatabaseService.create_user("alice@example.com", "alice", "hashed")
+        job_id = await DatabaseService.create_note_job(user.id, TEXT, None, "first", "chars")
+        fail_on.add("bravo")
+        with pytest.raises(RuntimeError):
+            await main.run_note_job(job_id, "first", TEXT, "chars")
+        assert calls == ["alpha", "bravo"]
+        assert len(await DatabaseService.get_note_checkpoints(job_id)) == 1
+
+        response = await main.resume_notes(job_id, current_user=user)
+        # The checkpointed first chunk isn't generated again
+        assert calls == ["alpha", "bravo", "bravo", "delta"]
+        assert response.notes == "notes on alpha\n\nnotes on bravo\n\nnotes on delta"
+        # Completion drops the checkpoints
+        assert await DatabaseService.get_note_checkpoints(job_id) == {}
+
+    run(scenario)
+
+
+def test_resume_refuses_a_live_job_and_returns_completed_notes(run, model):
+    calls, _ = model
+
+    async def scenario():
+        alice = await DatabaseService.create_user("alice@example.com", "alice", "hashed")
+        bob = await DatabaseService.create_user("bob@example.com", "bob", "hashed")
+        job_id = await DatabaseService.create_note_job(alice.id, TEXT, None, "first", "chars")
+
+        with pytest.raises(HTTPException) as error:
+            await main.resume_notes(job_id, current_user=alice)
+        assert error.value.status_code == 409
+        with pytest.raises(HTTPException) as error:
+            await main.resume_notes(job_id, current_user=bob)
+        assert error.value.status_code == 404
+
+        await DatabaseService.finish_note_job(job_id, "first", notes="finished notes")
+        response = await main.resume_notes(job_id, current_user=alice)
+        assert response.notes == "finished notes"
+        assert calls == []
+
+    run(scenario)
+
+
+def test_checkpoints_of_a_taken_over_run_are_rejected(run):
+    async def scenario():
+        user = await DatabaseService.create_user("alice@example.com", "alice", "hashed")
+        job_id = await DatabaseService.create_note_job(user.id, TEXT, None, "first", "chars")
+        assert await DatabaseService.save_note_checkpoint(job_id, "first", "a", "notes on a") is True
+
+        await expire_lease(job_id)
+        job = await DatabaseService.claim_note_job(job_id, user.id, "second")
+        assert job["claimed"] is True
+        assert job["chunking"] == "chars"
+
+        assert await DatabaseService.save_note_checkpoint(job_id, "first", "b", "notes on b") is False
+        assert await DatabaseService.save_note_checkpoint(job_id, "second", "b", "notes on b") is True
+        assert set(await DatabaseService.get_note_checkpoints(job_id)) == {"a", "b"}
+        # The stale run can't finish the job either
+        await DatabaseService.finish_note_job(job_id, "first", error="too late")
+        assert (await DatabaseService.claim_note_job(job_id, user.id, "third"))["claimed"] is False
+
+    run(scenario)
@@ -0,0 +1,17 @@
+import asyncio
+
+import passwords
+
+
+def test_hash_and_verify_in_worker_processes():
+    async def scenario():
+        hashed = await passwords.hash_password("correct horse")
+        valid, _ = await passwords.verify_password("correct horse", hashed)
+        invalid, _ = await passwords.verify_password("wrong", hashed)
+        return valid, invalid
+
+    try:
+        assert asyncio.run(scenario()) == (True, False)
+        assert passwords._executor._mp_context.get_start_method() != "fork"
+    finally:
+        passwords.shutdown()
@@ -0,0 +1,94 @@
+import re
+from contextlib import contextmanager
+
+from sqlalchemy import event
+
+from database import DatabaseService, read_engine, writer
+
+QUESTION = {"question": "q", "options": ["a", "b", "c", "d"], "answer": "a"}
+NOTES = "Photosynthesis converts light into chemical energy. " * 2000
+# The notes blob, as opposed to notes_preview
+NOTES_COLUMN = re.compile(r"dashboards\.notes\b")
+
+
+@contextmanager
+def count_statements():
+    """Collect the SQL statements run on the read pool, leaving out transaction control"""
+    statements = []
+
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        if not statement.lstrip().upper().startswith(("BEGIN", "COMMIT", "ROLLBACK", "PRAGMA")):
+            statements.append(statement)
+
+    event.listen(read_engine.sync_engine, "before_cursor_execute", before_cursor_execute)
+    try:
+        yield statements
+    finally:
+        event.remove(read_engine.sync_engine, "before_cursor_execute", before_cursor_execute)
+
+
+async def seed():
+    user = await DatabaseService.create_user("alice@example.com", "alice", "hashed")
+    for i in range(3):
+        await DatabaseService.create_dashboard(f"session-{i}", user.id, NOTES, [QUESTION] * 10)
+    return user
+
+
+def test_get_user_by_username_is_one_query_without_dashboards(run):
+    async def scenario():
+        await seed()
+        with count_statements() as statements:
+            user = await DatabaseService.get_user_by_username("alice")
+        assert user.username == "alice"
+        assert len(statements) == 1
+        assert "dashboards" not in statements[0]
+
+    run(scenario)
+
+
+def test_quiz_stats_reads_counters_not_notes(run):
+    async def scenario():
+        await seed()
+        with count_statements() as statements:
+            versions = await DatabaseService.get_dashboard_versions("session-0")
+            stats = await DatabaseService.get_dashboard_stats("session-0")
+        assert versions is not None
+        assert stats == {"total_questions": 0, "average_score": 0, "best_streak": 0}
+        assert len(statements) == 2
+        for statement in statements:
+            assert not NOTES_COLUMN.search(statement)
+            assert "quiz_questions" not in statement
+
+    run(scenario)
+
+
+def test_is_generating_questions_reads_one_column(run):
+    async def scenario():
+        await seed()
+        with count_statements() as statements:
+            generating = await DatabaseService.is_generating_questions("session-0")
+        assert generating is False
+        assert len(statements) == 1
+        assert not NOTES_COLUMN.search(statements[0])
+
+    run(scenario)
+
+
+def test_get_quiz_questions_releases_reader_before_writing(run, monkeypatch):
+    async def scenario():
+        user = await seed()
+        await DatabaseService.create_dashboard("two-sets", user.id, NOTES, [QUESTION] * 20)
+        checked_out = []
+        submit = writer.submit
+
+        async def recording_submit(mutation):
+            checked_out.append(read_engine.sync_engine.pool.checkedout())
+            return await submit(mutation)
+
+        monkeypatch.setattr(writer, "submit", recording_submit)
+        # Moving on to the second set records it through the writer
+        questions, _ = await DatabaseService.get_quiz_questions("two-sets", 1)
+        assert questions == [QUESTION] * 10
+        assert checked_out and set(checked_out) == {0}
+
+    run(scenario)
@@ -0,0 +1,82 @@
+from sqlalchemy import select, text
+
+from database import DatabaseService, engine, async_session
+from models import Dashboard, notes_fts, init_db
+
+QUESTION = {"question": "q", "options": ["a", "b", "c", "d"], "answer": "a"}
+
+
+async def indexed_ids() -> set:
+    async with async_session() as session:
+        result = await session.execute(
+            select(Dashboard.id).join(notes_fts, notes_fts.c.rowid == Dashboard.search_rowid)
+        )
+        return set(result.scalars().all())
+
+
+def test_search_only_returns_own_notes(run):
+    async def scenario():
+        alice = await DatabaseService.create_user("alice@example.com", "alice", "hashed")
+        bob = await DatabaseService.create_user("bob@example.com", "bob", "hashed")
+        await DatabaseService.create_dashboard("alice-1", alice.id, "Mitochondria make ATP", [QUESTION])
+        await DatabaseService.create_dashboard("bob-1", bob.id, "Mitochondria and chloroplasts", [QUESTION])
+
+        results = await DatabaseService.search_notes(alice.id, "mitochondria")
+        assert [result["id"] for result in results] == ["alice-1"]
+        assert "<mark>Mitochondria</mark>" in results[0]["snippet"]
+        # Words typed by the user can't reach the owner column
+        assert await DatabaseService.search_notes(alice.id, f"user{bob.id}") == []
+
+    run(scenario)
+
+
+def test_archived_notes_stay_searchable(run):
+    async def scenario():
+        user = await DatabaseService.create_user("alice@example.com", "alice", "hashed")
+        await DatabaseService.create_dashboard("session-1", user.id, "Krebs cycle notes", [QUESTION])
+
+        assert await DatabaseService.archive_idle_dashboards(idle_days=-1) == 1
+        assert await indexed_ids() == {"session-1"}
+        results = await DatabaseService.search_notes(user.id, "krebs")
+        assert [result["id"] for result in results] == ["session-1"]
+        assert results[0]["snippet"] == "<mark>Krebs</mark> cycle notes"
+        assert await DatabaseService.backfill_search_index() == 0
+
+        await DatabaseService.thaw_dashboard("session-1")
+        assert [result["id"] for result in await DatabaseService.search_notes(user.id, "krebs")] == ["session-1"]
+
+        # Deleting an archived dashboard drops it from the index as well
+        await DatabaseService.archive_idle_dashboards(idle_days=-1)
+        assert await DatabaseService.delete_dashboard("session-1") is True
+        async with async_session() as session:
+            result = await session.execute(
+                text("SELECT count(*) FROM notes_fts WHERE notes_fts MATCH 'krebs'")
+            )
+            assert result.scalar_one() == 0
+
+    run(scenario)
+
+
+def test_old_index_layout_is_rebuilt_and_backfilled_once(run):
+    async def scenario():
+        user = await DatabaseService.create_user("alice@example.com", "alice", "hashed")
+        await DatabaseService.create_dashboard("session-1", user.id, "Enzyme kinetics", [QUESTION])
+        await DatabaseService.create_dashboard("session-2", user.id, "Enzyme inhibitors", [QUESTION])
+        await DatabaseService.archive_idle_dashboards(idle_days=-1)
+        await DatabaseService.thaw_dashboard("session-1")
+        async with engine.begin() as conn:
+            await conn.exec_driver_sql("DROP TABLE notes_fts")
+            await conn.exec_driver_sql(
+                "CREATE VIRTUAL TABLE notes_fts USING fts5("
+                "notes, dashboard_id UNINDEXED, user_id UNINDEXED, tokenize='porter unicode61')"
+            )
+            await conn.run_sync(lambda bind: init_db(bind=bind))
+
+        assert await indexed_ids() == set()
+        # Archived notes are read back from cold storage to be indexed
+        assert await DatabaseService.backfill_search_index() == 2
+        assert await DatabaseService.backfill_search_index() == 0
+        assert await indexed_ids() == {"session-1", "session-2"}
+        assert len(await DatabaseService.search_notes(user.id, "enzyme")) == 2
+
+    run(scenario)
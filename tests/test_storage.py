@@ -0,0 +1,79 @@
+import asyncio
+
+from sqlalchemy import select
+
+from database import async_session, write_session
+from models import User
+from storage import WriteQueue
+
+
+def add_user(name: str, sessions: list = None):
+    async def mutation(session):
+        if sessions is not None:
+            sessions.append(session)
+        session.add(User(email=f"{name}@example.com", username=name, hashed_password="hashed"))
+        await session.flush()
+        return name
+    return mutation
+
+
+async def usernames() -> set:
+    async with async_session() as session:
+        result = await session.execute(select(User.username))
+        return set(result.scalars().all())
+
+
+def test_failing_mutation_leaves_the_rest_of_its_batch_committed(run):
+    async def scenario():
+        queue = WriteQueue(write_session)
+
+        async def fail(session):
+            session.add(User(email="broken@example.com", username="broken", hashed_password="hashed"))
+            await session.flush()
+            raise ValueError("rejected")
+
+        results = await asyncio.gather(
+            queue.submit(add_user("alice")), queue.submit(fail), queue.submit(add_user("bob")),
+            return_exceptions=True
+        )
+        await queue.close()
+        assert results[0] == "alice" and results[2] == "bob"
+        assert isinstance(results[1], ValueError)
+        # The failed mutation's own writes are rolled back with its savepoint
+        assert await usernames() == {"alice", "bob"}
+
+    run(scenario)
+
+
+def test_concurrent_submits_share_one_commit(run):
+    async def scenario():
+        queue = WriteQueue(write_session)
+        sessions = []
+        await asyncio.gather(*(queue.submit(add_user(f"user{i}", sessions)) for i in range(5)))
+        await queue.close()
+        assert len(sessions) == 5
+        assert len({id(session) for session in sessions}) == 1
+
+        # Batches are capped at max_batch
+        queue = WriteQueue(write_session, max_batch=2)
+        sessions = []
+        await asyncio.gather(*(queue.submit(add_user(f"other{i}", sessions)) for i in range(5)))
+        await queue.close()
+        assert len({id(session) for session in sessions}) == 3
+
+    run(scenario)
+
+
+def test_queue_restarts_after_close(run):
+    async def scenario():
+        queue = WriteQueue(write_session)
+        assert await queue.submit(add_user("alice")) == "alice"
+        await queue.close()
+        await queue.close()  # Closing twice is harmless
+
+        assert await queue.submit(add_user("bob")) == "bob"
+        await queue.close()
+        assert await usernames() == {"alice", "bob"}
+
+    run(scenario)
+
@@ -0,0 +1,34 @@
+import asyncio
+import json
+import threading
+
+import tracing
+
+
+def test_traces_are_written_by_flush_off_the_event_loop(monkeypatch, tmp_path):
+    trace_file = tmp_path / "traces.jsonl"
+    monkeypatch.setattr(tracing, "TRACE_FILE", str(trace_file))
+    writers = []
+    write_pending = tracing._write_pending
+
+    def record_thread():
+        writers.append(threading.get_ident())
+        write_pending()
+
+    monkeypatch.setattr(tracing, "_write_pending", record_thread)
+
+    async def scenario():
+        with tracing.start_trace("GET", "request-1"):
+            with tracing.span("db.query"):
+                pass
+        # Finishing a request only buffers the trace
+        assert not trace_file.exists()
+        assert tracing.slowest_traces()[0]["request_id"] == "request-1"
+        await tracing.flush()
+        await tracing.flush()  # Nothing left to write
+
+    asyncio.run(scenario())
+    assert len(writers) == 1 and writers[0] != threading.get_ident()
+    records = [json.loads(line) for line in trace_file.read_text().splitlines()]
+    assert [record["request_id"] for record in records] == ["request-1"]
+    assert records[0]["children"][0]["name"] == "db.query"
@@ -0,0 +1,186 @@
+import os
+import re
+import json
+import time
+import uuid
+import asyncio
+import functools
+import threading
+from collections import deque
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Optional
+
+# Tracing settings
+TRACE_ENABLED = os.getenv("TRACE_ENABLED", "True") == "True"
+TRACE_FILE = os.getenv("TRACE_FILE", "traces.jsonl")
+TRACE_BUFFER_SIZE = int(os.getenv("TRACE_BUFFER_SIZE", 500))
+TRACE_FILE_MAX_BYTES = int(os.getenv("TRACE_FILE_MAX_BYTES", 10 * 1024 * 1024))  # Rotated to TRACE_FILE.1 beyond this
+TRACE_FLUSH_INTERVAL = float(os.getenv("TRACE_FLUSH_INTERVAL", 1))  # Seconds between writes to TRACE_FILE
+TRACE_PENDING_MAX = int(os.getenv("TRACE_PENDING_MAX", 10000))  # Oldest unwritten traces are dropped beyond this
+# /debug/traces exposes span attributes, so it is off unless explicitly enabled
+TRACE_ENDPOINT_ENABLED = os.getenv("TRACE_ENDPOINT_ENABLED", "False") == "True"
+
+# Request IDs accepted from clients; anything else is replaced with a fresh one
+_REQUEST_ID = re.compile(r"^[A-Za-z0-9._-]{1,64}$")
+
+_current_span: ContextVar[Optional["Span"]] = ContextVar("current_span", default=None)
+_recent_traces = deque(maxlen=TRACE_BUFFER_SIZE)
+_pending = deque(maxlen=TRACE_PENDING_MAX)  # Finished traces not yet written to TRACE_FILE
+_export_lock = threading.Lock()
+
+
+class Span:
+    def __init__(self, name: str, trace_id: str, parent: Optional["Span"] = None, **attributes):
+        self.name = name
+        self.trace_id = trace_id
+        self.span_id = uuid.uuid4().hex[:16]
+        self.parent_id = parent.span_id if parent else None
+        self.attributes = attributes
+        self.children = []
+        self.error = None
+        self.start_time = time.time()
+        self._start = time.perf_counter()
+        self.duration = None
+        if parent is not None:
+            parent.children.append(self)
+
+    def set(self, **attributes):
+        self.attributes.update(attributes)
+
+    def finish(self):
+        self.duration = time.perf_counter() - self._start
+
+    def to_dict(self) -> dict:
+        return {
+            "name": self.name,
+            "span_id": self.span_id,
+            "parent_id": self.parent_id,
+            "start": self.start_time,
+            "duration_ms": round(self.duration * 1000, 3) if self.duration is not None else None,
+            "attributes": self.attributes,
+            "error": self.error,
+            "children": [child.to_dict() for child in list(self.children)],
+        }
+
+
+def current_span() -> Optional[Span]:
+    return _current_span.get()
+
+
+def current_request_id() -> Optional[str]:
+    span = _current_span.get()
+    return span.trace_id if span else None
+
+
+def request_id_from(header: Optional[str]) -> str:
+    """The client's X-Request-ID if it looks like one, else a new id"""
+    if header and _REQUEST_ID.match(header):
+        return header
+    return uuid.uuid4().hex
+
+
+def _export(root: Span):
+    record = {"request_id": root.trace_id, **root.to_dict()}
+    _recent_traces.append(record)
+    if TRACE_FILE:
+        # Written by the exporter in a thread, so requests never wait on the disk
+        _pending.append(record)
+
+
+def _write_pending():
+    """Append the buffered traces to TRACE_FILE; blocking"""
+    with _export_lock:
+        lines = []
+        while _pending:
+            lines.append(json.dumps(_pending.popleft(), default=str) + "\n")
+        if not lines:
+            return
+        try:
+            with open(TRACE_FILE, "a", encoding="utf-8") as f:
+                f.writelines(lines)
+                size = f.tell()
+            if size > TRACE_FILE_MAX_BYTES:
+                # Keep one previous file, so disk use stays under twice the limit
+                os.replace(TRACE_FILE, TRACE_FILE + ".1")
+        except OSError as e:
+            print(f"Error exporting {len(lines)} traces: {e}")
+
+
+async def flush():
+    """Write the buffered traces to TRACE_FILE off the event loop"""
+    if _pending:
+        await asyncio.to_thread(_write_pending)
+
+
+async def run_exporter():
+    """Background loop writing finished traces to TRACE_FILE"""
+    while True:
+        await asyncio.sleep(TRACE_FLUSH_INTERVAL)
+        await flush()
+
+
+@contextmanager
+def start_trace(name: str, request_id: Optional[str] = None, **attributes):
+    """Open a new root span; the finished trace is exported on exit"""
+    if not TRACE_ENABLED:
+        yield None
+        return
+    root = Span(name, request_id or uuid.uuid4().hex, **attributes)
+    token = _current_span.set(root)
+    try:
+        yield root
+    except BaseException as e:
+        root.error = repr(e)
+        raise
+    finally:
+        _current_span.reset(token)
+        root.finish()
+        _export(root)
+
+
+@contextmanager
+def span(name: str, **attributes):
+    """Open a child span of the current span; a no-op outside a trace"""
+    parent = _current_span.get()
+    if parent is None:
+        yield None
+        return
+    child = Span(name, parent.trace_id, parent, **attributes)
+    token = _current_span.set(child)
+    try:
+        yield child
+    except BaseException as e:
+        child.error = repr(e)
+        raise
+    finally:
+        _current_span.reset(token)
+        child.finish()
+
+
+def traced(name: str):
+    """Decorator wrapping an async function in a span"""
+    def decorator(func):
+        @functools.wraps(func)
+        async def wrapper(*args, **kwargs):
+            with span(name):
+                return await func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def trace_methods(prefix: str):
+    """Class decorator wrapping every async static/class method in a span"""
+    def decorator(cls):
+        for attr, value in list(vars(cls).items()):
+            if isinstance(value, (staticmethod, classmethod)) and asyncio.iscoroutinefunction(value.__func__):
+                setattr(cls, attr, type(value)(traced(f"{prefix}.{attr}")(value.__func__)))
+        return cls
+    return decorator
+
+
+def slowest_traces(limit: int = 20) -> list:
+    """Slowest traces among the recently finished ones"""
+    traces = list(_recent_traces)
+    traces.sort(key=lambda t: t["duration_ms"] or 0, reverse=True)
+    return traces[:limit]
@@ -4,6 +4,8 @@ import re
 import asyncio
 from typing import Optional
 import time
+import metrics
+import tracing
 
 def get_video_id(url: str) -> str:
     """
@@ -80,6 +82,7 @@ def _fetch_transcript_sync(url: str, max_retries: int = 3, languages: list = ['e
     
     return None
 
+@tracing.traced("youtube.fetch_transcript")
 async def fetch_transcript(url: str) -> str:
     """
     Asynchronously download and transcribe audio from a YouTube URL.
@@ -93,7 +96,7 @@ async def fetch_transcript(url: str) -> str:
     Raises:
         Exception: If transcript cannot be fetched or processed
     """
-    transcript = await asyncio.to_thread(_fetch_transcript_sync, url)
+    transcript = await metrics.run_in_thread(_fetch_transcript_sync, url)
     if transcript is None:
         raise Exception("No transcript available for this video. Please check if captions are enabled.")
     return transcript